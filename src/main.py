@@ -5,16 +5,41 @@
 
 from __future__ import annotations
 
+import atexit
+import copy
 import csv
 import datetime as dt
+import functools
+import glob
+import hashlib
 import operator
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
 import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
+import numpy as np
 import pandas as pd
-from openpyxl.styles import Alignment, Font
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+from openpyxl import LXML as OPENPYXL_LXML, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, Side
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
+from openpyxl.writer import excel as openpyxl_excel_writer
 
 
 SettingsTree = Dict[str, Any]
@@ -22,6 +47,30 @@ SELECTED_MANAGER_ID_COL = "Таб. номер ВКО (выбранный)"
 SELECTED_MANAGER_NAME_COL = "ВКО (выбранный)"
 DIRECT_MANAGER_ID_COL = "Таб. номер ВКО (по файлу)"
 DIRECT_MANAGER_NAME_COL = "ВКО (по файлу)"
+# Колонка FACT_VALUE процентильного SPOD для каждого percentile_type
+PERCENTILE_VALUE_COLUMNS = MappingProxyType({"above": "Обогнал_всего_%", "below": "Обогнали_меня_всего_%"})
+# Колонки сортировки листов (по убыванию): берётся первая из кандидатов, которая есть в таблице.
+# SUMMARY_TN сюда не входит — его колонка зависит от use_files_count
+SHEET_SORT_COLUMNS = MappingProxyType({
+    "SUMMARY_INN": ("Прирост",),
+    "SPOD_SCENARIO": ("Факт",),
+    "SPOD_SCENARIO_PERCENTILE": ("Факт",),
+    "RAW_T0": ("Факт (число)", "fact_value_clean"),
+    "RAW_T1": ("Факт (число)", "fact_value_clean"),
+    "RAW_T2": ("Факт (число)", "fact_value_clean"),
+})
+# Суммарный размер файлов, начиная с которого DataLoader.read_many читает их в отдельных процессах
+PROCESS_POOL_MIN_BYTES = 8 * 1024 * 1024
+# Число ядер определяется один раз при импорте (ограничивает число процессов чтения)
+CPU_COUNT = os.cpu_count() or 1
+# Размер буфера файлов лога: сообщения копятся в памяти и пишутся крупными блоками
+LOG_BUFFER_SIZE = 64 * 1024
+# Подкаталог IN для кэша прочитанных листов исходных файлов (defaults.source_cache)
+SOURCE_CACHE_DIR_NAME = ".cache"
+# Число строк, которые append_csv_frame переводит в значения Python за один раз
+CSV_BLOCK_ROWS = 50_000
+# Корень проекта (каталог над src) определяется один раз при импорте
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 
 def build_settings_tree() -> SettingsTree:
@@ -190,6 +239,17 @@ def build_settings_tree() -> SettingsTree:
             #  - Можно указывать реальные ФИО/табельные номера из справочника (строки).
             "manager_name": "Не найден КМ",
             "manager_id": "90000009",
+            # use_float32: сужать ли числовые колонки свода (float64 → float32, int64 → int32) перед
+            # расчетом процентилей и выгрузкой СПОД; суммы факта по ключам и прирост считаются во float64
+            # и приводятся к float32 уже готовыми. Экономит память, но float32 хранит
+            # ~7 значащих цифр, поэтому FACT_VALUE (5 знаков после запятой) и ранги равных значений могут измениться.
+            "use_float32": False,  # True или False
+            # source_cache: сохранять прочитанные колонки исходных Excel в IN/.cache (pickle) и при повторном
+            # запуске с тем же файлом (размер и время изменения), листом и набором колонок читать их оттуда
+            # вместо разбора xlsx. Изменённый файл читается заново, а старый кэш этого файла удаляется.
+            # Выключено по умолчанию: кэш загружается через pickle, поэтому включать его можно, только если
+            # писать в IN могут лишь доверенные пользователи (подложенный .pkl выполнит произвольный код).
+            "source_cache": False,  # True или False
             # columns: общие колонки по умолчанию (используются, если в items для файла columns пустой массив)
             #  - Чтобы подставить другое поле из Excel, достаточно изменить "source".
             #  - Чтобы добавить ещё колонку, расширьте список и пропишите alias (английское имя) + source (русский заголовок).
@@ -425,6 +485,9 @@ def build_settings_tree() -> SettingsTree:
             },
             # wrap_text: включить перенос текста по строкам для всех ячеек
             "wrap_text": True,  # True - включить перенос текста, False - отключить
+            # zip_compress_level: уровень сжатия xlsx (0-9; None - уровень openpyxl по умолчанию, 6).
+            # 1 сохраняет книгу в несколько раз быстрее, файл получается примерно на 20% больше
+            "zip_compress_level": 1,
         },
         "report_layout": {
             # Управляет тем, какие листы попадают в основной Excel (пустой список = блок отключён).
@@ -433,6 +496,9 @@ def build_settings_tree() -> SettingsTree:
             "spod_variants": ["SPOD_SCENARIO", "SPOD_SCENARIO_PERCENTILE"],
             # raw_sheets — очищенные исходники T-0/T-1/T-2.
             "raw_sheets": ["RAW_T0", "RAW_T1", "RAW_T2"],
+            # raw_format: "xlsx" — RAW-листы в основном Excel; "csv" — каждый RAW в отдельном CSV-файле
+            # рядом с отчётом (без сортировки и форматирования Excel, запись в разы быстрее)
+            "raw_format": "xlsx",
         },
     }
 
@@ -451,7 +517,8 @@ def build_drop_rules(rule_items: List[Dict[str, Any]]) -> Dict[str, Dict[str, An
     """Возвращает словарь правил фильтрации по колонкам.
     
     Каждое правило содержит:
-    - values: кортеж запрещенных значений
+    - values: множество (frozenset) запрещенных значений
+    - values_lower: те же значения в нижнем регистре — готовое множество для сравнения в drop_forbidden_rows
     - remove_unconditionally: убирать ли всегда (по умолчанию True)
     - check_by_inn: проверять ли по ИНН (по умолчанию False)
     - check_by_tn: проверять ли по ТН (по умолчанию False)
@@ -460,13 +527,14 @@ def build_drop_rules(rule_items: List[Dict[str, Any]]) -> Dict[str, Dict[str, An
         rule_items: Список правил из конфигурации
     
     Returns:
-        Словарь {alias: {values: tuple, remove_unconditionally: bool, check_by_inn: bool, check_by_tn: bool}}
+        Словарь {alias: {values: frozenset, values_lower: frozenset, remove_unconditionally: bool, check_by_inn: bool, check_by_tn: bool}}
     """
     result = {}
     for rule in rule_items:
         alias = rule["alias"]
         result[alias] = {
-            "values": tuple(rule["values"]),
+            "values": frozenset(rule["values"]),
+            "values_lower": frozenset(value.lower() for value in rule["values"]),
             "remove_unconditionally": rule.get("remove_unconditionally", True),
             "check_by_inn": rule.get("check_by_inn", False),
             "check_by_tn": rule.get("check_by_tn", False),
@@ -474,6 +542,16 @@ def build_drop_rules(rule_items: List[Dict[str, Any]]) -> Dict[str, Dict[str, An
     return result
 
 
+def get_file_index(file_section: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Строит индекс {key: item} по секции files; вызывается один раз на запуск."""
+
+    index: Dict[str, Dict[str, Any]] = {}
+    for item in file_section["items"]:
+        # При повторяющихся ключах побеждает первое вхождение, как в get_file_meta
+        index.setdefault(item["key"], item)
+    return index
+
+
 def get_file_meta(file_section: Dict[str, Any], key: str) -> Dict[str, Any]:
     """Ищет метаданные файла по ключу."""
 
@@ -553,35 +631,116 @@ def get_file_filters(file_section: Dict[str, Any], file_key: str, defaults: Dict
         return {"drop_rules": [], "in_rules": []}
 
 
+@dataclass(frozen=True)
+class FileSettings:
+    """Настройки одного файла из секции files, разрешённые один раз с учётом defaults.
+
+    Атрибуты:
+        key: Ключ файла ("current", "previous", "previous2", "single", "2025_M-01", ...)
+        file_name: Имя файла из items (как в настройках)
+        sheet: Имя листа Excel
+        columns: Список колонок (alias/source)
+        filters: Фильтры файла (drop_rules и in_rules в исходном виде)
+        drop_rules: Правила удаления, подготовленные build_drop_rules
+        rename_map: Маппинг source → alias
+        alias_to_source: Маппинг alias → source
+    """
+
+    key: str
+    file_name: str
+    sheet: str
+    columns: List[Dict[str, str]]
+    filters: Dict[str, Any]
+    drop_rules: Dict[str, Dict[str, Any]]
+    rename_map: Dict[str, str]
+    alias_to_source: Dict[str, str]
+
+    @property
+    def in_rules(self) -> List[Dict[str, Any]]:
+        """Правила включения строк (IN фильтры)."""
+        return self.filters.get("in_rules", [])
+
+
+def resolve_file_settings(
+    file_section: Dict[str, Any],
+    file_key: str,
+    defaults: Dict[str, Any],
+    use_defaults: bool = True,
+) -> FileSettings:
+    """Собирает все настройки файла за один проход по конфигурации.
+
+    Args:
+        file_section: Секция files из настроек
+        file_key: Ключ файла
+        defaults: Секция defaults из настроек
+        use_defaults: Использовать ли defaults для пустых columns/drop_rules
+
+    Returns:
+        FileSettings с колонками, фильтрами, правилами удаления и маппингами
+
+    Raises:
+        KeyError: Если файл с таким ключом не описан в items
+    """
+    meta = get_file_meta(file_section, file_key)
+    columns = get_file_columns(file_section, file_key, defaults, use_defaults=use_defaults)
+    filters = get_file_filters(file_section, file_key, defaults, use_defaults=use_defaults)
+    column_profiles = build_column_profiles(columns)
+    return FileSettings(
+        key=file_key,
+        file_name=meta.get("file_name", ""),
+        sheet=resolve_sheet_name(file_section, file_key),
+        columns=columns,
+        filters=filters,
+        drop_rules=build_drop_rules(filters.get("drop_rules", [])),
+        rename_map=column_profiles["rename_map"],
+        alias_to_source=column_profiles["alias_to_source"],
+    )
+
+
+# Дата турнира в настройках задаётся как ДД/ММ/ГГГГ
+CONTEST_DATE_PATTERN = re.compile(r"(\d{2})/(\d{2})/(\d{4})", re.ASCII)
+
+
+@functools.lru_cache(maxsize=None)
 def parse_contest_date(contest_date: str) -> str:
     """Возвращает дату турнира в формате ISO."""
 
-    parsed = dt.datetime.strptime(contest_date, "%d/%m/%Y")
-    return parsed.strftime("%Y-%m-%d")
+    match = CONTEST_DATE_PATTERN.fullmatch(contest_date)
+    if match is None:
+        # Нестандартная запись (например, без ведущих нулей) — разбираем через strptime
+        parsed = dt.datetime.strptime(contest_date, "%d/%m/%Y")
+        return parsed.strftime("%Y-%m-%d")
+    day, month, year = match.groups()
+    # dt.date проверяет корректность даты и выбрасывает ValueError, как и strptime
+    return dt.date(int(year), int(month), int(day)).isoformat()
+
+
+# Колонки менеджера по режимам назначения (только для чтения: один экземпляр на весь модуль)
+MANAGER_COLUMNS: Mapping[str, Mapping[str, str]] = MappingProxyType({
+    "latest": MappingProxyType({
+        "id": "Таб. номер ВКО_Актуальный",
+        "name": "ВКО_Актуальный",
+    }),
+    "current_period": MappingProxyType({
+        "id": "Таб. номер ВКО_T0",
+        "name": "ВКО_T0",
+    }),
+    "previous_period": MappingProxyType({
+        "id": "Таб. номер ВКО_T1",
+        "name": "ВКО_T1",
+    }),
+})
 
 
 def get_manager_columns(mode: str) -> Mapping[str, str]:
     """Возвращает имена колонок для выбранного режима назначения менеджера."""
 
-    mapping = {
-        "latest": {
-            "id": "Таб. номер ВКО_Актуальный",
-            "name": "ВКО_Актуальный",
-        },
-        "current_period": {
-            "id": "Таб. номер ВКО_T0",
-            "name": "ВКО_T0",
-        },
-        "previous_period": {
-            "id": "Таб. номер ВКО_T1",
-            "name": "ВКО_T1",
-        },
-    }
-    if mode not in mapping:
+    try:
+        return MANAGER_COLUMNS[mode]
+    except KeyError:
         raise ValueError(
             "Недопустимое значение manager_mode. Используйте latest, current_period или previous_period."
-        )
-    return mapping[mode]
+        ) from None
 
 
 def ensure_directories(directories: Iterable[Path]) -> None:
@@ -609,6 +768,85 @@ def format_identifier(value: Any, total_length: int, fill_char: str) -> str:
     return text
 
 
+def format_identifier_series(series: pd.Series, total_length: int, fill_char: str) -> pd.Series:
+    """Векторный вариант format_identifier для целой колонки.
+
+    Args:
+        series: Колонка с идентификаторами
+        total_length: Итоговая длина идентификатора
+        fill_char: Символ для дополнения слева
+
+    Returns:
+        Series строк того же индекса, совпадающая с поэлементным вызовом format_identifier
+    """
+
+    text = normalize_string_series(series)
+
+    # Табельные номера и ИНН многократно повторяются: форматируем только уникальные тексты,
+    # а строки раскладываем по кодам — одинаковые идентификаторы разделяют один объект str.
+    codes, uniques = pd.factorize(text)
+    unique_text = pd.Series(uniques, dtype=object)
+    digits = unique_text.str.replace(r"\D", "", regex=True)
+    if fill_char == "0":
+        padded = digits.str.zfill(total_length)
+    else:
+        padded = digits.str.rjust(total_length, fill_char)
+    formatted = padded.where(digits.str.len() > 0, unique_text).to_numpy(dtype=object)
+    return pd.Series(formatted.take(codes), index=series.index, dtype=object)
+
+
+def normalize_identifier_columns(df: pd.DataFrame, identifiers: Mapping[str, Mapping[str, Any]]) -> None:
+    """Форматирует колонки табельного номера и ИНН загруженного DataFrame (на месте).
+
+    Args:
+        df: DataFrame с колонками manager_id и client_id
+        identifiers: Настройки форматирования идентификаторов (fill_char, total_length)
+    """
+
+    for alias in ("manager_id", "client_id"):
+        spec = identifiers[alias]
+        df[alias] = format_identifier_series(df[alias], spec["total_length"], spec["fill_char"])
+
+
+def downcast_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Сужает числовые колонки: float64 → float32, int64 → int32."""
+
+    float_columns = df.select_dtypes(include="float64").columns
+    int_columns = df.select_dtypes(include="int64").columns
+    if len(float_columns) == 0 and len(int_columns) == 0:
+        return df
+    narrowed = df.copy()
+    narrowed[float_columns] = narrowed[float_columns].astype("float32")
+    narrowed[int_columns] = narrowed[int_columns].astype("int32")
+    return narrowed
+
+
+# Размер блока для расчета прироста: временный буфер (T-1 - T-2) остается в кэше процессора
+GROWTH_BLOCK_SIZE = 65536
+
+
+def growth_values(
+    fact_t0: np.ndarray, fact_t1: np.ndarray, fact_t2: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Прирост: T-0 - T-1, а при наличии T-2 — (T-0 - T-1) - (T-1 - T-2).
+
+    Скобки сохраняются (T0 - 2*T1 + T2 округлялось бы иначе). Разность T-1 - T-2 считается
+    поблочно в один переиспользуемый буфер и сразу вычитается из результата, поэтому
+    промежуточный массив длины всей таблицы не создается.
+    """
+
+    growth = np.subtract(fact_t0, fact_t1)
+    if fact_t2 is None:
+        return growth
+    decline = np.empty(min(GROWTH_BLOCK_SIZE, len(growth)), dtype=growth.dtype)
+    for start in range(0, len(growth), GROWTH_BLOCK_SIZE):
+        stop = min(start + GROWTH_BLOCK_SIZE, len(growth))
+        block = decline[: stop - start]
+        np.subtract(fact_t1[start:stop], fact_t2[start:stop], out=block)
+        growth[start:stop] -= block
+    return growth
+
+
 def safe_to_float(value: Any) -> Optional[float]:
     """Безопасно приводит значение к float."""
 
@@ -618,26 +856,152 @@ def safe_to_float(value: Any) -> Optional[float]:
         return None
 
 
-def build_filter_mask(series: pd.Series, condition: str) -> pd.Series:
-    """Возвращает булев маск для фильтрации значений по условию."""
+def safe_to_float_series(series: pd.Series) -> pd.Series:
+    """Векторный вариант safe_to_float для целой колонки (нераспознанные значения → NaN).
+
+    Args:
+        series: Колонка с исходными значениями факта
+
+    Returns:
+        Series float64 с тем же индексом
+    """
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(float)
+
+    values = series.to_numpy(dtype=object)
+    # Числа из openpyxl и «чистые» числовые строки переводятся сразу, без текстовой очистки
+    result = np.asarray(pd.to_numeric(values, errors="coerce"), dtype=float)
+    # bool pandas считает числом (0/1), а safe_to_float — нет: str(True) не парсится
+    for position in np.flatnonzero((result == 0.0) | (result == 1.0)):
+        if isinstance(values[position], (bool, np.bool_)):
+            result[position] = np.nan
+
+    # Текстовую очистку (пробелы-разделители тысяч, десятичная запятая) проходят только оставшиеся значения
+    leftover = np.isnan(result) & ~pd.isna(values)
+    if leftover.any():
+        text = pd.Series(values[leftover], dtype=object).astype(str)
+        text = text.str.replace(" ", "", regex=False).str.replace(",", ".", regex=False)
+        cleaned = np.asarray(pd.to_numeric(text, errors="coerce"), dtype=float)
+        # Записи, которые понимает float(), но не парсер pandas (например, "1_000"), добираем поэлементно
+        retry = np.isnan(cleaned) & (text.str.lower() != "nan").to_numpy()
+        if retry.any():
+            cleaned[retry] = [safe_to_float(value) for value in text.to_numpy()[retry]]
+        result[leftover] = cleaned
+    return pd.Series(result, index=series.index)
+
+
+def normalized_isin(series: pd.Series, values: Iterable[str]) -> pd.Series:
+    """Проверяет вхождение str(value).strip().lower() в набор values для всей колонки.
+
+    Векторный вариант проверки вида `str(x).strip().lower() in values` без вызова Python-функции
+    на каждую строку. Пустые значения не исключаются: None даёт "", NaN — "nan"
+    (как у normalize_string), поэтому обработку пропусков вызывающий код добавляет сам.
+
+    Args:
+        series: Колонка для проверки
+        values: Допустимые значения в нижнем регистре
+
+    Returns:
+        Булева Series с тем же индексом
+    """
+
+    return normalize_string_series(series).str.lower().isin(list(values))
+
+
+def map_with_default(
+    series: pd.Series,
+    mapping: pd.Series,
+    default: Any = "",
+    factorized: Optional[Tuple[np.ndarray, Any]] = None,
+    fill_na: bool = False,
+) -> pd.Series:
+    """Сопоставляет значения по справочнику, подставляя default для отсутствующих ключей.
+
+    При fill_na=False результат совпадает с series.map(defaultdict(lambda: default, mapping.to_dict())):
+    пустые значения справочника сохраняются. При fill_na=True они тоже заменяются на default,
+    как у series.map(mapping).fillna(default). При повторах ключа берётся последнее значение.
+    Вместо поиска в словаре на каждую строку колонка кодируется pd.factorize, уникальные значения
+    сопоставляются с индексом справочника хеш-поиском pandas (get_indexer), а результат
+    раскладывается по строкам выборкой по кодам. Готовый pd.factorize(series) можно передать
+    в factorized, если по той же колонке применяется несколько справочников.
+    """
+
+    if not mapping.index.is_unique:
+        mapping = mapping[~mapping.index.duplicated(keep="last")]
+    codes, uniques = factorized if factorized is not None else pd.factorize(series)
+    positions = mapping.index.get_indexer(uniques)
+    # Последний элемент (код -1 у пустых значений и позиция -1 у отсутствующих ключей) — default
+    lookup = np.append(mapping.to_numpy(dtype=object), np.array([default], dtype=object))
+    if fill_na:
+        lookup[pd.isna(lookup)] = default
+    mapped = lookup[np.append(positions, -1)[codes]]
+    return pd.Series(mapped, index=series.index, name=series.name).infer_objects()
+
+
+def nunique_by_codes(keys: pd.Series, values: pd.Series) -> pd.Series:
+    """Возвращает values.groupby(keys).nunique(), считая уникальные пары по целочисленным кодам.
+
+    Ключ и значение кодируются pd.factorize, поэтому строки хешируются один раз, а уникальные
+    пары и их количество на ключ находятся в NumPy (np.unique + np.bincount; если значения
+    не повторяются, достаточно np.bincount по кодам ключа). Пустые ключи
+    отбрасываются, пустые значения не считаются — как у groupby(...).nunique().
+    """
+
+    key_codes, key_uniques = pd.factorize(keys, sort=True)
+    value_codes, value_uniques = pd.factorize(values)
+    has_value = value_codes >= 0
+    valid = (key_codes >= 0) & has_value
+    if np.count_nonzero(has_value) == len(value_uniques):
+        # Каждое значение встречается один раз (ИНН в своде по клиентам): пары уже уникальны,
+        # и количество на ключ — просто число строк, без сортировки пар
+        counts = np.bincount(key_codes[valid], minlength=len(key_uniques))
+    else:
+        value_count = len(value_uniques)
+        pairs = np.unique(key_codes[valid].astype(np.int64, copy=False) * value_count + value_codes[valid])
+        counts = np.bincount(pairs // value_count, minlength=len(key_uniques))
+    return pd.Series(counts, index=pd.Index(key_uniques, name=keys.name), name=values.name)
+
+
+# Операторы фильтров вида ">0", "<=1000", "==0", "!=5" (порядок важен: двухсимвольные раньше односимвольных).
+FILTER_OPERATOR_TOKENS: Tuple[str, ...] = ("<=", ">=", "==", "!=", ">", "<", "=")
+FILTER_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt,
+    "=": operator.eq,
+}
+
+
+# Готовые сравнения для типовых фильтров из настроек (spod.variants, percentile_filter) — без разбора строки
+FAST_FILTERS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    ">0": lambda values: np.asarray(values > 0.0, dtype=bool),
+    ">=0": lambda values: np.asarray(values >= 0.0, dtype=bool),
+    "<0": lambda values: np.asarray(values < 0.0, dtype=bool),
+    "<=0": lambda values: np.asarray(values <= 0.0, dtype=bool),
+}
+
+
+@functools.lru_cache(maxsize=64)
+def compile_filter(condition: str) -> Callable[[np.ndarray], np.ndarray]:
+    """Разбирает условие фильтра и возвращает функцию сравнения над NumPy-массивом.
+
+    Результат кэшируется по строке условия: одинаковые фильтры SPOD и процентилей разбираются один раз.
+    """
+
+    fast_filter = FAST_FILTERS.get(condition)
+    if fast_filter is not None:
+        return fast_filter
 
     normalized = condition.strip().lower().replace(" ", "")
     if not normalized or normalized in ("all", "все"):
-        return pd.Series(True, index=series.index)
+        return lambda values: np.ones(len(values), dtype=bool)
 
-    # Поддерживаются операторы сравнения и записи вида ">0", "<=1000", "==0", "!=5".
     # Часть после оператора парсится как число (точка или запятая).
-    available_ops = {
-        ">=": operator.ge,
-        "<=": operator.le,
-        "==": operator.eq,
-        "!=": operator.ne,
-        ">": operator.gt,
-        "<": operator.lt,
-        "=": operator.eq,
-    }
-
-    for token in ("<=", ">=", "==", "!=", ">", "<", "="):
+    for token in FILTER_OPERATOR_TOKENS:
         if normalized.startswith(token):
             threshold_text = normalized[len(token) :]
             try:
@@ -646,8 +1010,8 @@ def build_filter_mask(series: pd.Series, condition: str) -> pd.Series:
                 raise ValueError(
                     f"Не удалось распознать значение фильтра '{condition}'."
                 ) from error
-            comparator = available_ops[token]
-            return comparator(series, threshold)
+            comparator = FILTER_OPERATORS[token]
+            return lambda values: np.asarray(comparator(values, threshold), dtype=bool)
 
     raise ValueError(
         "Фильтр FACT_VALUE должен начинаться с одного из операторов "
@@ -655,15 +1019,88 @@ def build_filter_mask(series: pd.Series, condition: str) -> pd.Series:
     )
 
 
-def _compute_percentile_pair(series: pd.Series) -> Tuple[pd.Series, pd.Series, pd.Series, pd.Series, pd.Series, pd.Series]:
-    """Вспомогательная функция: возвращает (обогнал_%, обогнали_%, обогнал_кол, обогнали_кол, равных_кол, всего_кол) для серии."""
+def build_filter_mask(series: pd.Series, condition: str) -> pd.Series:
+    """Возвращает булев маск для фильтрации значений по условию."""
+
+    return pd.Series(compile_filter(condition)(series.to_numpy()), index=series.index, copy=False)
+
+
+def _rank_bounds(values: np.ndarray, group_codes: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Возвращает (rank_min, rank_max, размер группы) для каждого значения за одну сортировку.
+
+    Ранги совпадают с Series.rank(method="min") и rank(method="max") внутри группы: после
+    сортировки по (группа, значение) равные значения образуют непрерывные серии, начало серии
+    даёт rank_min, конец — rank_max.
+
+    Args:
+        values: Значения без NaN
+        group_codes: Неотрицательные коды групп той же длины (None — одна общая группа)
+
+    Returns:
+        Кортеж массивов int64 в исходном порядке значений
+    """
+
+    size = len(values)
+    if size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    if group_codes is None:
+        # Одна общая группа: границы серий равных значений дают два бинарных поиска по отсортированной копии
+        sorted_values = np.sort(values)
+        rank_min = np.searchsorted(sorted_values, values, side="left").astype(np.int64) + 1
+        rank_max = np.searchsorted(sorted_values, values, side="right").astype(np.int64)
+        return rank_min, rank_max, np.full(size, size, dtype=np.int64)
+
+    # Сортировка по (группа, значение) в два устойчивых прохода — по значению, затем по коду группы.
+    # Кодов групп (ТБ, ГОСБ) немного: в int16 второй проход numpy выполняет поразрядной сортировкой за O(N).
+    order = np.argsort(values, kind="stable")
+    sorted_codes = group_codes[order]
+    if sorted_codes.max() <= np.iinfo(np.int16).max:
+        sorted_codes = sorted_codes.astype(np.int16)
+    order = order[np.argsort(sorted_codes, kind="stable")]
+    sorted_values = values[order]
+    sorted_groups = group_codes[order]
+
+    group_change = np.empty(size, dtype=bool)
+    group_change[0] = True
+    group_change[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    run_change = group_change.copy()
+    run_change[1:] |= sorted_values[1:] != sorted_values[:-1]
+
+    group_starts = np.flatnonzero(group_change)
+    group_ends = np.append(group_starts[1:], size)
+    run_starts = np.flatnonzero(run_change)
+    run_ends = np.append(run_starts[1:], size)
+    group_id = np.cumsum(group_change) - 1
+    run_id = np.cumsum(run_change) - 1
+
+    offset = group_starts[group_id]
+    rank_min = np.empty(size, dtype=np.int64)
+    rank_max = np.empty(size, dtype=np.int64)
+    group_size = np.empty(size, dtype=np.int64)
+    rank_min[order] = run_starts[run_id] - offset + 1
+    rank_max[order] = run_ends[run_id] - offset
+    group_size[order] = (group_ends - group_starts)[group_id]
+    return rank_min, rank_max, group_size
+
+
+def _compute_percentile_pair(series: pd.Series) -> Tuple[pd.Series, pd.Series, pd.Series, pd.Series, pd.Series, int]:
+    """Вспомогательная функция: возвращает (обогнал_%, обогнали_%, обогнал_кол, обогнали_кол, равных_кол, всего_кол) для серии.
+    
+    всего_кол одинаково для всех строк серии, поэтому возвращается числом: вызывающий код
+    присваивает его колонке целиком (pandas распространяет скаляр), без промежуточной Series длины N.
+    """
 
     if series.empty:
         empty = pd.Series(0.0, index=series.index)
-        return empty, empty, empty, empty, empty, empty
-
-    rank_min = series.rank(method="min", ascending=True)
-    rank_max = series.rank(method="max", ascending=True)
+        return empty, empty, empty, empty, empty, 0
+
+    # Как и Series.rank, пропуски не ранжируются, но учитываются в общем количестве
+    values = series.to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    rank_min = np.full(len(values), np.nan)
+    rank_max = np.full(len(values), np.nan)
+    rank_min[present], rank_max[present], _ = _rank_bounds(values[present])
     count_equal = rank_max - rank_min + 1
     count_less = rank_min - 1
     count_greater = len(series) - rank_max
@@ -672,7 +1109,17 @@ def _compute_percentile_pair(series: pd.Series) -> Tuple[pd.Series, pd.Series, p
     obognal = ((count_less + 0.5 * (count_equal - 1)) / total_count) * 100
     obognali = ((count_greater + 0.5 * (count_equal - 1)) / total_count) * 100
 
-    return obognal, obognali, count_less, count_greater, count_equal - 1, pd.Series(total_count, index=series.index)
+    def as_series(array: np.ndarray) -> pd.Series:
+        return pd.Series(array, index=series.index)
+
+    return (
+        as_series(obognal),
+        as_series(obognali),
+        as_series(count_less),
+        as_series(count_greater),
+        as_series(count_equal - 1),
+        total_count,
+    )
 
 
 def append_percentile_columns(
@@ -720,16 +1167,13 @@ def _ensure_manager_identity(
 ) -> str:
     """Возвращает табельный номер с учётом обязательной длины."""
 
+    manager_identifier = identifiers["manager_id"]
     if not value or str(value).strip() == "":
-        return format_identifier(
-            default_value,
-            total_length=identifiers["manager_id"]["total_length"],
-            fill_char=identifiers["manager_id"]["fill_char"],
-        )
+        value = default_value
     return format_identifier(
         value,
-        total_length=identifiers["manager_id"]["total_length"],
-        fill_char=identifiers["manager_id"]["fill_char"],
+        total_length=manager_identifier["total_length"],
+        fill_char=manager_identifier["fill_char"],
     )
 
 
@@ -774,7 +1218,9 @@ def build_assignment_table(
         # Добавляем ТБ, если его нет, определяя по табельному номеру
         if "ТБ" not in assignments.columns and "tb" not in assignments.columns:
             if manager_tb_mapping is not None:
-                assignments["ТБ"] = assignments[SELECTED_MANAGER_ID_COL].map(manager_tb_mapping).fillna("")
+                assignments["ТБ"] = map_with_default(
+                    assignments[SELECTED_MANAGER_ID_COL], manager_tb_mapping, fill_na=True
+                )
             else:
                 assignments["ТБ"] = ""
         
@@ -791,62 +1237,64 @@ def build_assignment_table(
         defaults["manager_id"], default_value=defaults["manager_id"], identifiers=identifiers
     )
 
-    records: List[Dict[str, Any]] = []
-    for row in variant_df.itertuples(index=False):
-        base = {column: getattr(row, column, None) for column in key_columns}
-        growth = getattr(row, "Прирост", 0.0) or 0.0
-        fact_t0 = getattr(row, "Факт_T0", 0.0) or 0.0
-        fact_t1 = getattr(row, "Факт_T1", 0.0) or 0.0
-
-        manager_t0 = getattr(row, "Таб. номер ВКО_T0", None)
-        manager_name_t0 = getattr(row, "ВКО_T0", None) or default_name
-        manager_t0 = _ensure_manager_identity(
-            manager_t0 or default_id, default_value=default_id, identifiers=identifiers
+    manager_identifier = identifiers["manager_id"]
+    # Параметры форматирования читаем один раз, а не при построении каждого периода
+    manager_id_length = manager_identifier["total_length"]
+    manager_id_fill_char = manager_identifier["fill_char"]
+
+    def column_or(name: str, default: Any) -> pd.Series:
+        """Колонка variant_df или константа default, если колонки нет."""
+        if name in variant_df.columns:
+            return variant_df[name]
+        return pd.Series(default, index=variant_df.index, dtype=object if default is None else float)
+
+    growth = pd.to_numeric(column_or("Прирост", 0.0), errors="coerce").fillna(0.0)
+    fact_t0 = pd.to_numeric(column_or("Факт_T0", 0.0), errors="coerce").fillna(0.0)
+    fact_t1 = pd.to_numeric(column_or("Факт_T1", 0.0), errors="coerce").fillna(0.0)
+
+    def period_assignments(period: str, mask: pd.Series) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Строит назначения на КМ периода T0/T1 для отобранных строк и их позиции в variant_df."""
+        source = variant_df[mask]
+        part = source[key_columns].copy()
+
+        # Пустой табельный номер заменяется табельным номером по умолчанию, затем приводится к нужной длине
+        manager_ids = column_or(f"Таб. номер ВКО_{period}", None)[mask]
+        missing_ids = manager_ids.isna() | (normalize_string_series(manager_ids) == "")
+        part[SELECTED_MANAGER_ID_COL] = format_identifier_series(
+            manager_ids.mask(missing_ids, default_id),
+            manager_id_length,
+            manager_id_fill_char,
         )
-
-        manager_t1 = getattr(row, "Таб. номер ВКО_T1", None)
-        manager_name_t1 = getattr(row, "ВКО_T1", None) or default_name
-        manager_t1 = _ensure_manager_identity(
-            manager_t1 or default_id, default_value=default_id, identifiers=identifiers
+        manager_names = column_or(f"ВКО_{period}", None)[mask]
+        part[SELECTED_MANAGER_NAME_COL] = manager_names.mask(
+            manager_names.isna() | (manager_names == ""), default_name
         )
-
-        if fact_t0 or growth > 0:
-            record = {
-                **base,
-                SELECTED_MANAGER_ID_COL: manager_t0,
-                SELECTED_MANAGER_NAME_COL: manager_name_t0,
-                "Источник": "T0",
-                "Факт_T0": fact_t0,
-                "Факт_T1": 0.0,
-                "Прирост": max(growth, 0.0),
-            }
-            # Добавляем ТБ, если его нет, определяя по табельному номеру
-            if "ТБ" not in record and "tb" not in record:
-                if manager_tb_mapping is not None:
-                    record["ТБ"] = manager_tb_mapping.get(manager_t0, "")
-                else:
-                    record["ТБ"] = ""
-            records.append(record)
-
-        if fact_t1 or growth < 0:
-            record = {
-                **base,
-                SELECTED_MANAGER_ID_COL: manager_t1,
-                SELECTED_MANAGER_NAME_COL: manager_name_t1,
-                "Источник": "T1",
-                "Факт_T0": 0.0,
-                "Факт_T1": fact_t1,
-                "Прирост": min(growth, 0.0),
-            }
-            # Добавляем ТБ, если его нет, определяя по табельному номеру
-            if "ТБ" not in record and "tb" not in record:
-                if manager_tb_mapping is not None:
-                    record["ТБ"] = manager_tb_mapping.get(manager_t1, "")
-                else:
-                    record["ТБ"] = ""
-            records.append(record)
-
-    assignments = pd.DataFrame(records)
+        part["Источник"] = period
+        if period == "T0":
+            part["Факт_T0"] = fact_t0[mask]
+            part["Факт_T1"] = 0.0
+            part["Прирост"] = growth[mask].clip(lower=0.0)
+        else:
+            part["Факт_T0"] = 0.0
+            part["Факт_T1"] = fact_t1[mask]
+            part["Прирост"] = growth[mask].clip(upper=0.0)
+        return part, np.flatnonzero(mask.to_numpy())
+
+    # Строка попадает в T0, если есть факт T0 или положительный прирост, и в T1 — если есть факт T1
+    # или отрицательный прирост (одна строка может дать обе записи).
+    t0_part, t0_positions = period_assignments("T0", (fact_t0 != 0) | (growth > 0))
+    t1_part, t1_positions = period_assignments("T1", (fact_t1 != 0) | (growth < 0))
+
+    # Сохраняем порядок построчного обхода: для каждой исходной строки сначала T0, затем T1
+    order = np.argsort(np.concatenate([t0_positions * 2, t1_positions * 2 + 1]), kind="stable")
+    assignments = pd.concat([t0_part, t1_part], ignore_index=True).iloc[order].reset_index(drop=True)
+
+    # Добавляем ТБ, если его нет, определяя по табельному номеру (одно сопоставление на обе части T0/T1)
+    if "ТБ" not in assignments.columns and "tb" not in assignments.columns:
+        if manager_tb_mapping is not None:
+            assignments["ТБ"] = map_with_default(assignments[SELECTED_MANAGER_ID_COL], manager_tb_mapping, "")
+        else:
+            assignments["ТБ"] = ""
     if assignments.empty:
         columns = key_columns + [
             SELECTED_MANAGER_ID_COL,
@@ -867,33 +1315,79 @@ def build_assignment_table(
     return assignments
 
 
+def first_values_by_manager(dataframes: Iterable[pd.DataFrame], columns: Iterable[str]) -> Dict[str, pd.Series]:
+    """Возвращает первое непустое значение каждой колонки для каждого табельного номера.
+
+    Для каждой колонки эквивалент concat(...).groupby("manager_id")[column].first() без построения
+    groupby: строки с непустым значением переносятся вперёд (стабильно), затем остаётся первая
+    строка на табельный номер. Менеджер, у которого все значения пустые, получает NaN, как и в groupby.
+    Табельные номера всех DataFrame объединяются и кодируются pd.factorize один раз на все колонки.
+
+    Args:
+        dataframes: DataFrame с колонкой manager_id (пустые и без колонки пропускаются;
+            DataFrame без колонки значения не участвует в расчёте этой колонки)
+        columns: Колонки со значением (tb, gosb)
+
+    Returns:
+        Словарь {колонка: Series {manager_id: значение}, отсортированный по manager_id}
+    """
+
+    columns = list(columns)
+    frames = [
+        df
+        for df in dataframes
+        if not df.empty and "manager_id" in df.columns and any(column in df.columns for column in columns)
+    ]
+    if not frames:
+        # Если нет данных, возвращаем пустые Series
+        return {column: pd.Series(dtype=object, name=column) for column in columns}
+
+    manager_ids = pd.concat([df["manager_id"] for df in frames], ignore_index=True)
+    # Коды в порядке сортировки табельных номеров (как sort_index); пустой номер получает код -1
+    manager_codes, manager_uniques = pd.factorize(manager_ids, sort=True)
+
+    mappings: Dict[str, pd.Series] = {}
+    for column in columns:
+        column_frames = [df for df in frames if column in df.columns]
+        if not column_frames:
+            mappings[column] = pd.Series(dtype=object, name=column)
+            continue
+        # Объединяются DataFrame (а не Series), чтобы dtype результата определялся так же, как при concat таблиц
+        values = pd.concat([df[[column]] for df in column_frames], ignore_index=True)[column]
+        codes = manager_codes
+        if len(column_frames) < len(frames):
+            codes = codes[np.concatenate([np.full(len(df), column in df.columns) for df in frames])]
+        has_manager = codes >= 0
+        codes = codes[has_manager]
+        values = values[has_manager]
+        # Если у одного менеджера несколько значений, берём первое непустое (можно изменить логику на most_common)
+        order = np.argsort(values.isna().to_numpy(), kind="stable")
+        first_codes, first_rows = np.unique(codes[order], return_index=True)
+        mappings[column] = (
+            values.iloc[order[first_rows]]
+            .set_axis(pd.Index(manager_uniques[first_codes], name="manager_id"))
+            .rename(column)
+        )
+    return mappings
+
+
+def build_manager_attr_mappings(
+    current_df: pd.DataFrame,
+    previous_df: pd.DataFrame,
+) -> Tuple[pd.Series, pd.Series]:
+    """Строит справочники табельного номера менеджера → ТБ и → ГОСБ за один проход по исходным данным."""
+
+    mappings = first_values_by_manager([current_df, previous_df], ["tb", "gosb"])
+    return mappings["tb"], mappings["gosb"]
+
+
 def build_manager_tb_mapping(
     current_df: pd.DataFrame,
     previous_df: pd.DataFrame,
 ) -> pd.Series:
     """Строит словарь соответствия табельного номера менеджера и ТБ из исходных данных."""
-    
-    # Собираем данные из обоих датафреймов
-    dataframes_to_concat = []
-    
-    # Добавляем данные из current_df, если он не пустой и содержит нужные колонки
-    if not current_df.empty and "manager_id" in current_df.columns and "tb" in current_df.columns:
-        dataframes_to_concat.append(current_df[["manager_id", "tb"]].drop_duplicates())
-    
-    # Добавляем данные из previous_df, если он не пустой и содержит нужные колонки
-    if not previous_df.empty and "manager_id" in previous_df.columns and "tb" in previous_df.columns:
-        dataframes_to_concat.append(previous_df[["manager_id", "tb"]].drop_duplicates())
-    
-    # Объединяем все датафреймы
-    if dataframes_to_concat:
-        combined = pd.concat(dataframes_to_concat, ignore_index=True).drop_duplicates()
-        # Если у одного менеджера несколько ТБ, берём первое (можно изменить логику на most_common)
-        mapping = combined.groupby("manager_id")["tb"].first()
-    else:
-        # Если нет данных, возвращаем пустой Series
-        mapping = pd.Series(dtype=object, name="tb")
-    
-    return mapping
+
+    return first_values_by_manager([current_df, previous_df], ["tb"])["tb"]
 
 
 def build_manager_gosb_mapping(
@@ -901,28 +1395,8 @@ def build_manager_gosb_mapping(
     previous_df: pd.DataFrame,
 ) -> pd.Series:
     """Строит словарь соответствия табельного номера менеджера и ГОСБ из исходных данных."""
-    
-    # Собираем данные из обоих датафреймов
-    dataframes_to_concat = []
-    
-    # Добавляем данные из current_df, если он не пустой и содержит нужные колонки
-    if not current_df.empty and "manager_id" in current_df.columns and "gosb" in current_df.columns:
-        dataframes_to_concat.append(current_df[["manager_id", "gosb"]].drop_duplicates())
-    
-    # Добавляем данные из previous_df, если он не пустой и содержит нужные колонки
-    if not previous_df.empty and "manager_id" in previous_df.columns and "gosb" in previous_df.columns:
-        dataframes_to_concat.append(previous_df[["manager_id", "gosb"]].drop_duplicates())
-    
-    # Объединяем все датафреймы
-    if dataframes_to_concat:
-        combined = pd.concat(dataframes_to_concat, ignore_index=True).drop_duplicates()
-        # Если у одного менеджера несколько ГОСБ, берём первое
-        mapping = combined.groupby("manager_id")["gosb"].first()
-    else:
-        # Если нет данных, возвращаем пустой Series
-        mapping = pd.Series(dtype=object, name="gosb")
-    
-    return mapping
+
+    return first_values_by_manager([current_df, previous_df], ["gosb"])["gosb"]
 
 
 def build_client_summary_by_inn(
@@ -969,86 +1443,78 @@ def build_client_summary_by_inn(
     
     # Определяем колонку клиента
     client_col = "client_id" if "client_id" in variant_df.columns else variant_df.columns[0]
-    
-    # Подсчитываем количество разных ТН для каждого клиента в каждом файле
-    def count_unique_managers(df: pd.DataFrame, client_col: str, suffix: str) -> pd.Series:
-        """Подсчитывает количество уникальных ТН для каждого клиента."""
+    # Колонки T-2 (количество ТН, факт, слагаемое прироста) строятся только при непустом файле T-2
+    has_t2 = previous2_df is not None and not previous2_df.empty
+    
+    # Кол-во разных ТН и сумма фактов по клиенту считаются одним groupby.agg на файл:
+    # коды групп (хэширование строкового client_id) строятся один раз для обеих агрегаций
+    def client_stats(df: pd.DataFrame, suffix: str) -> pd.DataFrame:
+        """Возвращает Кол-во ТН_<suffix> и Факт_<suffix> для каждого клиента файла (индекс — клиент)."""
+        count_col = f"Кол-во ТН_{suffix}"
+        fact_col = f"Факт_{suffix}"
         if df.empty:
-            return pd.Series(dtype=int, name=f"Кол-во ТН_{suffix}")
-        return df.groupby(client_col)["manager_id"].nunique()
-    
-    # Подсчитываем сумму фактов для каждого клиента в каждом файле
-    def sum_facts(df: pd.DataFrame, client_col: str, suffix: str) -> pd.Series:
-        """Подсчитывает сумму фактов для каждого клиента."""
-        if df.empty or "fact_value_clean" not in df.columns:
-            return pd.Series(dtype=float, name=f"Факт_{suffix}")
-        return df.groupby(client_col)["fact_value_clean"].sum()
-    
-    # Подсчитываем для каждого файла
-    count_t0_series = count_unique_managers(current_df, client_col, "T0")
-    count_t1_series = count_unique_managers(previous_df, client_col, "T1")
-    
-    # Подсчитываем сумму фактов для каждого файла
-    fact_t0_series = sum_facts(current_df, client_col, "T0")
-    fact_t1_series = sum_facts(previous_df, client_col, "T1")
-    
-    # Начинаем с variant_df и добавляем колонки
-    result = variant_df[[client_col]].drop_duplicates().copy()
-    
-    # Добавляем количество ТН
-    result = result.set_index(client_col)
-    result["Кол-во ТН_T0"] = count_t0_series
-    result["Кол-во ТН_T1"] = count_t1_series
-    if previous2_df is not None and not previous2_df.empty:
-        count_t2_series = count_unique_managers(previous2_df, client_col, "T2")
-        result["Кол-во ТН_T2"] = count_t2_series
-        fact_t2_series = sum_facts(previous2_df, client_col, "T2")
-        result["Факт_T2"] = fact_t2_series
-    
-    # Добавляем факты
-    result["Факт_T0"] = fact_t0_series
-    result["Факт_T1"] = fact_t1_series
+            return pd.DataFrame({count_col: pd.Series(dtype=int), fact_col: pd.Series(dtype=float)})
+        aggregations = {count_col: ("manager_id", "nunique")}
+        if "fact_value_clean" in df.columns:
+            aggregations[fact_col] = ("fact_value_clean", "sum")
+        return df.groupby(client_col, sort=False).agg(**aggregations).reindex(columns=[count_col, fact_col])
+    
+    # Начинаем с variant_df и добавляем колонки количества ТН и фактов по каждому файлу
+    # Индекс клиентов строится один раз (уникальные значения в порядке первого появления)
+    client_index = pd.Index(variant_df[client_col].unique(), name=client_col)
+    result = pd.DataFrame(index=client_index)
+    file_frames = [(current_df, "T0"), (previous_df, "T1")]
+    if has_t2:
+        file_frames.append((previous2_df, "T2"))
+    result = result.join([client_stats(df, suffix) for df, suffix in file_frames], how="left")
     
     # ВАЖНО: заполняем NaN нулями ПЕРЕД расчетом прироста
     # Если клиента нет в каком-то периоде, факт должен быть 0, а не NaN
-    result["Факт_T0"] = result["Факт_T0"].fillna(0.0)
-    result["Факт_T1"] = result["Факт_T1"].fillna(0.0)
-    if "Факт_T2" in result.columns:
-        result["Факт_T2"] = result["Факт_T2"].fillna(0.0)
+    result = result.fillna({f"Факт_{suffix}": 0.0 for _, suffix in file_frames})
     
     # Вычисляем прирост
     # Формула с T-2: прирост = (T-0 - T-1) - (T-1 - T-2) = T0 - 2*T1 + T2
     # Если есть только T-0 (T-1=0, T-2=0), то прирост = T0 - 2*0 + 0 = T0
-    if previous2_df is not None and not previous2_df.empty and "Факт_T2" in result.columns:
-        result["Прирост"] = (result["Факт_T0"] - result["Факт_T1"]) - (result["Факт_T1"] - result["Факт_T2"])
-    else:
-        result["Прирост"] = result["Факт_T0"] - result["Факт_T1"]
-    
-    result = result.reset_index()
-    
-    # Добавляем выбранные ТН из variant_df (без ФИО и ТБ для промежуточных)
-    if "Таб. номер ВКО_T0" in variant_df.columns:
-        tn_t0 = variant_df[[client_col, "Таб. номер ВКО_T0"]].drop_duplicates()
-        result = result.merge(tn_t0, on=client_col, how="left")
-        result = result.rename(columns={"Таб. номер ВКО_T0": "ТН_T0"})
-    
-    if "Таб. номер ВКО_T1" in variant_df.columns:
-        tn_t1 = variant_df[[client_col, "Таб. номер ВКО_T1"]].drop_duplicates()
-        result = result.merge(tn_t1, on=client_col, how="left")
-        result = result.rename(columns={"Таб. номер ВКО_T1": "ТН_T1"})
-    
-    if previous2_df is not None and "Таб. номер ВКО_T2" in variant_df.columns:
-        tn_t2 = variant_df[[client_col, "Таб. номер ВКО_T2"]].drop_duplicates()
-        result = result.merge(tn_t2, on=client_col, how="left")
-        result = result.rename(columns={"Таб. номер ВКО_T2": "ТН_T2"})
+    # Считаем на массивах numpy: колонки уже выровнены по клиенту, промежуточные Series не нужны
+    result["Прирост"] = growth_values(
+        result["Факт_T0"].to_numpy(dtype=float),
+        result["Факт_T1"].to_numpy(dtype=float),
+        result["Факт_T2"].to_numpy(dtype=float) if has_t2 else None,
+    )
     
-    # Добавляем итоговый ТН с ФИО и ТБ
+    # Добавляем выбранные ТН из variant_df (без ФИО и ТБ для промежуточных) и итоговый ТН с ФИО.
+    # Каждый справочник — уникальные пары (клиент, значения) с клиентом в индексе; все они присоединяются
+    # одним join: при уникальных клиентах это одно выравнивание по индексу, иначе — последовательные
+    # соединения по индексу с тем же размножением строк, что и у прежних merge по колонке.
+    lookup_groups = [["Таб. номер ВКО_T0"], ["Таб. номер ВКО_T1"]]
+    if previous2_df is not None:
+        lookup_groups.append(["Таб. номер ВКО_T2"])
     if "Таб. номер ВКО_Актуальный" in variant_df.columns:
-        final_tn = variant_df[[client_col, "Таб. номер ВКО_Актуальный", "ВКО_Актуальный"]].drop_duplicates()
-        result = result.merge(final_tn, on=client_col, how="left")
-        
-        # Добавляем ТБ для итогового ТН
-        result["ТБ"] = result["Таб. номер ВКО_Актуальный"].map(manager_tb_mapping).fillna("")
+        lookup_groups.append(["Таб. номер ВКО_Актуальный", "ВКО_Актуальный"])
+    lookup_groups = [columns for columns in lookup_groups if columns[0] in variant_df.columns]
+    if len(client_index) == len(variant_df):
+        # Каждый клиент встречается в variant_df один раз: все справочники — одна выборка колонок по клиенту
+        lookups = [variant_df.set_index(client_col)[[col for columns in lookup_groups for col in columns]]]
+    else:
+        lookups = [
+            variant_df[[client_col] + columns].drop_duplicates().set_index(client_col)
+            for columns in lookup_groups
+        ]
+    if lookup_groups:
+        result = result.join(lookups, how="left")
+    result = result.reset_index().rename(
+        columns={
+            "Таб. номер ВКО_T0": "ТН_T0",
+            "Таб. номер ВКО_T1": "ТН_T1",
+            "Таб. номер ВКО_T2": "ТН_T2",
+        }
+    )
+    
+    # Добавляем ТБ для итогового ТН
+    if "Таб. номер ВКО_Актуальный" in result.columns:
+        result["ТБ"] = map_with_default(
+            result["Таб. номер ВКО_Актуальный"], manager_tb_mapping, fill_na=True
+        )
     
     # Переименовываем колонки для читаемости
     rename_map = {
@@ -1058,19 +1524,13 @@ def build_client_summary_by_inn(
     }
     result = result.rename(columns=rename_map)
     
-    # Заполняем пропуски в числовых колонках
-    for col in ["Кол-во ТН_T0", "Кол-во ТН_T1"]:
-        if col in result.columns:
-            result[col] = result[col].fillna(0).astype(int)
-    if "Кол-во ТН_T2" in result.columns:
-        result["Кол-во ТН_T2"] = result["Кол-во ТН_T2"].fillna(0).astype(int)
-    
-    # Заполняем пропуски в числовых колонках фактов и прироста
-    for col in ["Факт_T0", "Факт_T1", "Прирост"]:
-        if col in result.columns:
-            result[col] = result[col].fillna(0.0).astype(float)
-    if "Факт_T2" in result.columns:
-        result["Факт_T2"] = result["Факт_T2"].fillna(0.0).astype(float)
+    # Заполняем пропуски в числовых колонках (количество ТН — целые, факты и прирост — float)
+    # одним fillna и одним astype по словарям колонок
+    count_columns = [col for col in ["Кол-во ТН_T0", "Кол-во ТН_T1", "Кол-во ТН_T2"] if col in result.columns]
+    fact_columns = [col for col in ["Факт_T0", "Факт_T1", "Факт_T2", "Прирост"] if col in result.columns]
+    result = result.fillna({col: 0 for col in count_columns} | {col: 0.0 for col in fact_columns}).astype(
+        {col: int for col in count_columns} | {col: float for col in fact_columns}
+    )
     
     # Переупорядочиваем колонки
     base_cols = ["ИНН"]
@@ -1078,7 +1538,7 @@ def build_client_summary_by_inn(
         base_cols.extend(["Кол-во ТН_T0", "ТН_T0", "Факт_T0"])
     if "Кол-во ТН_T1" in result.columns:
         base_cols.extend(["Кол-во ТН_T1", "ТН_T1", "Факт_T1"])
-    if "Кол-во ТН_T2" in result.columns:
+    if has_t2:
         base_cols.extend(["Кол-во ТН_T2", "ТН_T2", "Факт_T2"])
     base_cols.extend(["Прирост", "Итоговый ТН", "ФИО КМ", "ТБ"])
     
@@ -1114,7 +1574,9 @@ def build_assignment_summary(
         if manager_tb_mapping is not None and not assignment_df.empty:
             # Определяем ТБ по табельному номеру
             assignment_df = assignment_df.copy()
-            assignment_df["ТБ"] = assignment_df[SELECTED_MANAGER_ID_COL].map(manager_tb_mapping).fillna("")
+            assignment_df["ТБ"] = map_with_default(
+                assignment_df[SELECTED_MANAGER_ID_COL], manager_tb_mapping, fill_na=True
+            )
     
     tb_column_name: Optional[str] = None
     if "ТБ" in assignment_df.columns:
@@ -1129,14 +1591,19 @@ def build_assignment_summary(
         columns = group_columns + ["Факт_T0", "Факт_T1", "Прирост", "Количество записей"]
         return pd.DataFrame(columns=columns)
 
-    numeric_columns = ["Факт_T0", "Факт_T1", "Прирост"]
+    # Суммы и количество записей считаются одной группировкой (без отдельного size() и merge)
     summary = (
-        assignment_df.groupby(group_columns, dropna=False)[numeric_columns]
-        .sum()
+        assignment_df.groupby(group_columns, dropna=False)
+        .agg(
+            **{
+                "Факт_T0": ("Факт_T0", "sum"),
+                "Факт_T1": ("Факт_T1", "sum"),
+                "Прирост": ("Прирост", "sum"),
+                "Количество записей": ("Факт_T0", "size"),
+            }
+        )
         .reset_index()
     )
-    counts = assignment_df.groupby(group_columns, dropna=False).size().reset_index(name="Количество записей")
-    summary = summary.merge(counts, on=group_columns, how="left")
     if tb_column_name == "tb":
         summary = summary.rename(columns={"tb": "ТБ"})
 
@@ -1157,6 +1624,109 @@ def normalize_string(value: Any) -> str:
     return str(value).strip()
 
 
+def normalize_string_series(series: pd.Series) -> pd.Series:
+    """Векторный вариант normalize_string для целой колонки."""
+
+    values = series.to_numpy(dtype=object)
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred in ("string", "integer"):
+        # ТБ, ГОСБ, ФИО и идентификаторы повторяются: приводим к строке и обрезаем пробелы только
+        # у уникальных значений, а одинаковые строки результата разделяют один объект str.
+        # Проверка на чистые строки или целые нужна, чтобы factorize не склеил, например, 1 и 1.0.
+        codes, uniques = pd.factorize(values)
+        unique_values = pd.Series(uniques, dtype=object)
+        if inferred == "integer":
+            unique_values = unique_values.astype(str)
+        stripped = unique_values.str.strip().to_numpy(dtype=object)
+        result = np.empty(len(values), dtype=object)
+        known = codes >= 0
+        result[known] = stripped[codes[known]]
+        result[~known] = [normalize_string(value) for value in values[~known]]
+        return pd.Series(result, index=series.index, dtype=object)
+
+    text = pd.Series(values, index=series.index, dtype=object).astype(str).str.strip()
+    # str(None) дал бы "None", а normalize_string возвращает для None пустую строку
+    return text.mask(np.equal(values, None), "")
+
+
+def _convert_excel_cell(cell: Any) -> Any:
+    """Приводит ячейку openpyxl к значению так же, как pandas.read_excel (движок openpyxl)."""
+
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        integer = int(value)
+        return integer if integer == value else float(value)
+    return value
+
+
+def read_excel_columns(file_path: Path, sheet_name: Any, wanted_columns: Set[str]) -> pd.DataFrame:
+    """Читает лист Excel потоково, разбирая только ячейки нужных колонок.
+
+    Строки листа обходятся через openpyxl в режиме read_only, а в промежуточные списки попадают
+    только колонки, заголовок которых входит в wanted_columns. Остальные ячейки не конвертируются.
+    Результат совпадает с pd.read_excel(..., engine="openpyxl", usecols=...): ячейки приводятся
+    теми же правилами, пустые строки в конце листа отбрасываются по всей ширине строки,
+    а типы колонок и пропуски определяет тот же TextParser pandas.
+
+    Args:
+        file_path: Путь к файлу Excel
+        sheet_name: Имя листа (или его номер)
+        wanted_columns: Заголовки колонок, которые нужно прочитать
+
+    Returns:
+        DataFrame с найденными колонками из wanted_columns
+
+    Raises:
+        ValueError: Если лист не найден
+    """
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        if isinstance(sheet_name, int):
+            worksheet = workbook.worksheets[sheet_name]
+        elif sheet_name in workbook.sheetnames:
+            worksheet = workbook[sheet_name]
+        else:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        # Размеры листа в файле могут быть указаны неверно — читаем все строки, как pandas
+        worksheet.reset_dimensions()
+
+        rows = worksheet.iter_rows()
+        header = [_convert_excel_cell(cell) for cell in next(rows, ())]
+        # Повторный заголовок pandas переименовал бы в "<имя>.1" — он не входит в wanted_columns
+        positions = [
+            index
+            for index, name in enumerate(header)
+            if name in wanted_columns and name not in header[:index]
+        ]
+        data = [[header[index] for index in positions]]
+        last_row_with_data = 0 if any(value != "" for value in header) else -1
+        for row_number, row in enumerate(rows, start=1):
+            width = len(row)
+            values = [_convert_excel_cell(row[index]) if index < width else "" for index in positions]
+            # Строка с данными только в ненужных колонках тоже не пустая — её проверяем целиком
+            if any(value != "" for value in values) or any(
+                cell.value is not None and cell.value != "" for cell in row
+            ):
+                last_row_with_data = row_number
+            data.append(values)
+    finally:
+        workbook.close()
+
+    # Пустые строки в конце листа не считаются данными
+    del data[last_row_with_data + 1:]
+    if not data or not positions:
+        return pd.DataFrame()
+    try:
+        return TextParser(data, header=0, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
 # ==================== КЛАССЫ ООП ====================
 
 class DataLoader:
@@ -1168,17 +1738,129 @@ class DataLoader:
     Атрибуты:
         identifiers: Настройки форматирования идентификаторов (manager_id, client_id)
         logger: Логгер для записи сообщений
+        cache_dir: Каталог кэша прочитанных листов (None — кэш не используется)
     """
     
-    def __init__(self, identifiers: Mapping[str, Mapping[str, Any]], logger: Mapping[str, Any]):
+    def __init__(
+        self,
+        identifiers: Mapping[str, Mapping[str, Any]],
+        logger: Mapping[str, Any],
+        cache_dir: Optional[Path] = None,
+    ):
         """Инициализирует загрузчик данных.
         
         Args:
             identifiers: Словарь с настройками форматирования идентификаторов
             logger: Логгер с методами info и debug
+            cache_dir: Каталог кэша прочитанных листов (None — кэш не используется)
         """
         self.identifiers = identifiers
         self.logger = logger
+        self.cache_dir = cache_dir
+        # Общие объекты строк всех файлов загрузчика (см. share_strings)
+        self._string_pool: Dict[str, str] = {}
+
+    def share_strings(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Заменяет равные строки object-колонок одним общим объектом str на все файлы загрузчика.
+        
+        Внутри одного листа openpyxl уже отдаёт повторяющиеся строки одним объектом, но T-0, T-1, T-2
+        и помесячные файлы читаются отдельно, и одно ФИО, ТБ или ИНН хранится копией в каждом файле.
+        Пул загрузчика оставляет одну копию: память под строки не растёт с числом файлов, а хеш-таблицы
+        groupby/factorize/merge по объединённым данным сравнивают такие значения по указателю.
+        Значения не меняются; пустые и нестроковые значения остаются как есть.
+        
+        Args:
+            df: DataFrame, только что прочитанный загрузчиком
+        
+        Returns:
+            DataFrame с теми же значениями (колонки без замен не копируются)
+        """
+        pool = self._string_pool
+        shared = df.copy(deep=False)
+        for column in df.columns:
+            if df[column].dtype != object:
+                continue
+            values = df[column].to_numpy()
+            codes, uniques = pd.factorize(values)
+            canonical = np.empty(len(uniques), dtype=object)
+            canonical[:] = [pool.setdefault(value, value) if type(value) is str else value for value in uniques]
+            replaced = np.fromiter(map(operator.is_not, canonical, uniques), dtype=bool, count=len(uniques))
+            if not replaced.any():
+                # Все строки колонки встретились впервые — они сами стали объектами пула
+                continue
+            # factorize считает равными 1, 1.0 и True (и подклассы str со строкой), поэтому замена
+            # выполняется только в ячейках, где само значение — str; остальные ячейки не трогаются
+            positions = np.flatnonzero((codes >= 0) & replaced[np.maximum(codes, 0)])
+            positions = positions[[type(value) is str for value in values[positions]]]
+            if not len(positions):
+                continue
+            values = values.copy()
+            values[positions] = canonical[codes[positions]]
+            shared[column] = values
+        return shared
+
+    def read_excel_cached(self, file_path: Path, sheet_name: Any, wanted_columns: Set[str]) -> pd.DataFrame:
+        """Читает колонки листа через read_excel_columns, сохраняя результат в кэше cache_dir.
+        
+        Ключ кэша — имя, размер и время изменения файла, лист и набор колонок: изменённый файл
+        или другие колонки дают новый ключ, а устаревшие записи этого файла удаляются.
+        Ошибки чтения и записи кэша не прерывают загрузку — лист просто читается из Excel.
+        
+        Args:
+            file_path: Путь к файлу Excel
+            sheet_name: Имя или номер листа
+            wanted_columns: Имена колонок, которые нужно прочитать
+        
+        Returns:
+            DataFrame, совпадающий с read_excel_columns
+        """
+        if self.cache_dir is None:
+            return read_excel_columns(file_path, sheet_name, wanted_columns)
+
+        stat = file_path.stat()
+        key = repr((file_path.name, stat.st_size, stat.st_mtime_ns, sheet_name, sorted(wanted_columns)))
+        cache_path = self.cache_dir / f"{file_path.name}.{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.pkl"
+        if cache_path.exists():
+            try:
+                cached = pd.read_pickle(cache_path)
+            except Exception as error:  # повреждённый кэш перечитывается из Excel
+                log_debug(
+                    self.logger,
+                    f"Кэш {cache_path.name} не прочитан ({error}), читаю {file_path.name} заново",
+                    class_name="DataLoader",
+                    func_name="read_excel_cached",
+                )
+            else:
+                log_debug(
+                    self.logger,
+                    f"Лист {sheet_name} файла {file_path.name} взят из кэша {cache_path.name}",
+                    class_name="DataLoader",
+                    func_name="read_excel_cached",
+                )
+                return cached
+
+        raw_df = read_excel_columns(file_path, sheet_name, wanted_columns)
+        temp_path: Optional[Path] = None
+        try:
+            ensure_directories([self.cache_dir])
+            # Имя файла экранируется: символы [ ] * ? в нём не должны работать как шаблон glob
+            for stale_path in self.cache_dir.glob(f"{glob.escape(file_path.name)}.*.pkl"):
+                stale_path.unlink()
+            # Запись во временный файл и переименование: параллельное чтение не увидит неполный кэш
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as handle:
+                temp_path = Path(handle.name)
+            raw_df.to_pickle(temp_path)
+            os.replace(temp_path, cache_path)
+        except Exception as error:  # любая ошибка записи кэша (диск, pickle, память) не прерывает загрузку
+            if temp_path is not None:
+                temp_path.unlink(missing_ok=True)
+            log_debug(
+                self.logger,
+                f"Кэш для {file_path.name} не сохранён: {error}",
+                class_name="DataLoader",
+                func_name="read_excel_cached",
+            )
+        return raw_df
     
     def read_source_file(
         self,
@@ -1218,43 +1900,31 @@ class DataLoader:
         # Формируем маппинг колонок из списка
         column_maps = {column["source"]: column["alias"] for column in columns}
         
-        # Читаем один лист Excel и сразу переименовываем колонки в единый формат
-        raw_df = pd.read_excel(file_path, sheet_name=sheet_name)
-        renamed = raw_df.rename(columns=column_maps)
+        # Читаем один лист Excel и сразу переименовываем колонки в единый формат.
+        # Ячейки неиспользуемых колонок не конвертируются и не попадают в DataFrame.
+        wanted_columns = set(column_maps) | set(column_maps.values())
+        raw_df = self.read_excel_cached(file_path, sheet_name, wanted_columns)
+        # raw_df создан только что и больше нигде не используется: переименовываем на месте, без копии данных
+        raw_df.rename(columns=column_maps, inplace=True)
 
         required_columns = list(column_maps.values())
-        missing = [col for col in required_columns if col not in renamed.columns]
+        missing = [col for col in required_columns if col not in raw_df.columns]
         if missing:
             raise ValueError(
                 f"Отсутствуют обязательные колонки {missing} в файле {file_path}"
             )
 
-        prepared = renamed[required_columns].copy()
+        # .loc возвращает самостоятельную копию нужных колонок — отдельный .copy() не нужен
+        prepared = raw_df.loc[:, required_columns]
 
         # Строковые столбцы очищаем от пробелов и None
         for column in ("tb", "gosb", "manager_name"):
-            prepared[column] = prepared[column].apply(normalize_string)
-
-        manager_identifier = self.identifiers["manager_id"]
-        client_identifier = self.identifiers["client_id"]
+            prepared[column] = normalize_string_series(prepared[column])
 
         # Форматируем табельные номера и ИНН в заранее заданную длину
-        prepared["manager_id"] = prepared["manager_id"].apply(
-            lambda value: format_identifier(
-                value=value,
-                total_length=manager_identifier["total_length"],
-                fill_char=manager_identifier["fill_char"],
-            )
-        )
-        prepared["client_id"] = prepared["client_id"].apply(
-            lambda value: format_identifier(
-                value=value,
-                total_length=client_identifier["total_length"],
-                fill_char=client_identifier["fill_char"],
-            )
-        )
+        normalize_identifier_columns(prepared, self.identifiers)
 
-        prepared["fact_value_clean"] = prepared["fact_value"].apply(safe_to_float)
+        prepared["fact_value_clean"] = safe_to_float_series(prepared["fact_value"])
 
         cleaned = self.drop_forbidden_rows(prepared, drop_rules)
         log_debug(
@@ -1263,7 +1933,57 @@ class DataLoader:
             class_name="DataLoader",
             func_name="read_source_file",
         )
-        return cleaned
+        return self.share_strings(cleaned)
+    
+    def read_many(
+        self,
+        specs: List[Tuple[Path, str, List[Dict[str, str]], Mapping[str, Any]]],
+    ) -> List[pd.DataFrame]:
+        """Загружает несколько независимых файлов, при необходимости в отдельных процессах.
+        
+        Разбор xlsx в openpyxl выполняется на Python и упирается в GIL, поэтому крупные файлы
+        читаются в пуле процессов (не больше процесса на файл и на ядро). Сообщения, записанные при чтении файла
+        в дочернем процессе, воспроизводятся в логгере загрузчика в порядке файлов.
+        Небольшие файлы читаются последовательно: запуск процессов обошёлся бы дороже чтения.
+        Если пул процессов не запускается или падает, оставшиеся файлы тоже читаются последовательно.
+        
+        Args:
+            specs: Список (путь, лист, колонки, правила удаления) — аргументы read_source_file
+        
+        Returns:
+            Список DataFrame в порядке specs
+        """
+        max_workers = min(len(specs), CPU_COUNT)
+        total_bytes = sum(path.stat().st_size for path, *_ in specs if path.exists())
+        if max_workers < 2 or total_bytes < PROCESS_POOL_MIN_BYTES:
+            return [self.read_source_file(*spec) for spec in specs]
+        
+        results: List[pd.DataFrame] = []
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(_read_source_file_in_process, self.identifiers, self.cache_dir, *spec)
+                    for spec in specs
+                ]
+                # Результаты забираем в исходном порядке: сообщения и ошибки первого файла выводятся первыми
+                for future in futures:
+                    df, records = future.result()
+                    for level, args in records:
+                        self.logger[level](*args)
+                    # Строки из дочернего процесса приходят своими копиями — сводим их к пулу этого загрузчика
+                    results.append(self.share_strings(df))
+        except (
+            BrokenProcessPool, pickle.PicklingError, TypeError, AttributeError, OSError, NotImplementedError
+        ) as exc:
+            # Пул недоступен (процесс упал, аргументы не сериализуются, ОС не дает запустить процессы) —
+            # оставшиеся файлы читаем последовательно; настоящая ошибка чтения повторится здесь же
+            log_info(
+                self.logger,
+                f"Пул процессов недоступен ({type(exc).__name__}: {exc}), "
+                f"читаю оставшиеся файлы последовательно: {len(specs) - len(results)}",
+            )
+            results.extend(self.read_source_file(*spec) for spec in specs[len(results):])
+        return results
     
     def apply_in_rules(
         self,
@@ -1285,7 +2005,8 @@ class DataLoader:
         if not in_rules:
             return df
         
-        filtered = df.copy()
+        # Каждое правило возвращает новый отфильтрованный DataFrame, исходный df не изменяется
+        filtered = df
         
         for rule in in_rules:
             column = rule.get("alias")
@@ -1309,14 +2030,10 @@ class DataLoader:
             
             if condition == "in":
                 # Значение должно быть в списке
-                mask = filtered[column].apply(
-                    lambda x: str(x).strip().lower() in normalized_values if pd.notna(x) else False
-                )
+                mask = normalized_isin(filtered[column], normalized_values) & filtered[column].notna()
             elif condition == "not_in":
                 # Значение НЕ должно быть в списке
-                mask = filtered[column].apply(
-                    lambda x: str(x).strip().lower() not in normalized_values if pd.notna(x) else True
-                )
+                mask = ~normalized_isin(filtered[column], normalized_values) | filtered[column].isna()
             else:
                 log_debug(
                     self.logger,
@@ -1355,15 +2072,73 @@ class DataLoader:
         
         Args:
             df: DataFrame для очистки
-            drop_rules: Словарь {column_alias: {values: tuple, remove_unconditionally: bool, check_by_inn: bool, check_by_tn: bool}}
+            drop_rules: Словарь {column_alias: {values: frozenset, values_lower: frozenset, remove_unconditionally: bool, check_by_inn: bool, check_by_tn: bool}}
+                или {column_alias: tuple(forbidden_values)} (безусловное удаление)
         
         Returns:
             DataFrame без запрещенных строк
         """
-        cleaned = df.copy()
+        # Правила применяются последовательно к ещё не удалённым строкам, но сам DataFrame
+        # не пересобирается на каждом шаге: удаление копится в маске alive и применяется один раз.
+        alive = np.ones(len(df), dtype=bool)
+        # Коды ИНН/ТН (pd.factorize) нужны нескольким условным правилам — считаем их один раз
+        key_codes: Dict[str, Tuple[np.ndarray, int]] = {}
+
+        def factorized_key(key_column: str) -> Tuple[np.ndarray, int]:
+            """Возвращает коды значений ключевой колонки и число уникальных значений."""
+            if key_column not in key_codes:
+                codes, uniques = pd.factorize(df[key_column])
+                key_codes[key_column] = (codes, len(uniques))
+            return key_codes[key_column]
+
+        def has_good_row_by_key(key_column: str, good_rows: np.ndarray) -> np.ndarray:
+            """Для каждой строки: есть ли среди строк с тем же ключом «хорошая» строка.
+
+            Два прохода по целочисленным кодам ключа: разброс флага «хорошая» по ключам и сбор обратно
+            по строкам. Пустой ключ (код -1) попадает в дополнительную последнюю ячейку, которая
+            всегда False, поэтому отдельная маска для пустых ключей не нужна.
+            """
+            codes, unique_count = factorized_key(key_column)
+            good_per_key = np.zeros(unique_count + 1, dtype=bool)
+            good_per_key[codes[good_rows]] = True
+            good_per_key[-1] = False
+            return good_per_key[codes]
+        
+        # Правила в старом формате {column: tuple(values)} (обертка drop_forbidden_rows) приводятся
+        # к формату build_drop_rules один раз до обхода колонок
+        compiled_rules = {
+            column: rule if isinstance(rule, Mapping) else build_drop_rules([{"alias": column, "values": rule}])[column]
+            for column, rule in drop_rules.items()
+        }
         
-        for column, rule in drop_rules.items():
-            if column not in cleaned.columns:
+        # Принадлежность запрещённым значениям для всех правил считается сразу: колонки правил приводятся
+        # к str(value).strip().lower() и сверяются одним DataFrame.isin со словарём {колонка: значения}.
+        # Правила ниже применяются по порядку (условные зависят от уже удалённых строк), но берут готовые маски.
+        rule_columns = [column for column in compiled_rules if column in df.columns]
+        forbidden_by_column: Dict[str, np.ndarray] = {}
+        if rule_columns:
+            normalized = pd.DataFrame(
+                {column: normalize_string_series(df[column]).str.lower() for column in rule_columns},
+                index=df.index,
+            )
+            forbidden_matrix = normalized.isin(
+                {
+                    column: list(
+                        compiled_rules[column].get("values_lower")
+                        or frozenset(value.lower() for value in compiled_rules[column].get("values", ()))
+                    )
+                    for column in rule_columns
+                }
+            ).to_numpy()
+            # None не считается запрещённым значением
+            forbidden_matrix &= ~np.equal(df[rule_columns].to_numpy(dtype=object), None)
+            forbidden_by_column = dict(zip(rule_columns, forbidden_matrix.T))
+        
+        for column, rule in compiled_rules.items():
+            if not alive.any():
+                # Все строки уже удалены — остальные правила ничего не изменят
+                break
+            if column not in df.columns:
                 log_debug(
                     self.logger,
                     f"Колонка {column} отсутствует в данных, пропускаем правило",
@@ -1372,21 +2147,13 @@ class DataLoader:
                 )
                 continue
             
-            values = rule.get("values", ())
             remove_unconditionally = rule.get("remove_unconditionally", True)
             check_by_inn = rule.get("check_by_inn", False)
             check_by_tn = rule.get("check_by_tn", False)
             
-            forbidden = {value.lower() for value in values}
-
-            def is_forbidden_value(value: Any) -> bool:
-                """Проверяет, является ли значение запрещенным."""
-                if value is None:
-                    return False
-                return str(value).strip().lower() in forbidden
-
-            # Находим строки с запрещенными значениями
-            mask_forbidden = cleaned[column].apply(is_forbidden_value)
+            # Строки с запрещенными значениями в этой колонке
+            forbidden_values = forbidden_by_column[column]
+            mask_forbidden = forbidden_values & alive
             
             if not mask_forbidden.any():
                 log_debug(
@@ -1409,71 +2176,37 @@ class DataLoader:
             
             if not check_by_inn and not check_by_tn:
                 # Простое удаление без условий (старая логика)
-                before = len(cleaned)
-                cleaned = cleaned[~mask_forbidden]
+                alive &= ~mask_forbidden
                 log_debug(
                     self.logger,
-                    f"Колонка {column}: удалено {before - len(cleaned)} строк (безусловно)",
+                    f"Колонка {column}: удалено {int(mask_forbidden.sum())} строк (безусловно)",
                     class_name="DataLoader",
                     func_name="drop_forbidden_rows",
                 )
             else:
-                # Условное удаление: удаляем строки, но если условие выполняется (есть другие значения по ИНН/ТН), не удаляем
-                rows_to_remove = mask_forbidden.copy()
-                
-                # Проверяем условия для каждой строки с запрещенным значением
-                for idx in cleaned[mask_forbidden].index:
-                    row = cleaned.loc[idx]
-                    should_keep = False
-                    
-                    if check_by_inn and "client_id" in cleaned.columns:
-                        # Проверяем, есть ли по этому ИНН строки с другими значениями в этой колонке
-                        client_id = row["client_id"]
-                        if pd.notna(client_id):
-                            other_rows_same_inn = cleaned[
-                                (cleaned["client_id"] == client_id) & 
-                                (cleaned.index != idx)
-                            ]
-                            if len(other_rows_same_inn) > 0:
-                                # Проверяем, есть ли среди них строки с другими значениями в этой колонке
-                                other_values = other_rows_same_inn[column].apply(
-                                    lambda v: not is_forbidden_value(v) if pd.notna(v) else False
-                                )
-                                if other_values.any():
-                                    should_keep = True
-                    
-                    if check_by_tn and "manager_id" in cleaned.columns:
-                        # Проверяем, есть ли по этому ТН строки с другими значениями в этой колонке
-                        manager_id = row["manager_id"]
-                        if pd.notna(manager_id):
-                            other_rows_same_tn = cleaned[
-                                (cleaned["manager_id"] == manager_id) & 
-                                (cleaned.index != idx)
-                            ]
-                            if len(other_rows_same_tn) > 0:
-                                # Проверяем, есть ли среди них строки с другими значениями в этой колонке
-                                other_values = other_rows_same_tn[column].apply(
-                                    lambda v: not is_forbidden_value(v) if pd.notna(v) else False
-                                )
-                                if other_values.any():
-                                    should_keep = True
-                    
-                    # Если хотя бы одно условие выполняется (ИЛИ), не убираем строку
-                    if should_keep:
-                        rows_to_remove.loc[idx] = False
+                # Условное удаление: строку оставляем, если по её ИНН/ТН среди оставшихся строк есть
+                # непустое незапрещённое значение в этой колонке. Сама запрещённая строка такой не является,
+                # поэтому достаточно проверить наличие «хорошей» строки в группе ключа.
+                good_rows = alive & df[column].notna().to_numpy() & ~forbidden_values
+                should_keep = np.zeros(len(df), dtype=bool)
+                if check_by_inn and "client_id" in df.columns:
+                    should_keep |= has_good_row_by_key("client_id", good_rows)
+                if check_by_tn and "manager_id" in df.columns:
+                    should_keep |= has_good_row_by_key("manager_id", good_rows)
                 
-                before = len(cleaned)
-                cleaned = cleaned[~rows_to_remove]
+                # Если хотя бы одно условие выполняется (ИЛИ), не убираем строку
+                rows_to_remove = mask_forbidden & ~should_keep
+                alive &= ~rows_to_remove
                 log_debug(
                     self.logger,
-                    f"Колонка {column}: удалено {before - len(cleaned)} строк "
+                    f"Колонка {column}: удалено {int(rows_to_remove.sum())} строк "
                     f"(условно: remove_unconditionally={remove_unconditionally}, "
                     f"check_by_inn={check_by_inn}, check_by_tn={check_by_tn})",
                     class_name="DataLoader",
                     func_name="drop_forbidden_rows",
                 )
         
-        return cleaned
+        return df[alive]
 
 
 class Aggregator:
@@ -1504,42 +2237,177 @@ class Aggregator:
         self.defaults = defaults
         self.identifiers = identifiers
         self.logger = logger
-    
-    def aggregate_facts(
+        # При use_float32 суммы факта считаются во float64, а во float32 приводятся только готовые
+        # колонки Факт_* и Прирост: накопление во float32 теряло бы копейки на крупных суммах
+        self.fact_dtype = np.float32 if defaults.get("use_float32", False) else np.float64
+        # Кэш aggregate_facts/select_best_manager в пределах жизни агрегатора (один расчет проекта).
+        # Ключ — (метод, id(df), ключевые колонки, суффикс); вместе с результатом хранится сам df,
+        # поэтому id не может быть переиспользован другим объектом, а совпадение проверяется через is.
+        # Исходные DataFrame между вызовами не изменяются, а закэшированные результаты только читаются.
+        self._frame_cache: Dict[Tuple[str, int, Tuple[str, ...], str], Tuple[pd.DataFrame, Any]] = {}
+        # Готовые наборы assemble_variant_dataset_with_t2 по (id T-0, id T-1, id T-2, ключ); рядом хранятся
+        # сами исходные DataFrame — по тем же правилам, что и в _frame_cache
+        self._assembly_cache: Dict[
+            Tuple[int, int, int, Tuple[str, ...]],
+            Tuple[Tuple[pd.DataFrame, pd.DataFrame, Optional[pd.DataFrame]], pd.DataFrame],
+        ] = {}
+
+    def _cached_frame(
         self,
+        method: str,
         df: pd.DataFrame,
         key_columns: List[str],
         suffix: str,
         variant_name: str,
+        compute: Callable[[], pd.DataFrame],
     ) -> pd.DataFrame:
-        """Группирует данные по ключу и суммирует факт.
-        
-        Группирует DataFrame по указанным ключевым колонкам и суммирует
-        значения fact_value_clean. Результат переименовывается в Факт_{suffix}.
-        
-        Args:
-            df: Исходный DataFrame с данными
-            key_columns: Список колонок для группировки
+        """Возвращает результат compute() из кэша, если он уже считался для этого df и ключа."""
+        cache_key = (method, id(df), tuple(key_columns), suffix)
+        cached = self._frame_cache.get(cache_key)
+        if cached is not None and cached[0] is df:
+            log_debug(
+                self.logger,
+                f"{variant_name}: результат {method} по ключу {key_columns} взят из кэша",
+                class_name="Aggregator",
+                func_name=method,
+            )
+            return cached[1]
+        result = compute()
+        self._frame_cache[cache_key] = (df, result)
+        return result
+
+    def _column_codes(self, df: pd.DataFrame, column: str) -> Tuple[np.ndarray, Any]:
+        """Возвращает pd.factorize(df[column], sort=True), кодируя колонку один раз на агрегатор.
+
+        Ключи (client_id, tb, gosb) и колонки менеджера одного DataFrame кодируются и в aggregate_facts,
+        и в select_best_manager; коды хранятся в том же кэше, что и результаты этих методов.
+        """
+        cache_key = ("factorize", id(df), (column,), "")
+        cached = self._frame_cache.get(cache_key)
+        if cached is not None and cached[0] is df:
+            return cached[1]
+        codes_and_uniques = pd.factorize(df[column], sort=True)
+        self._frame_cache[cache_key] = (df, codes_and_uniques)
+        return codes_and_uniques
+
+    @functools.cached_property
+    def default_manager_id(self) -> str:
+        """Табельный номер менеджера по умолчанию, отформатированный один раз на агрегатор."""
+        identifier_settings = self.identifiers["manager_id"]
+        return format_identifier(
+            self.defaults["manager_id"],
+            total_length=identifier_settings["total_length"],
+            fill_char=identifier_settings["fill_char"],
+        )
+    
+    def aggregate_facts(
+        self,
+        df: pd.DataFrame,
+        key_columns: List[str],
+        suffix: str,
+        variant_name: str,
+    ) -> pd.DataFrame:
+        """Группирует данные по ключу и суммирует факт.
+        
+        Группирует DataFrame по указанным ключевым колонкам и суммирует
+        значения fact_value_clean. Результат переименовывается в Факт_{suffix}.
+        
+        Args:
+            df: Исходный DataFrame с данными
+            key_columns: Список колонок для группировки
             suffix: Суффикс для имени результирующей колонки (например, "T0", "T1")
             variant_name: Имя варианта для логирования
         
         Returns:
-            DataFrame с колонками key_columns и Факт_{suffix}
+            DataFrame с колонками key_columns и Факт_{suffix} (ключи в порядке первого появления, без сортировки)
         """
-        grouped = (
-            df[key_columns + ["fact_value_clean"]]
-            .fillna({"fact_value_clean": 0.0})
-            .groupby(key_columns, dropna=False, as_index=False)
-            .sum(numeric_only=True)
-        )
-        renamed = grouped.rename(columns={"fact_value_clean": f"Факт_{suffix}"})
-        log_debug(
-            self.logger,
-            f"{variant_name}: агрегировано {len(renamed)} строк для суффикса {suffix}",
-            class_name="Aggregator",
-            func_name="aggregate_facts",
+        def compute() -> pd.DataFrame:
+            """Группирует и суммирует факт (без кэша)."""
+            if not df.empty and all(isinstance(df[column].dtype, np.dtype) for column in key_columns):
+                # Ключ кодируется одним целым числом из кодов колонок (коды общие с select_best_manager),
+                # groupby идёт по int64 вместо хеширования строк; суммирование то же, что у groupby по колонкам
+                group_codes = np.zeros(len(df), dtype=np.int64)
+                column_uniques = []
+                for column in key_columns:
+                    codes, uniques = self._column_codes(df, column)
+                    column_uniques.append((column, uniques))
+                    group_codes = group_codes * (len(uniques) + 1) + np.where(codes < 0, len(uniques), codes)
+                facts = df["fact_value_clean"].to_numpy(dtype=np.float64)
+                sums = pd.Series(np.where(np.isnan(facts), 0.0, facts)).groupby(group_codes, sort=False).sum()
+                # Значения ключа восстанавливаются из кода группы; пустой ключ (последний код) даёт NaN
+                remaining_codes = sums.index.to_numpy()
+                decoded: Dict[str, Any] = {}
+                for column, uniques in reversed(column_uniques):
+                    remaining_codes, column_codes = np.divmod(remaining_codes, len(uniques) + 1)
+                    decoded[column] = pd.api.extensions.take(
+                        np.asarray(uniques), np.where(column_codes == len(uniques), -1, column_codes), allow_fill=True
+                    )
+                renamed = pd.DataFrame({column: decoded[column] for column in key_columns})
+                renamed[f"Факт_{suffix}"] = sums.to_numpy()
+                log_debug(
+                    self.logger,
+                    f"{variant_name}: агрегировано {len(renamed)} строк для суффикса {suffix}",
+                    class_name="Aggregator",
+                    func_name="aggregate_facts",
+                )
+                return renamed
+
+            grouped = (
+                df[key_columns + ["fact_value_clean"]]
+                .fillna({"fact_value_clean": 0.0})
+                # Порядок строк задаёт combine_period_facts (sort=True), поэтому ключи здесь не сортируются
+                .groupby(key_columns, dropna=False, as_index=False, sort=False)
+                .sum(numeric_only=True)
+            )
+            renamed = grouped.rename(columns={"fact_value_clean": f"Факт_{suffix}"})
+            log_debug(
+                self.logger,
+                f"{variant_name}: агрегировано {len(renamed)} строк для суффикса {suffix}",
+                class_name="Aggregator",
+                func_name="aggregate_facts",
+            )
+            return renamed
+
+        return self._cached_frame("aggregate_facts", df, key_columns, suffix, variant_name, compute)
+    
+    def combine_period_facts(
+        self,
+        period_facts: List[pd.DataFrame],
+        key_columns: List[str],
+    ) -> pd.DataFrame:
+        """Объединяет агрегаты периодов (outer join по ключу) и рассчитывает прирост.
+        
+        Агрегаты (результаты aggregate_facts с уникальными колонками Факт_T0, Факт_T1, Факт_T2)
+        выравниваются по общему индексу ключа одним pd.concat(axis=1) вместо цепочки outer merge,
+        каждый из которых копирует весь промежуточный DataFrame. Порядок строк — отсортированные
+        ключи, как у outer merge.
+        
+        Args:
+            period_facts: Агрегаты в порядке T-0, T-1 и (если есть) T-2
+            key_columns: Список колонок ключа
+        
+        Returns:
+            DataFrame с колонками key_columns, Факт_T0, Факт_T1, Факт_T2 (если есть), Прирост:
+            - Если T-2 указан: прирост = (T-0 - T-1) - (T-1 - T-2)
+            - Иначе: прирост = T-0 - T-1
+        """
+        fact_columns = [f"Факт_{suffix}" for suffix in ("T0", "T1", "T2")[: len(period_facts)]]
+        # Пустые агрегаты не участвуют в выравнивании (их колонки добавит reindex)
+        indexed = [facts.set_index(key_columns) for facts in period_facts if not facts.empty]
+        combined = pd.concat(
+            indexed or [period_facts[0].set_index(key_columns)], axis=1, join="outer", sort=True
+        ).reindex(columns=fact_columns)
+        # Ключи берутся через to_frame: reset_index превратил бы object-индекс из одних пустых значений во float
+        merged = pd.concat(
+            [combined.index.to_frame(index=False), combined.reset_index(drop=True).fillna(0.0)], axis=1
         )
-        return renamed
+        # Колонки читаются по отдельности (без копии в общий двумерный массив). Суммы и прирост
+        # считаются во float64, к fact_dtype приводятся только готовые колонки.
+        facts = [merged[column].to_numpy(dtype=np.float64) for column in fact_columns]
+        merged["Прирост"] = growth_values(*facts)
+        if self.fact_dtype != np.float64:
+            merged = merged.astype({column: self.fact_dtype for column in fact_columns + ["Прирост"]}, copy=False)
+        return merged
     
     def select_best_manager(
         self,
@@ -1555,7 +2423,7 @@ class Aggregator:
         Алгоритм:
         1. Группирует данные по (ключ, manager_id, manager_name) и суммирует fact_value_clean
         2. Для каждого ключа выбирает менеджера с максимальной суммой
-        3. Если суммы равны (включая случай, когда все суммы = 0), pandas idxmax вернёт первую попавшуюся
+        3. Если суммы равны (включая случай, когда все суммы = 0), берётся первая строка в порядке группировки
         4. Если клиента нет в файле (после фильтрации), то его не будет в результате
         
         Args:
@@ -1568,37 +2436,119 @@ class Aggregator:
             Содержит только те ключи, которые есть в df (после фильтрации).
             Если клиента нет в df, его не будет в результате.
         """
-        # Если DataFrame пустой, возвращаем пустой результат
-        if df.empty:
-            return pd.DataFrame(columns=key_columns + ["ВКО", "Таб. номер ВКО"])
+        def compute() -> pd.DataFrame:
+            """Выбирает менеджера с максимальной суммой факта для каждого ключа (без кэша)."""
+            # Если DataFrame пустой, возвращаем пустой результат
+            if df.empty:
+                return pd.DataFrame(columns=key_columns + ["ВКО", "Таб. номер ВКО"])
+        
+            additional_columns = [
+                column for column in ("manager_name", "manager_id") if column not in key_columns
+            ]
+            grouping_columns = key_columns + additional_columns
+            # Группы (ключ, менеджер) кодируются одним целым числом: каждая колонка кодируется
+            # pd.factorize(sort=True), пустое значение получает последний код (как groupby с dropna=False),
+            # а коды колонок сводятся в смешанную позиционную запись. Порядок кодов совпадает
+            # с отсортированным порядком групп groupby(sort=True), а значения колонок восстанавливаются из кода.
+            group_codes = np.zeros(len(df), dtype=np.int64)
+            column_uniques: List[Tuple[str, np.ndarray]] = []
+            for column in grouping_columns:
+                codes, uniques = self._column_codes(df, column)
+                # Последний элемент (код len(uniques)) — пустое значение
+                column_uniques.append((column, np.append(np.asarray(uniques, dtype=object), np.nan)))
+                group_codes = group_codes * (len(uniques) + 1) + np.where(codes < 0, len(uniques), codes)
+
+            # Суммы по группам — groupby по одному целочисленному коду вместо нескольких строковых колонок
+            # (то же суммирование pandas, поэтому суммы и выбор при равенстве не меняются)
+            facts = df["fact_value_clean"].to_numpy(dtype=np.float64)
+            group_sums = pd.Series(np.where(np.isnan(facts), 0.0, facts)).groupby(group_codes, sort=True).sum()
+            remaining_codes = group_sums.index.to_numpy()
+            decoded: Dict[str, np.ndarray] = {}
+            for column, values in reversed(column_uniques):
+                remaining_codes, column_codes = np.divmod(remaining_codes, len(values))
+                decoded[column] = values[column_codes]
+            # Код ключа — старшие разряды кода группы (колонки менеджера идут после key_columns)
+            manager_radix = int(np.prod([len(values) for _, values in column_uniques[len(key_columns):]], dtype=np.int64))
+            key_codes = group_sums.index.to_numpy() // manager_radix
+
+            # Внутри ключа группы идут в отсортированном порядке; стабильный lexsort по (ключ, -сумма)
+            # ставит первой группу с максимальной суммой, а при равных суммах (в т.ч. все = 0) —
+            # первую в порядке группировки, как idxmax
+            by_key = np.lexsort((-group_sums.to_numpy(), key_codes))
+            best_groups = by_key[np.r_[True, key_codes[by_key][1:] != key_codes[by_key][:-1]]]
+            # Результат собирается сразу с итоговыми именами колонок — без промежуточных rename/копий
+            output_names = {"manager_name": "ВКО", "manager_id": "Таб. номер ВКО"}
+            result_columns = {
+                column if column in key_columns else output_names[column]: decoded[column][best_groups]
+                for column in grouping_columns
+            }
+            if "manager_id" in key_columns:
+                result_columns["Таб. номер ВКО"] = result_columns["manager_id"]
+            result = pd.DataFrame(result_columns, index=best_groups)
+            log_debug(
+                self.logger,
+                f"{variant_name}: выбраны менеджеры для {len(result)} ключей",
+                class_name="Aggregator",
+                func_name="select_best_manager",
+            )
+            return result
+
+        return self._cached_frame("select_best_manager", df, key_columns, "", variant_name, compute)
+    
+    def _coalesce_latest_managers(
+        self,
+        period_bests: List[Tuple[str, Optional[pd.DataFrame]]],
+        key_columns: List[str],
+    ) -> pd.DataFrame:
+        """Объединяет менеджеров периодов (outer merge по ключу) и выбирает актуального.
         
-        additional_columns = [
-            column for column in ("manager_name", "manager_id") if column not in key_columns
-        ]
-        grouping_columns = key_columns + additional_columns
-        grouped = (
-            df[grouping_columns + ["fact_value_clean"]]
-            .fillna({"fact_value_clean": 0.0})
-            .groupby(grouping_columns, dropna=False, as_index=False)
-            .sum(numeric_only=True)
-        )
-        # idxmax вернет индекс даже если все значения = 0 (если клиент есть в файле)
-        idx = grouped.groupby(key_columns, dropna=False)["fact_value_clean"].idxmax()
-        best = grouped.loc[idx, key_columns + additional_columns].copy()
-        result = best.copy()
-        if "manager_name" in result.columns and "manager_name" not in key_columns:
-            result = result.rename(columns={"manager_name": "ВКО"})
-        if "manager_id" in key_columns and "manager_id" in result.columns:
-            result["Таб. номер ВКО"] = result["manager_id"]
-        elif "manager_id" in result.columns:
-            result = result.rename(columns={"manager_id": "Таб. номер ВКО"})
-        log_debug(
-            self.logger,
-            f"{variant_name}: выбраны менеджеры для {len(result)} ключей",
-            class_name="Aggregator",
-            func_name="select_best_manager",
-        )
-        return result
+        Колонки каждого периода получают суффикс до merge, поэтому цепочка merge идёт
+        прямо по key_columns, без set_index/join/reset_index. Для каждого ключа берётся
+        первое непустое значение в порядке убывания приоритета, иначе значение по умолчанию.
+        
+        Args:
+            period_bests: Пары (суффикс, DataFrame с колонками key_columns, "ВКО", "Таб. номер ВКО")
+                от низшего приоритета к высшему; DataFrame может быть пустым или None
+            key_columns: Список колонок для ключа
+        
+        Returns:
+            DataFrame с колонками key_columns, "ВКО_Актуальный", "Таб. номер ВКО_Актуальный"
+        """
+        result_columns = key_columns + ["ВКО_Актуальный", "Таб. номер ВКО_Актуальный"]
+        if all(best is None or best.empty for _, best in period_bests):
+            # Ни в одном периоде нет менеджеров — объединять нечего
+            return pd.DataFrame(columns=result_columns)
+
+        combined: Optional[pd.DataFrame] = None
+        for suffix, best in period_bests:
+            if best is None or best.empty:
+                best = pd.DataFrame(columns=key_columns + ["ВКО", "Таб. номер ВКО"])
+            # Переименование только меняет метки колонок: данные не копируются (merge ниже всё равно создаёт новый frame)
+            renamed = best.rename(
+                columns={"ВКО": f"ВКО_{suffix}", "Таб. номер ВКО": f"Таб. номер ВКО_{suffix}"}, copy=False
+            )
+            combined = renamed if combined is None else combined.merge(renamed, on=key_columns, how="outer")
+
+        def coalesce(column: str, default: Any) -> np.ndarray:
+            """Возвращает первое непустое значение по приоритету периодов, иначе default.
+
+            Args:
+                column: Базовое имя колонки (без суффикса периода)
+                default: Значение, если во всех периодах пусто
+
+            Returns:
+                Массив значений длины combined
+            """
+            result_values = np.full(len(combined), default, dtype=object)
+            # Каждый следующий (более приоритетный) период перезаписывает непустые значения
+            for suffix, _ in period_bests:
+                values = combined[f"{column}_{suffix}"].to_numpy(dtype=object)
+                result_values = np.where(pd.isna(values), result_values, values)
+            return result_values
+
+        combined["ВКО_Актуальный"] = coalesce("ВКО", self.defaults["manager_name"])
+        combined["Таб. номер ВКО_Актуальный"] = coalesce("Таб. номер ВКО", self.default_manager_id)
+        return combined[result_columns]
     
     def build_latest_manager(
         self,
@@ -1621,50 +2571,8 @@ class Aggregator:
         Returns:
             DataFrame с колонками key_columns, "ВКО_Актуальный", "Таб. номер ВКО_Актуальный"
         """
-        default_name = self.defaults["manager_name"]
-        identifier_settings = self.identifiers["manager_id"]
-        default_id = format_identifier(
-            self.defaults["manager_id"],
-            total_length=identifier_settings["total_length"],
-            fill_char=identifier_settings["fill_char"],
-        )
-
-        curr = (
-            current_best.set_index(key_columns)
-            if not current_best.empty
-            else pd.DataFrame(columns=key_columns + ["ВКО", "Таб. номер ВКО"]).set_index(key_columns)
-        )
-        prev = (
-            previous_best.set_index(key_columns)
-            if not previous_best.empty
-            else pd.DataFrame(columns=key_columns + ["ВКО", "Таб. номер ВКО"]).set_index(key_columns)
-        )
-
-        # ВАЖНО: переименовываем колонки ПЕРЕД join, чтобы гарантировать правильные имена
-        # Переименовываем колонки в каждом DataFrame (если они не пустые)
-        if not prev.empty:
-            prev_renamed = prev.rename(columns={"ВКО": "ВКО_prev", "Таб. номер ВКО": "Таб. номер ВКО_prev"})
-        else:
-            prev_renamed = pd.DataFrame(columns=key_columns + ["ВКО_prev", "Таб. номер ВКО_prev"]).set_index(key_columns)
-        
-        if not curr.empty:
-            curr_renamed = curr.rename(columns={"ВКО": "ВКО_curr", "Таб. номер ВКО": "Таб. номер ВКО_curr"})
-        else:
-            curr_renamed = pd.DataFrame(columns=key_columns + ["ВКО_curr", "Таб. номер ВКО_curr"]).set_index(key_columns)
-        
-        # Теперь объединяем с правильными именами колонок
-        combined = prev_renamed.join(curr_renamed, how="outer")
-        
-        # Проверяем наличие колонок перед обращением (теперь имена колонок гарантированы)
-        vko_curr = combined.get("ВКО_curr", pd.Series(index=combined.index, dtype=object))
-        vko_prev = combined.get("ВКО_prev", pd.Series(index=combined.index, dtype=object))
-        combined["ВКО_Актуальный"] = vko_curr.combine_first(vko_prev).fillna(default_name)
-        
-        tab_curr = combined.get("Таб. номер ВКО_curr", pd.Series(index=combined.index, dtype=object))
-        tab_prev = combined.get("Таб. номер ВКО_prev", pd.Series(index=combined.index, dtype=object))
-        combined["Таб. номер ВКО_Актуальный"] = tab_curr.combine_first(tab_prev).fillna(default_id)
-
-        result = combined.reset_index()[key_columns + ["ВКО_Актуальный", "Таб. номер ВКО_Актуальный"]]
+        # Приоритет: curr (T-0) → prev (T-1); список идёт от низшего приоритета к высшему
+        result = self._coalesce_latest_managers([("prev", previous_best), ("curr", current_best)], key_columns)
         log_debug(
             self.logger,
             f"{variant_name}: определены актуальные менеджеры для {len(result)} ключей",
@@ -1696,82 +2604,10 @@ class Aggregator:
         Returns:
             DataFrame с колонками key_columns, "ВКО_Актуальный", "Таб. номер ВКО_Актуальный"
         """
-        default_name = self.defaults["manager_name"]
-        identifier_settings = self.identifiers["manager_id"]
-        default_id = format_identifier(
-            self.defaults["manager_id"],
-            total_length=identifier_settings["total_length"],
-            fill_char=identifier_settings["fill_char"],
-        )
-
-        curr = (
-            current_best.set_index(key_columns)
-            if not current_best.empty
-            else pd.DataFrame(columns=key_columns + ["ВКО", "Таб. номер ВКО"]).set_index(key_columns)
-        )
-        prev = (
-            previous_best.set_index(key_columns)
-            if not previous_best.empty
-            else pd.DataFrame(columns=key_columns + ["ВКО", "Таб. номер ВКО"]).set_index(key_columns)
-        )
-        prev2 = (
-            previous2_best.set_index(key_columns)
-            if previous2_best is not None and not previous2_best.empty
-            else pd.DataFrame(columns=key_columns + ["ВКО", "Таб. номер ВКО"]).set_index(key_columns)
+        # Приоритет: curr (T-0) → prev (T-1) → prev2 (T-2); список идёт от низшего приоритета к высшему
+        result = self._coalesce_latest_managers(
+            [("prev2", previous2_best), ("prev", previous_best), ("curr", current_best)], key_columns
         )
-
-        # Объединяем все ключи из всех трех файлов (outer join)
-        # Приоритет: T-0 (curr) → T-1 (prev) → T-2 (prev2)
-        # ВАЖНО: переименовываем колонки ПЕРЕД join, чтобы гарантировать правильные имена
-        # Сначала переименовываем колонки в каждом DataFrame (если они не пустые)
-        if not prev2.empty:
-            prev2_renamed = prev2.rename(columns={"ВКО": "ВКО_prev2", "Таб. номер ВКО": "Таб. номер ВКО_prev2"})
-        else:
-            prev2_renamed = pd.DataFrame(columns=key_columns + ["ВКО_prev2", "Таб. номер ВКО_prev2"]).set_index(key_columns)
-        
-        if not prev.empty:
-            prev_renamed = prev.rename(columns={"ВКО": "ВКО_prev", "Таб. номер ВКО": "Таб. номер ВКО_prev"})
-        else:
-            prev_renamed = pd.DataFrame(columns=key_columns + ["ВКО_prev", "Таб. номер ВКО_prev"]).set_index(key_columns)
-        
-        if not curr.empty:
-            curr_renamed = curr.rename(columns={"ВКО": "ВКО_curr", "Таб. номер ВКО": "Таб. номер ВКО_curr"})
-        else:
-            curr_renamed = pd.DataFrame(columns=key_columns + ["ВКО_curr", "Таб. номер ВКО_curr"]).set_index(key_columns)
-        
-        # Теперь объединяем с правильными именами колонок
-        combined = prev2_renamed.join(prev_renamed, how="outer")
-        combined = combined.join(curr_renamed, how="outer")
-        
-        # Определяем актуального менеджера: приоритет curr (T-0) → prev (T-1) → prev2 (T-2)
-        # combine_first берет значение из первой серии, если оно не NaN, иначе из второй, и т.д.
-        # Проверяем наличие колонок перед обращением
-        vko_curr = combined.get("ВКО_curr", pd.Series(index=combined.index, dtype=object))
-        vko_prev = combined.get("ВКО_prev", pd.Series(index=combined.index, dtype=object))
-        vko_prev2 = combined.get("ВКО_prev2", pd.Series(index=combined.index, dtype=object))
-        
-        # Приоритет: сначала curr (T-0), затем prev (T-1), затем prev2 (T-2)
-        # Если в T-0 есть значение - берем его, иначе смотрим T-1, иначе T-2
-        combined["ВКО_Актуальный"] = (
-            vko_curr
-            .combine_first(vko_prev)
-            .combine_first(vko_prev2)
-            .fillna(default_name)
-        )
-        
-        tab_curr = combined.get("Таб. номер ВКО_curr", pd.Series(index=combined.index, dtype=object))
-        tab_prev = combined.get("Таб. номер ВКО_prev", pd.Series(index=combined.index, dtype=object))
-        tab_prev2 = combined.get("Таб. номер ВКО_prev2", pd.Series(index=combined.index, dtype=object))
-        
-        # Приоритет: сначала curr (T-0), затем prev (T-1), затем prev2 (T-2)
-        combined["Таб. номер ВКО_Актуальный"] = (
-            tab_curr
-            .combine_first(tab_prev)
-            .combine_first(tab_prev2)
-            .fillna(default_id)
-        )
-
-        result = combined.reset_index()[key_columns + ["ВКО_Актуальный", "Таб. номер ВКО_Актуальный"]]
         log_debug(
             self.logger,
             f"{variant_name}: определены актуальные менеджеры для {len(result)} ключей (T-0 → T-1 → T-2)",
@@ -1807,8 +2643,22 @@ class Aggregator:
         
         Returns:
             DataFrame с колонками key_columns, Факт_T0, Факт_T1, Факт_T2 (если есть),
-            Прирост, ВКО_T0, ВКО_T1, ВКО_T2 (если есть), ВКО_Актуальный, Таб. номер ВКО_Актуальный
+            Прирост, ВКО_T0, ВКО_T1, ВКО_T2 (если есть), ВКО_Актуальный, Таб. номер ВКО_Актуальный.
+            Повторный вызов с теми же DataFrame и ключом возвращает тот же набор из кэша
+            (режим client строит по нему и свод варианта, и свод по ИНН) — результат только читается.
         """
+        sources = (current_df, previous_df, previous2_df)
+        assembly_key = (id(current_df), id(previous_df), id(previous2_df), tuple(key_columns))
+        cached = self._assembly_cache.get(assembly_key)
+        if cached is not None and all(cached_df is source for cached_df, source in zip(cached[0], sources)):
+            log_debug(
+                self.logger,
+                f"{variant_name}: набор данных по ключу {key_columns} взят из кэша",
+                class_name="Aggregator",
+                func_name="assemble_variant_dataset_with_t2",
+            )
+            return cached[1]
+
         log_debug(
             self.logger,
             f"{variant_name}: старт построения набора данных (T-2: {'да' if previous2_df is not None else 'нет'})",
@@ -1816,132 +2666,95 @@ class Aggregator:
             func_name="assemble_variant_dataset_with_t2",
         )
 
-        agg_current = self.aggregate_facts(current_df, key_columns, "T0", variant_name)
-        agg_previous = self.aggregate_facts(previous_df, key_columns, "T1", variant_name)
-        
+        period_facts = [
+            self.aggregate_facts(current_df, key_columns, "T0", variant_name),
+            self.aggregate_facts(previous_df, key_columns, "T1", variant_name),
+        ]
         if previous2_df is not None:
-            agg_previous2 = self.aggregate_facts(previous2_df, key_columns, "T2", variant_name)
-            # Объединяем все три периода
-            merged = (
-                pd.merge(agg_current, agg_previous, on=key_columns, how="outer")
-                .merge(agg_previous2, on=key_columns, how="outer")
-                .fillna({"Факт_T0": 0.0, "Факт_T1": 0.0, "Факт_T2": 0.0})
-            )
-            # Формула с T-2: прирост = (T-0 - T-1) - (T-1 - T-2)
-            merged["Прирост"] = (merged["Факт_T0"] - merged["Факт_T1"]) - (merged["Факт_T1"] - merged["Факт_T2"])
-        else:
-            merged = (
-                pd.merge(agg_current, agg_previous, on=key_columns, how="outer")
-                .fillna({"Факт_T0": 0.0, "Факт_T1": 0.0})
-            )
-            merged["Прирост"] = merged["Факт_T0"] - merged["Факт_T1"]
+            period_facts.append(self.aggregate_facts(previous2_df, key_columns, "T2", variant_name))
+        merged = self.combine_period_facts(period_facts, key_columns)
 
         # Определяем лучшего менеджера для каждого периода
-        best_current = self.select_best_manager(
-            current_df, key_columns, variant_name
-        ).rename(columns={"ВКО": "ВКО_T0", "Таб. номер ВКО": "Таб. номер ВКО_T0"})
-        best_previous = self.select_best_manager(
-            previous_df, key_columns, variant_name
-        ).rename(columns={"ВКО": "ВКО_T1", "Таб. номер ВКО": "Таб. номер ВКО_T1"})
-        
-        merged = merged.merge(best_current, on=key_columns, how="left")
-        merged = merged.merge(best_previous, on=key_columns, how="left")
-        
+        best_current = self.select_best_manager(current_df, key_columns, variant_name)
+        best_previous = self.select_best_manager(previous_df, key_columns, variant_name)
+        best_by_suffix = [("T0", best_current), ("T1", best_previous)]
+
+        # Актуальный менеджер: приоритет T-0 → T-1 (→ T-2).
+        # build_latest_manager(_with_t2) сам делает outer join ключей всех файлов; ключи merged,
+        # которых нет ни в одном файле менеджеров, ниже получают значения по умолчанию.
         if previous2_df is not None:
-            best_previous2 = self.select_best_manager(
-                previous2_df, key_columns, variant_name
-            ).rename(columns={"ВКО": "ВКО_T2", "Таб. номер ВКО": "Таб. номер ВКО_T2"})
-            merged = merged.merge(best_previous2, on=key_columns, how="left")
-            
-            # Для определения актуального менеджера используем все ключи из merged
-            # Приоритет: T-0 → T-1 → T-2
-            # 
-            # ЛОГИКА РАБОТЫ:
-            # 1. select_best_manager возвращает менеджера для каждого ключа (ИНН), который есть в файле
-            #    - Если клиент есть в файле (даже с суммой = 0), менеджер будет найден
-            #    - Если клиента нет в файле (после фильтрации), его не будет в best_current/best_previous/best_previous2
-            # 2. build_latest_manager_with_t2 делает outer join всех ключей из всех трех файлов
-            #    - Если клиент есть только в T-0, он будет в best_current_renamed
-            #    - combine_first берет значение из T-0 (приоритет T-0 → T-1 → T-2)
-            # 3. Если ни в одном файле не найден менеджер, fillna заполнит значением по умолчанию
-            # 
-            # Сначала создаем DataFrame со всеми ключами из merged
-            all_keys = merged[key_columns].drop_duplicates()
-            
-            # Переименовываем колонки для build_latest_manager_with_t2
-            # ВАЖНО: НЕ делаем merge с all_keys перед вызовом build_latest_manager_with_t2,
-            # потому что build_latest_manager_with_t2 сам делает outer join и объединяет все ключи
-            best_current_renamed = best_current.rename(columns={"ВКО_T0": "ВКО", "Таб. номер ВКО_T0": "Таб. номер ВКО"})
-            best_previous_renamed = best_previous.rename(columns={"ВКО_T1": "ВКО", "Таб. номер ВКО_T1": "Таб. номер ВКО"})
-            best_previous2_renamed = best_previous2.rename(columns={"ВКО_T2": "ВКО", "Таб. номер ВКО_T2": "Таб. номер ВКО"})
-            
-            # Вызываем build_latest_manager_with_t2 с исходными данными
-            # build_latest_manager_with_t2 сам делает outer join и объединяет все ключи из всех трех файлов
-            # Если клиент есть только в T-0, он будет в best_current_renamed, и combine_first возьмет значение из T-0
+            best_previous2 = self.select_best_manager(previous2_df, key_columns, variant_name)
+            best_by_suffix.append(("T2", best_previous2))
             latest = self.build_latest_manager_with_t2(
-                current_best=best_current_renamed,
-                previous_best=best_previous_renamed,
-                previous2_best=best_previous2_renamed,
+                current_best=best_current,
+                previous_best=best_previous,
+                previous2_best=best_previous2,
                 key_columns=key_columns,
                 variant_name=variant_name,
             )
-            
-            # Убеждаемся, что latest содержит все ключи из merged
-            # Если в latest нет ключа из merged, добавляем его с значениями по умолчанию
-            latest = all_keys.merge(latest, on=key_columns, how="left")
-            
-            # Заполняем пропуски значениями по умолчанию ТОЛЬКО если менеджер не найден ни в одном файле
-            # Если клиент есть только в T-0, то latest уже должен содержать правильное значение из T-0
-            # после build_latest_manager_with_t2, поэтому fillna применяется только к действительно отсутствующим значениям
-            default_name = self.defaults["manager_name"]
-            identifier_settings = self.identifiers["manager_id"]
-            default_id = format_identifier(
-                self.defaults["manager_id"],
-                total_length=identifier_settings["total_length"],
-                fill_char=identifier_settings["fill_char"],
-            )
-            # Заполняем только если действительно нет значения (не должно быть после build_latest_manager_with_t2)
-            latest["ВКО_Актуальный"] = latest["ВКО_Актуальный"].fillna(default_name)
-            latest["Таб. номер ВКО_Актуальный"] = latest["Таб. номер ВКО_Актуальный"].fillna(default_id)
         else:
-            # Для двух файлов: приоритет T-0 → T-1
-            # Создаем DataFrame со всеми ключами из merged
-            all_keys = merged[key_columns].drop_duplicates()
-            
-            # Переименовываем колонки для build_latest_manager
-            # ВАЖНО: НЕ делаем merge с all_keys перед вызовом build_latest_manager,
-            # потому что build_latest_manager сам делает outer join и объединяет все ключи
-            best_current_renamed = best_current.rename(columns={"ВКО_T0": "ВКО", "Таб. номер ВКО_T0": "Таб. номер ВКО"})
-            best_previous_renamed = best_previous.rename(columns={"ВКО_T1": "ВКО", "Таб. номер ВКО_T1": "Таб. номер ВКО"})
-            
-            # Вызываем build_latest_manager с исходными данными
-            # build_latest_manager сам делает outer join и объединяет все ключи из обоих файлов
             latest = self.build_latest_manager(
-                current_best=best_current_renamed,
-                previous_best=best_previous_renamed,
+                current_best=best_current,
+                previous_best=best_previous,
                 key_columns=key_columns,
                 variant_name=variant_name,
             )
-            
-            # Убеждаемся, что latest содержит все ключи из merged
-            # Если в latest нет ключа из merged, добавляем его с значениями по умолчанию
-            latest = all_keys.merge(latest, on=key_columns, how="left")
-            
-            # Заполняем пропуски значениями по умолчанию ТОЛЬКО если менеджер не найден ни в одном файле
-            # Если клиент есть только в T-0, то latest уже должен содержать правильное значение из T-0
-            # после build_latest_manager, поэтому fillna применяется только к действительно отсутствующим значениям
-            default_name = self.defaults["manager_name"]
-            identifier_settings = self.identifiers["manager_id"]
-            default_id = format_identifier(
-                self.defaults["manager_id"],
-                total_length=identifier_settings["total_length"],
-                fill_char=identifier_settings["fill_char"],
+
+        # Ключи всех таблиц кодируются pd.factorize один раз: вместо цепочки merge по строковым
+        # ключам (каждый из которых заново хэширует обе стороны) строки best_* и latest
+        # раскладываются по строкам merged через целочисленные коды.
+        # Ключи merged уникальны (outer join агрегатов), ключи best_* и latest — тоже,
+        # поэтому результат совпадает с left merge.
+        key_frames = [merged] + [best for _, best in best_by_suffix] + [latest]
+        frame_sizes = [len(frame) for frame in key_frames]
+        combined_codes = np.zeros(sum(frame_sizes), dtype=np.int64)
+        for column in key_columns:
+            codes, uniques = pd.factorize(
+                pd.concat([frame[column] for frame in key_frames], ignore_index=True)
             )
-            # Заполняем только если действительно нет значения (не должно быть после build_latest_manager)
-            latest["ВКО_Актуальный"] = latest["ВКО_Актуальный"].fillna(default_name)
-            latest["Таб. номер ВКО_Актуальный"] = latest["Таб. номер ВКО_Актуальный"].fillna(default_id)
-        
-        merged = merged.merge(latest, on=key_columns, how="left")
+            # Пустой ключ (код -1) совпадает с пустым, как в merge: отдельный код len(uniques)
+            codes = np.where(codes < 0, len(uniques), codes)
+            combined_codes = combined_codes * (len(uniques) + 1) + codes
+        if len(key_columns) > 1:
+            combined_codes, _ = pd.factorize(combined_codes)
+        codes_by_frame = np.split(combined_codes, np.cumsum(frame_sizes)[:-1])
+        row_by_code = np.full(int(combined_codes.max(initial=-1)) + 1, -1, dtype=np.int64)
+        row_by_code[codes_by_frame[0]] = np.arange(len(merged))
+
+        def attach(
+            frame: pd.DataFrame,
+            frame_codes: np.ndarray,
+            renames: Mapping[str, str],
+            missing: Optional[Mapping[str, Any]] = None,
+        ) -> None:
+            """Добавляет в merged колонки frame по совпадению ключа (left join).
+
+            Строки merged без пары получают значение из missing (по имени колонки в merged), иначе NaN.
+            """
+            target_rows = row_by_code[frame_codes]
+            matched = target_rows >= 0
+            for column in frame.columns:
+                if column in key_columns:
+                    continue
+                name = renames.get(column, column)
+                values = np.full(len(merged), (missing or {}).get(name, np.nan), dtype=object)
+                values[target_rows[matched]] = frame[column].to_numpy(dtype=object)[matched]
+                merged[name] = values
+
+        # Лучшие менеджеры периодов присоединяются без переименования самих DataFrame — только имена колонок
+        for (suffix, best), frame_codes in zip(best_by_suffix, codes_by_frame[1:]):
+            attach(best, frame_codes, {"ВКО": f"ВКО_{suffix}", "Таб. номер ВКО": f"Таб. номер ВКО_{suffix}"})
+        # Ключи merged, которых нет ни в одном файле менеджеров, сразу получают значения по умолчанию
+        # (latest сам уже заполнен значениями по умолчанию, отдельный fillna не нужен)
+        attach(
+            latest,
+            codes_by_frame[-1],
+            {},
+            missing={
+                "ВКО_Актуальный": self.defaults["manager_name"],
+                "Таб. номер ВКО_Актуальный": self.default_manager_id,
+            },
+        )
 
         log_debug(
             self.logger,
@@ -1949,8 +2762,64 @@ class Aggregator:
             class_name="Aggregator",
             func_name="assemble_variant_dataset_with_t2",
         )
+        self._assembly_cache[assembly_key] = (sources, merged)
         return merged
     
+    @staticmethod
+    def _sum_by_manager(
+        variant_df: pd.DataFrame,
+        manager_id_col: str,
+        manager_name_col: str,
+        numeric_columns: List[str],
+    ) -> pd.DataFrame:
+        """Суммирует числовые колонки по (ТН, ВКО) — как groupby(dropna=False), но по целочисленному ключу.
+        
+        ТН и ВКО кодируются pd.factorize(sort=True) (пустое значение — последний код). Обычно у ТН
+        одно ФИО, и тогда группировка идёт только по коду ТН, а ФИО подставляется из кода; если у
+        какого-то ТН встречается несколько ФИО, ключ группы — комбинация обоих кодов. Порядок строк
+        и суммы совпадают с groupby по двум колонкам.
+        
+        Args:
+            variant_df: DataFrame с данными варианта (не пустой)
+            manager_id_col: Колонка с табельным номером
+            manager_name_col: Колонка с ФИО
+            numeric_columns: Колонки для суммирования
+        
+        Returns:
+            DataFrame с колонками manager_id_col, manager_name_col и numeric_columns
+        """
+        id_codes, id_uniques = pd.factorize(variant_df[manager_id_col], sort=True)
+        name_codes, name_uniques = pd.factorize(variant_df[manager_name_col], sort=True)
+        id_codes = np.where(id_codes < 0, len(id_uniques), id_codes)
+        name_codes = np.where(name_codes < 0, len(name_uniques), name_codes)
+        id_values = np.append(np.asarray(id_uniques, dtype=object), np.nan)
+        name_values = np.append(np.asarray(name_uniques, dtype=object), np.nan)
+
+        # Проверка «у каждого ТН одно ФИО»: разброс кода ФИО по ТН и сравнение при обратном сборе
+        name_of_id = np.zeros(len(id_values), dtype=np.int64)
+        name_of_id[id_codes] = name_codes
+        if np.array_equal(name_of_id[id_codes], name_codes):
+            group_codes = id_codes
+        else:
+            group_codes = id_codes * len(name_values) + name_codes
+
+        sums = variant_df[numeric_columns].groupby(group_codes, sort=True).sum()
+        group_keys = sums.index.to_numpy()
+        if group_codes is id_codes:
+            group_ids = group_keys
+            group_names = name_of_id[group_keys]
+        else:
+            group_ids, group_names = np.divmod(group_keys, len(name_values))
+        keys = pd.DataFrame({manager_id_col: id_values[group_ids], manager_name_col: name_values[group_names]})
+        # Колонка из одних пустых значений после groupby(...).reset_index() получает тип float64
+        empty_columns = [
+            column
+            for column, uniques in ((manager_id_col, id_uniques), (manager_name_col, name_uniques))
+            if len(uniques) == 0
+        ]
+        keys = keys.astype(dict.fromkeys(empty_columns, float))
+        return pd.concat([keys, sums.reset_index(drop=True)], axis=1)
+
     def build_manager_summary(
         self,
         variant_df: pd.DataFrame,
@@ -1987,11 +2856,14 @@ class Aggregator:
         if "Факт_T2" in variant_df.columns:
             numeric_columns.insert(2, "Факт_T2")  # Вставляем между Факт_T1 и Прирост
 
-        grouped = (
-            variant_df.groupby(group_columns, dropna=False)[numeric_columns]
-            .sum()
-            .reset_index()
-        )
+        if tb_column_present or variant_df.empty:
+            grouped = (
+                variant_df.groupby(group_columns, dropna=False)[numeric_columns]
+                .sum()
+                .reset_index()
+            )
+        else:
+            grouped = self._sum_by_manager(variant_df, manager_id_col, manager_name_col, numeric_columns)
         rename_map = {
             manager_id_col: SELECTED_MANAGER_ID_COL,
             manager_name_col: SELECTED_MANAGER_NAME_COL,
@@ -2027,6 +2899,7 @@ class VariantCalculator:
         defaults: Mapping[str, Any],
         identifiers: Mapping[str, Any],
         logger: Mapping[str, Any],
+        aggregator: Optional[Aggregator] = None,
     ):
         """Инициализирует калькулятор варианта.
         
@@ -2034,11 +2907,12 @@ class VariantCalculator:
             defaults: Словарь с настройками по умолчанию
             identifiers: Словарь с настройками форматирования идентификаторов
             logger: Логгер с методами info и debug
+            aggregator: Общий Aggregator расчета (None — создаётся собственный)
         """
         self.defaults = defaults
         self.identifiers = identifiers
         self.logger = logger
-        self.aggregator = Aggregator(defaults, identifiers, logger)
+        self.aggregator = aggregator if aggregator is not None else Aggregator(defaults, identifiers, logger)
     
     def calculate(
         self,
@@ -2094,23 +2968,13 @@ class Variant1Calculator(VariantCalculator):
         log_info(self.logger, "Расчет варианта 1: По КМ, без ТБ")
         
         # Агрегируем по manager_id в каждом файле
-        agg_t0 = self.aggregator.aggregate_facts(current_df, ["manager_id"], "T0", "V1")
-        agg_t1 = self.aggregator.aggregate_facts(previous_df, ["manager_id"], "T1", "V1")
-        
+        period_facts = [
+            self.aggregator.aggregate_facts(current_df, ["manager_id"], "T0", "V1"),
+            self.aggregator.aggregate_facts(previous_df, ["manager_id"], "T1", "V1"),
+        ]
         if previous2_df is not None:
-            agg_t2 = self.aggregator.aggregate_facts(previous2_df, ["manager_id"], "T2", "V1")
-            merged = (
-                pd.merge(agg_t0, agg_t1, on=["manager_id"], how="outer")
-                .merge(agg_t2, on=["manager_id"], how="outer")
-                .fillna({"Факт_T0": 0.0, "Факт_T1": 0.0, "Факт_T2": 0.0})
-            )
-            merged["Прирост"] = (merged["Факт_T0"] - merged["Факт_T1"]) - (merged["Факт_T1"] - merged["Факт_T2"])
-        else:
-            merged = (
-                pd.merge(agg_t0, agg_t1, on=["manager_id"], how="outer")
-                .fillna({"Факт_T0": 0.0, "Факт_T1": 0.0})
-            )
-            merged["Прирост"] = merged["Факт_T0"] - merged["Факт_T1"]
+            period_facts.append(self.aggregator.aggregate_facts(previous2_df, ["manager_id"], "T2", "V1"))
+        merged = self.aggregator.combine_period_facts(period_facts, ["manager_id"])
         
         # Добавляем информацию о менеджере из исходных данных
         manager_info = pd.DataFrame(columns=["manager_id", "manager_name"])
@@ -2121,10 +2985,24 @@ class Variant1Calculator(VariantCalculator):
         elif previous2_df is not None and not previous2_df.empty:
             manager_info = previous2_df[["manager_id", "manager_name"]].drop_duplicates()
         
-        if not manager_info.empty:
+        if not manager_info.empty and manager_info["manager_id"].is_unique:
+            # У каждого ТН одно ФИО: left merge сводится к выборке по общим кодам ТН.
+            # ТН свода и справочника кодируются одним pd.factorize; пустой ТН (код -1) совпадает
+            # с пустым, как в merge, и получает отдельный последний код.
+            codes, uniques = pd.factorize(
+                pd.concat([merged["manager_id"], manager_info["manager_id"]], ignore_index=True)
+            )
+            codes = np.where(codes < 0, len(uniques), codes)
+            name_by_code = np.full(len(uniques) + 1, np.nan, dtype=object)
+            name_by_code[codes[len(merged):]] = manager_info["manager_name"].to_numpy(dtype=object)
+            result = merged
+            result["manager_name"] = name_by_code[codes[: len(merged)]]
+        elif not manager_info.empty:
+            # У ТН несколько ФИО — merge сохраняет по строке на каждую пару
             result = merged.merge(manager_info, on=["manager_id"], how="left")
         else:
-            result = merged.copy()
+            # merged собран заново в combine_period_facts и дальше не используется — копия не нужна
+            result = merged
             result["manager_name"] = self.defaults.get("manager_name", "Не найден КМ")
         
         result = result.rename(columns={
@@ -2239,6 +3117,14 @@ class PercentileCalculator:
     Методы:
         append_percentile_columns: Добавляет колонки процентилей к таблице
     """
+
+    # Какие колонки (ТБ, ГОСБ) задают группу сравнения для каждого значения group_by;
+    # "all" и неизвестные значения — сравнение со всем отфильтрованным набором
+    GROUP_BY_COLUMNS: Dict[str, Tuple[str, ...]] = {
+        "tb": ("tb",),
+        "gosb": ("gosb",),
+        "tb_and_gosb": ("tb", "gosb"),
+    }
     
     @staticmethod
     def append_percentile_columns(
@@ -2289,84 +3175,100 @@ class PercentileCalculator:
                 f"Колонка '{value_column}' не найдена в таблице для расчёта процентилей."
             )
 
-        prepared = table.copy()
-        values = pd.to_numeric(prepared[value_column], errors="coerce").fillna(0.0)
+        # Поверхностная копия: исходные колонки не копируются, а шесть колонок результата ниже
+        # присваиваются целиком (по одному массиву на колонку), поэтому table не изменяется
+        prepared = table.copy(deep=False)
+        source_values = prepared[value_column]
+        # Обычный случай — числовая колонка (Прирост): NaN заменяются нулём прямо в NumPy-массиве
+        # с сохранением dtype; разбор через pd.to_numeric нужен только для нечисловых колонок
+        numpy_kind = source_values.dtype.kind if isinstance(source_values.dtype, np.dtype) else ""
+        if numpy_kind == "f":
+            values = source_values.to_numpy()
+            values = np.where(np.isnan(values), 0.0, values)
+        elif numpy_kind in ("i", "u"):
+            values = source_values.to_numpy()
+        else:
+            values = pd.to_numeric(source_values, errors="coerce").fillna(0.0).to_numpy()
 
-        # Применяем фильтр для расчета процентилей
+        # Применяем фильтр для расчета процентилей. Без фильтра ("all") маска не строится:
+        # массивы берутся целиком, без булевой выборки (копии) каждой колонки
+        filter_mask: Optional[np.ndarray] = None
         if percentile_filter and percentile_filter.lower() not in ("all", "все"):
-            filter_mask = build_filter_mask(values, percentile_filter)
-            filtered_indices = values[filter_mask].index
+            filter_mask = np.asarray(compile_filter(percentile_filter)(values), dtype=bool)
+
+        def filtered(array: np.ndarray) -> np.ndarray:
+            """Строки, участвующие в расчёте (прошедшие percentile_filter)."""
+            return array if filter_mask is None else array[filter_mask]
+
+        # Колонки группы сравнения определяются по group_by через таблицу GROUP_BY_COLUMNS;
+        # отсутствующие в таблице колонки пропускаются
+        column_by_role = {"tb": tb_column, "gosb": gosb_column}
+        group_columns: List[str] = [
+            column_by_role[role]
+            for role in PercentileCalculator.GROUP_BY_COLUMNS.get(group_by, ())
+            if column_by_role[role] and column_by_role[role] in prepared.columns
+        ]
+
+        # Ранги внутри группы дают количество меньших/больших/равных значений за одну сортировку:
+        # меньших = rank_min - 1, больших = размер - rank_max, равных (без самой строки) = rank_max - rank_min.
+        filtered_values = filtered(values.astype(float, copy=False))
+        if group_columns:
+            # Коды групп по каждой колонке; строки с пустым ключом группы не сравниваются ни с кем
+            group_codes = np.zeros(len(filtered_values), dtype=np.int64)
+            has_key = np.ones(len(filtered_values), dtype=bool)
+            for column in group_columns:
+                codes, uniques = pd.factorize(filtered(prepared[column].to_numpy()))
+                has_key &= codes >= 0
+                group_codes = group_codes * (len(uniques) + 1) + codes
+            rank_min = np.zeros(len(filtered_values), dtype=np.int64)
+            rank_max = np.zeros(len(filtered_values), dtype=np.int64)
+            group_size = np.zeros(len(filtered_values), dtype=np.int64)
+            rank_min[has_key], rank_max[has_key], group_size[has_key] = _rank_bounds(
+                filtered_values[has_key], group_codes[has_key]
+            )
         else:
-            filter_mask = pd.Series(True, index=values.index)
-            filtered_indices = values.index
-        
-        # Рассчитываем процентили для каждой строки относительно отфильтрованного набора
-        prepared["Обогнал_всего_%"] = 0.0
-        prepared["Обогнали_меня_всего_%"] = 0.0
-        prepared["Обогнал_всего_кол"] = 0
-        prepared["Обогнали_меня_всего_кол"] = 0
-        prepared["Равных_всего_кол"] = 0
-        prepared["Всего_КМ_всего"] = 0
-        
-        # Для каждой строки рассчитываем процентили относительно отфильтрованного набора
-        for idx in prepared.index:
-            current_value = values.loc[idx]
-            
-            # Если значение не проходит фильтр, процентили = 0
-            if percentile_filter and percentile_filter.lower() not in ("all", "все"):
-                if not filter_mask.loc[idx]:
-                    continue
-            
-            # Определяем набор для сравнения в зависимости от group_by
-            comparison_indices = filtered_indices.copy()
-            
-            if group_by == "tb" and tb_column and tb_column in prepared.columns:
-                # Сравниваем только с КМ того же ТБ
-                current_tb = prepared.loc[idx, tb_column]
-                tb_mask = prepared.loc[comparison_indices, tb_column] == current_tb
-                comparison_indices = comparison_indices[tb_mask]
-            elif group_by == "gosb" and gosb_column and gosb_column in prepared.columns:
-                # Сравниваем только с КМ того же ГОСБ
-                current_gosb = prepared.loc[idx, gosb_column]
-                gosb_mask = prepared.loc[comparison_indices, gosb_column] == current_gosb
-                comparison_indices = comparison_indices[gosb_mask]
-            elif group_by == "tb_and_gosb":
-                # Сравниваем только с КМ того же ТБ и ГОСБ
-                if tb_column and tb_column in prepared.columns:
-                    current_tb = prepared.loc[idx, tb_column]
-                    tb_mask = prepared.loc[comparison_indices, tb_column] == current_tb
-                    comparison_indices = comparison_indices[tb_mask]
-                if gosb_column and gosb_column in prepared.columns:
-                    current_gosb = prepared.loc[idx, gosb_column]
-                    gosb_mask = prepared.loc[comparison_indices, gosb_column] == current_gosb
-                    comparison_indices = comparison_indices[gosb_mask]
-            # Если group_by == "all", используем все filtered_indices
-            
-            # Исключаем текущую строку из сравнения
-            comparison_indices = comparison_indices[comparison_indices != idx]
-            
-            if len(comparison_indices) == 0:
-                continue
-            
-            comparison_values = values.loc[comparison_indices]
-            
-            # Считаем процентили для текущего значения относительно группы сравнения
-            less_count = (comparison_values < current_value).sum()
-            greater_count = (comparison_values > current_value).sum()
-            equal_count = (comparison_values == current_value).sum()
-            
-            total = len(comparison_indices)
-            if total > 0:
-                prepared.loc[idx, "Обогнал_всего_%"] = round((less_count / total) * 100, 2)
-                prepared.loc[idx, "Обогнали_меня_всего_%"] = round((greater_count / total) * 100, 2)
-            prepared.loc[idx, "Обогнал_всего_кол"] = less_count
-            prepared.loc[idx, "Обогнали_меня_всего_кол"] = greater_count
-            prepared.loc[idx, "Равных_всего_кол"] = max(0, equal_count)
-            prepared.loc[idx, "Всего_КМ_всего"] = total
+            rank_min, rank_max, group_size = _rank_bounds(filtered_values)
+
+        # Текущая строка исключается из сравнения; строки без соседей по группе (и не прошедшие фильтр)
+        # получают нули, поэтому считаем только строки с соседями и сразу раскладываем их по позициям.
+        has_peers = group_size > 1
+        peer_rows = np.flatnonzero(has_peers) if filter_mask is None else np.flatnonzero(filter_mask)[has_peers]
+        peer_total = group_size[has_peers] - 1
+        less_count = rank_min[has_peers] - 1
+        greater_count = group_size[has_peers] - rank_max[has_peers]
+        equal_count = rank_max[has_peers] - rank_min[has_peers]
+
+        def full_column(peer_values: np.ndarray, dtype: Any) -> np.ndarray:
+            """Раскладывает значения строк с соседями по всей таблице (остальные строки = 0)."""
+            result = np.zeros(len(prepared), dtype=dtype)
+            result[peer_rows] = peer_values
+            return result
+
+        def percent_of_total(count: np.ndarray) -> np.ndarray:
+            """Доля от группы сравнения в процентах, округлённая до 2 знаков (без промежуточных копий)."""
+            percent = count / peer_total
+            percent *= 100
+            return np.round(percent, 2, out=percent)
+
+        prepared["Обогнал_всего_%"] = full_column(percent_of_total(less_count), float)
+        prepared["Обогнали_меня_всего_%"] = full_column(percent_of_total(greater_count), float)
+        prepared["Обогнал_всего_кол"] = full_column(less_count, np.int64)
+        prepared["Обогнали_меня_всего_кол"] = full_column(greater_count, np.int64)
+        prepared["Равных_всего_кол"] = full_column(equal_count, np.int64)
+        prepared["Всего_КМ_всего"] = full_column(peer_total, np.int64)
 
         return prepared
 
 
+# Самое длинное представление float64: знак, 17 значащих цифр, точка и порядок "e-308"
+FLOAT_REPR_MAX_LEN = len(repr(-2.2250738585072014e-308))
+
+# Классификация колонок листа Excel по имени: один скомпилированный шаблон на числовой формат.
+# Дробный формат — факты, прирост, FACT_VALUE/PLAN_VALUE и колонки «Обогнал…»; целый — количества.
+FLOAT_COLUMN_PATTERN = re.compile(r"\A(?:Факт|(?:Прирост|FACT_VALUE|PLAN_VALUE)\Z)|Обогнал")
+INT_COLUMN_PATTERN = re.compile(r"_кол|Всего_КМ|Кол-во")
+
+
 class ExcelExporter:
     """Класс для экспорта данных в Excel с форматированием.
     
@@ -2377,6 +3279,201 @@ class ExcelExporter:
         format_sheet: Применяет форматирование к листу Excel
         write_sheet: Записывает DataFrame в лист Excel с форматированием
     """
+
+    # Предельный размер листа Excel (как в DataFrame.to_excel)
+    MAX_ROWS = 1048576
+    MAX_COLS = 16384
+    # Число строк, которые stream_sheet переводит в значения Python за один раз
+    STREAM_BLOCK_ROWS = 8192
+    # Числовые форматы колонок
+    FLOAT_FORMAT = "#,##0.00"
+    INT_FORMAT = "#,##0"
+    # Объекты стилей неизменяемы, поэтому создаются один раз и разделяются всеми листами и ячейками
+    HEADER_FONT = Font(bold=True)
+    HEADER_BORDER = Border(
+        top=Side(style="thin"), right=Side(style="thin"), bottom=Side(style="thin"), left=Side(style="thin")
+    )
+    # Выравнивание заголовка и данных по значению wrap_text; у пустой таблицы заголовок по центру
+    CELL_ALIGNMENT = {
+        True: Alignment(wrap_text=True, vertical="top"),
+        False: Alignment(wrap_text=False, vertical="top"),
+    }
+    EMPTY_HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+    @staticmethod
+    def column_number_format(column: str) -> Optional[str]:
+        """Определяет числовой формат колонки по её имени.
+        
+        Args:
+            column: Имя колонки
+        
+        Returns:
+            "#,##0.00" для процентов и фактов, "#,##0" для количеств, None для остальных колонок
+        """
+        if FLOAT_COLUMN_PATTERN.search(column):
+            return ExcelExporter.FLOAT_FORMAT
+        if INT_COLUMN_PATTERN.search(column):
+            # Колонки с количеством - целые числа
+            return ExcelExporter.INT_FORMAT
+        return None
+
+    @staticmethod
+    def register_data_styles(workbook: Any, wrap_text: bool = True) -> Dict[Optional[str], str]:
+        """Регистрирует в книге именованные стили ячеек данных (один раз на книгу).
+        
+        Ячейке назначается имя стиля, и openpyxl берёт готовую запись из общей таблицы
+        стилей книги, вместо того чтобы для каждой ячейки заново искать выравнивание и формат.
+        
+        Args:
+            workbook: Книга openpyxl
+            wrap_text: Включить перенос текста по строкам
+        
+        Returns:
+            Словарь {числовой формат колонки (см. column_number_format): имя стиля}
+        """
+        suffix = "wrap" if wrap_text else "nowrap"
+        style_names: Dict[Optional[str], str] = {}
+        for number_format, prefix in (
+            (ExcelExporter.FLOAT_FORMAT, "fmt_float"),
+            (ExcelExporter.INT_FORMAT, "fmt_int"),
+            (None, "fmt_text"),
+        ):
+            name = f"{prefix}_{suffix}"
+            if name not in workbook.named_styles:
+                workbook.add_named_style(
+                    NamedStyle(
+                        name=name,
+                        font=copy.copy(DEFAULT_FONT),
+                        border=copy.copy(DEFAULT_BORDER),
+                        alignment=ExcelExporter.CELL_ALIGNMENT[bool(wrap_text)],
+                        number_format=number_format or "General",
+                    )
+                )
+            style_names[number_format] = name
+        return style_names
+
+    @staticmethod
+    def column_width(column: Any, values: pd.Series, min_width: int = 20, max_width: int = 200) -> int:
+        """Вычисляет ширину колонки по самому длинному значению (заголовок + данные).
+        
+        Значения не перебираются на Python: для целых и логических колонок самое длинное
+        представление даёт минимум или максимум, для остальных длины строк считаются
+        в NumPy (np.char.str_len). Если ширину ограничивает уже заголовок, данные не сканируются.
+        
+        Args:
+            column: Имя колонки
+            values: Значения колонки
+            min_width: Минимальная ширина колонки в пунктах
+            max_width: Максимальная ширина колонки в пунктах
+        
+        Returns:
+            Ширина колонки в пределах [min_width, max_width]
+        """
+        max_len = len(str(column))
+        if len(values) and max_len + 2 < max_width:
+            # Типы-расширения (Int64, boolean, string) могут содержать pd.NA и обрабатываются как object
+            kind = values.dtype.kind if isinstance(values.dtype, np.dtype) else "O"
+            if kind in "iub":
+                array = values.to_numpy()
+                value_len = max(len(str(array.min().item())), len(str(array.max().item())))
+            elif kind == "f":
+                # Значения float32 выводятся в Excel как float64, поэтому и длину считаем по float64.
+                # Длина repr(float) не превышает FLOAT_REPR_MAX_LEN: более длинный заголовок
+                # не требует сканирования. Иначе строки строим только для уникальных битовых
+                # образов (различаются 0.0 и -0.0) без промежуточного массива 'U'.
+                if max_len >= FLOAT_REPR_MAX_LEN:
+                    value_len = 0
+                else:
+                    bits = np.unique(values.to_numpy(dtype=np.float64).view(np.int64))
+                    value_len = max(map(len, map(repr, bits.view(np.float64).tolist())))
+            elif kind == "O":
+                # Преобразование в 'U' даёт те же строки, что str() у отдельных значений
+                array = values.to_numpy(dtype=object)
+                value_len = int(np.char.str_len(array.astype(str)).max())
+            else:
+                # Даты numpy приводятся к 'U' иначе, чем str() у отдельного значения
+                value_len = max(len(str(value)) for value in values.tolist())
+            max_len = max(max_len, value_len)
+        # Добавляем небольшой отступ (2 символа) для комфортного отображения
+        return clamp_width(max_len + 2, min_width, max_width)
+
+    @staticmethod
+    def excel_values(
+        writer: pd.ExcelWriter, values: pd.Series
+    ) -> Tuple[List[Any], Optional[List[Optional[str]]]]:
+        """Приводит значения колонки к виду, в котором их записывает DataFrame.to_excel.
+        
+        Пропуски становятся пустой строкой, бесконечности — строками "inf"/"-inf",
+        скаляры numpy — значениями Python, даты и интервалы получают формат ячейки.
+        
+        Args:
+            writer: ExcelWriter (источник форматов дат)
+            values: Значения колонки
+        
+        Returns:
+            (список значений, список форматов ячеек или None, если форматы не нужны)
+        """
+        array = values.to_numpy()
+        inferred = None
+        if array.dtype == object:
+            # Тип содержимого объектной колонки определяется одной проверкой в C
+            inferred = pd.api.types.infer_dtype(array, skipna=False)
+            if inferred == "floating":
+                # Числа с пропусками в объектной колонке обрабатываются векторно, как колонка float64
+                array = array.astype(np.float64)
+            elif inferred == "integer":
+                return [int(value) for value in array.tolist()], None
+        if array.dtype.kind in "iub":
+            return array.tolist(), None
+        if array.dtype.kind == "f":
+            converted = array.astype(object)
+            converted[np.isnan(array)] = ""
+            converted[np.isposinf(array)] = "inf"
+            converted[np.isneginf(array)] = "-inf"
+            return converted.tolist(), None
+        if inferred == "string":
+            # Колонка из одних строк (ФИО, ТБ, табельные номера) записывается как есть,
+            # без разбора типа каждого значения в цикле ниже
+            return array.tolist(), None
+
+        converted_values: List[Any] = []
+        formats: Optional[List[Optional[str]]] = None
+        for position, value in enumerate(values.tolist()):
+            if type(value) is str:
+                converted_values.append(value)
+                continue
+            fmt = None
+            if pd.api.types.is_scalar(value) and pd.isna(value):
+                value = ""
+            elif pd.api.types.is_float(value) and np.isinf(value):
+                value = "inf" if value > 0 else "-inf"
+            if getattr(value, "tzinfo", None) is not None:
+                raise ValueError(
+                    "Excel does not support datetimes with "
+                    "timezones. Please ensure that datetimes "
+                    "are timezone unaware before writing to Excel."
+                )
+            if pd.api.types.is_integer(value):
+                value = int(value)
+            elif pd.api.types.is_float(value):
+                value = float(value)
+            elif pd.api.types.is_bool(value):
+                value = bool(value)
+            elif isinstance(value, dt.datetime):
+                fmt = writer.datetime_format
+            elif isinstance(value, dt.date):
+                fmt = writer.date_format
+            elif isinstance(value, dt.timedelta):
+                value = value.total_seconds() / 86400
+                fmt = "0"
+            else:
+                value = str(value)
+            if fmt is not None:
+                if formats is None:
+                    formats = [None] * len(values)
+                formats[position] = fmt
+            converted_values.append(value)
+        return converted_values, formats
     
     @staticmethod
     def format_sheet(
@@ -2413,93 +3510,241 @@ class ExcelExporter:
         if df.empty:
             return
 
+        # to_excel заполняет прямоугольник от A1 (заголовок + строки df), поэтому границы листа
+        # берутся из размера df, а не из worksheet.dimensions/max_row с проходом по всем ячейкам
+        num_rows, num_cols = df.shape
         worksheet.freeze_panes = worksheet["A2"]
-        worksheet.auto_filter.ref = worksheet.dimensions
+        worksheet.auto_filter.ref = f"A1:{get_column_letter(num_cols)}{num_rows + 1}"
 
         # Настройки выравнивания с учетом wrap_text
-        header_alignment = Alignment(wrap_text=wrap_text, vertical="top")
-        wrap_alignment = Alignment(wrap_text=wrap_text, vertical="top")
-        number_alignment = Alignment(wrap_text=wrap_text, vertical="top")
-        header_font = Font(bold=True)
+        header_alignment = ExcelExporter.CELL_ALIGNMENT[bool(wrap_text)]
+        header_font = ExcelExporter.HEADER_FONT
+        style_names = ExcelExporter.register_data_styles(workbook, wrap_text)
 
         # Форматируем заголовки
         for cell in next(worksheet.iter_rows(min_row=1, max_row=1)):
             cell.font = header_font
             cell.alignment = header_alignment
 
+        max_row = num_rows + 1
         # Автоматическая подстройка ширины колонок по содержимому
         for col_idx, column in enumerate(df.columns, start=1):
-            # Собираем все значения в колонке (заголовок + данные)
-            values = [str(column)] + [str(value) for value in df[column].tolist()]
-            
-            # Находим максимальную длину содержимого
-            max_len = max((len(str(value)) for value in values), default=0)
-            
-            # Добавляем небольшой отступ (2 символа) для комфортного отображения
-            calculated_width = max_len + 2
-            
-            # Применяем ограничения min_width и max_width
-            width = clamp_width(calculated_width, min_width, max_width)
-            
             column_letter = get_column_letter(col_idx)
-            worksheet.column_dimensions[column_letter].width = width
-
-            # Форматируем данные в колонке
-            if worksheet.max_row >= 2:
-                data_range = worksheet[f"{column_letter}2": f"{column_letter}{worksheet.max_row}"]
-                if (
-                    column.startswith("Факт")
-                    or column == "Прирост"
-                    or "Обогнал" in column
-                    or "Обогнали" in column
-                    or column == "FACT_VALUE"
-                    or column == "PLAN_VALUE"
-                    or column == "Факт"
-                ):
-                    for cell_tuple in data_range:
-                        for item in cell_tuple:
-                            item.number_format = "#,##0.00"
-                            item.alignment = number_alignment
-                elif "_кол" in column or "Всего_КМ" in column or "Кол-во" in column:
-                    # Колонки с количеством - целые числа
-                    for cell_tuple in data_range:
-                        for item in cell_tuple:
-                            item.number_format = "#,##0"
-                            item.alignment = number_alignment
+            values = df.iloc[:, col_idx - 1]
+            worksheet.column_dimensions[column_letter].width = ExcelExporter.column_width(
+                column, values, min_width, max_width
+            )
+
+            # Форматируем данные в колонке: стиль выбирается один раз на колонку
+            if max_row >= 2:
+                cells = next(
+                    worksheet.iter_cols(min_col=col_idx, max_col=col_idx, min_row=2, max_row=max_row)
+                )
+                number_format = ExcelExporter.column_number_format(column)
+                style_name = style_names[number_format]
+                if number_format is None and values.dtype.kind in "OmM":
+                    # Формат дат, проставленный to_excel, в текстовых колонках сохраняется
+                    for item in cells:
+                        cell_format = item.number_format
+                        item.style = style_name
+                        if cell_format != "General":
+                            item.number_format = cell_format
                 else:
-                    for cell_tuple in data_range:
-                        for item in cell_tuple:
-                            item.alignment = wrap_alignment
+                    for item in cells:
+                        item.style = style_name
+
+    @staticmethod
+    def stream_sheet(
+        writer: pd.ExcelWriter,
+        sheet_name: str,
+        df: pd.DataFrame,
+        min_width: int = 20,
+        max_width: int = 200,
+        wrap_text: bool = True,
+        row_order: Optional[np.ndarray] = None,
+    ) -> None:
+        """Записывает DataFrame в лист книги openpyxl в режиме write_only.
+        
+        Результат совпадает с DataFrame.to_excel + format_sheet, но стили не
+        проставляются отдельным проходом по готовым ячейкам: для каждой колонки
+        один раз создаётся ячейка-шаблон WriteOnlyCell с общими объектами стилей,
+        строки потоково дописываются через append, а шаблону меняется только значение.
+        
+        Args:
+            writer: ExcelWriter, книга которого открыта в режиме write_only
+            sheet_name: Имя листа для записи
+            df: DataFrame с данными
+            min_width: Минимальная ширина колонки в пунктах (по умолчанию 20)
+            max_width: Максимальная ширина колонки в пунктах (по умолчанию 200)
+            wrap_text: Включить перенос текста по строкам (по умолчанию True)
+            row_order: Позиции строк df в порядке записи (None — порядок df). Блоки строк выбираются
+                по этим позициям, поэтому отсортированная копия всего листа не создаётся
+        """
+        num_rows, num_cols = df.shape
+        if num_rows > ExcelExporter.MAX_ROWS or num_cols > ExcelExporter.MAX_COLS:
+            raise ValueError(
+                f"This sheet is too large! Your sheet size is: {num_rows}, {num_cols} "
+                f"Max sheet size is: {ExcelExporter.MAX_ROWS}, {ExcelExporter.MAX_COLS}"
+            )
+
+        worksheet = writer.book.create_sheet(title=sheet_name)
+        if num_cols == 0:
+            return
+
+        # Заголовок оформляется так же, как в DataFrame.to_excel (жирный шрифт и тонкие границы);
+        # для непустых таблиц выравнивание заменяется на выравнивание с переносом текста
+        header_border = ExcelExporter.HEADER_BORDER
+        header_font = ExcelExporter.HEADER_FONT
+        if df.empty:
+            header_alignment = ExcelExporter.EMPTY_HEADER_ALIGNMENT
+        else:
+            header_alignment = ExcelExporter.CELL_ALIGNMENT[bool(wrap_text)]
+
+        header_values, header_formats = ExcelExporter.excel_values(writer, pd.Series(df.columns, dtype=object))
+        header_row = []
+        for position, value in enumerate(header_values):
+            cell = WriteOnlyCell(worksheet, value=value)
+            if header_formats is not None and header_formats[position] is not None:
+                cell.number_format = header_formats[position]
+            cell.font = header_font
+            cell.border = header_border
+            cell.alignment = header_alignment
+            header_row.append(cell)
+
+        if df.empty:
+            worksheet.append(header_row)
+            return
+
+        # Закрепление, автофильтр и ширины колонок пишутся в начало листа,
+        # поэтому задаются до первой строки
+        worksheet.freeze_panes = "A2"
+        worksheet.auto_filter.ref = f"A1:{get_column_letter(num_cols)}{num_rows + 1}"
+        style_names = ExcelExporter.register_data_styles(writer.book, wrap_text)
+
+        templates: List[WriteOnlyCell] = []
+        column_formats: List[Optional[str]] = []
+        for col_idx, column in enumerate(df.columns, start=1):
+            worksheet.column_dimensions[get_column_letter(col_idx)].width = ExcelExporter.column_width(
+                column, df.iloc[:, col_idx - 1], min_width, max_width
+            )
+
+            # Стиль (формат и выравнивание) назначается шаблону один раз на колонку
+            number_format = ExcelExporter.column_number_format(column)
+            template = WriteOnlyCell(worksheet)
+            template.style = style_names[number_format]
+            templates.append(template)
+            column_formats.append(number_format)
+
+        worksheet.append(header_row)
+
+        # Ячейки-шаблоны сериализуются сразу в append, поэтому их можно переиспользовать для всех строк.
+        # Значения переводятся в объекты Python блоками по STREAM_BLOCK_ROWS строк: лист пишется
+        # потоково, и в памяти одновременно находится только один блок, а не весь лист.
+        templates_row = tuple(templates)
+        for start in range(0, num_rows, ExcelExporter.STREAM_BLOCK_ROWS):
+            if row_order is None:
+                block = df.iloc[start:start + ExcelExporter.STREAM_BLOCK_ROWS]
+            else:
+                block = df.take(row_order[start:start + ExcelExporter.STREAM_BLOCK_ROWS])
+            converted = [ExcelExporter.excel_values(writer, block.iloc[:, position]) for position in range(num_cols)]
+            columns_values = [column_values for column_values, _ in converted]
+            columns_formats = [cell_formats for _, cell_formats in converted]
+
+            if all(cell_formats is None for cell_formats in columns_formats):
+                for row_values in zip(*columns_values):
+                    for template, value in zip(templates_row, row_values):
+                        template.value = value
+                    worksheet.append(templates_row)
+                continue
+
+            for row_idx, row_values in enumerate(zip(*columns_values)):
+                for template, value, cell_formats, number_format in zip(
+                    templates_row, row_values, columns_formats, column_formats
+                ):
+                    template.value = value
+                    if cell_formats is not None:
+                        # Формат даты задаётся поячеечно, но числовой формат колонки имеет приоритет
+                        template.number_format = number_format or cell_formats[row_idx] or "General"
+                worksheet.append(templates_row)
+            # Поячеечные форматы не должны перейти в следующий блок: шаблонам возвращается стиль колонки
+            for template, cell_formats, number_format in zip(templates_row, columns_formats, column_formats):
+                if cell_formats is not None:
+                    template.style = style_names[number_format]
     
+    @staticmethod
+    @contextmanager
+    def zip_compression(level: Optional[int]) -> Iterator[None]:
+        """Задаёт уровень сжатия zip, с которым openpyxl сохраняет книгу внутри блока with.
+        
+        openpyxl всегда открывает архив с уровнем zlib по умолчанию (6), а на больших листах
+        сжатие занимает заметную часть сохранения. Уровень 1 сжимает в несколько раз быстрее
+        ценой немного большего файла; содержимое книги не меняется.
+        
+        Args:
+            level: Уровень сжатия 0-9 (None — уровень openpyxl по умолчанию)
+        """
+        if level is None:
+            yield
+            return
+        zip_file = openpyxl_excel_writer.ZipFile
+        openpyxl_excel_writer.ZipFile = functools.partial(zip_file, compresslevel=level)
+        try:
+            yield
+        finally:
+            openpyxl_excel_writer.ZipFile = zip_file
+
+    @staticmethod
+    def should_write(sheet_name: str, written_sheets: Set[str]) -> bool:
+        """Проверяет, что лист ещё не записан (дорогие данные листа стоит строить только в этом случае).
+        
+        Args:
+            sheet_name: Имя листа
+            written_sheets: Множество уже записанных листов
+        
+        Returns:
+            True, если листа sheet_name нет среди записанных
+        """
+        return sheet_name not in written_sheets
+
     @staticmethod
     def write_sheet(
         writer: pd.ExcelWriter,
         sheet_name: str,
         df: pd.DataFrame,
-        written_sheets: Set[str],
+        written_sheets: Optional[Set[str]],
         min_width: int = 20,
         max_width: int = 200,
         wrap_text: bool = True,
+        row_order: Optional[np.ndarray] = None,
     ) -> None:
         """Записывает DataFrame в лист Excel с форматированием.
         
-        Проверяет, не был ли лист уже записан, и если нет - записывает данные
-        и применяет форматирование.
+        Проверяет, не был ли лист уже записан (если передан written_sheets), и если нет - записывает данные
+        и применяет форматирование. Книга в режиме write_only заполняется потоково
+        (stream_sheet), обычная книга - через DataFrame.to_excel и format_sheet.
         
         Args:
             writer: ExcelWriter для записи
             sheet_name: Имя листа для записи
             df: DataFrame с данными
-            written_sheets: Множество уже записанных листов (изменяется на месте)
+            written_sheets: Множество уже записанных листов (изменяется на месте);
+                None — повторы имён уже отсеяны вызывающим кодом
             min_width: Минимальная ширина колонки в пунктах (по умолчанию 20)
             max_width: Максимальная ширина колонки в пунктах (по умолчанию 200)
             wrap_text: Включить перенос текста по строкам (по умолчанию True)
+            row_order: Позиции строк df в порядке записи (None — порядок df)
         """
-        if sheet_name in written_sheets:
+        if written_sheets is not None and not ExcelExporter.should_write(sheet_name, written_sheets):
             return
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
-        ExcelExporter.format_sheet(writer, sheet_name, df, min_width, max_width, wrap_text)
-        written_sheets.add(sheet_name)
+        if writer.book.write_only:
+            ExcelExporter.stream_sheet(writer, sheet_name, df, min_width, max_width, wrap_text, row_order)
+        else:
+            if row_order is not None:
+                df = df.take(row_order)
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            ExcelExporter.format_sheet(writer, sheet_name, df, min_width, max_width, wrap_text)
+        if written_sheets is not None:
+            written_sheets.add(sheet_name)
 
 
 def build_logger(log_dir: Path, topic: str) -> Dict[str, Any]:
@@ -2510,22 +3755,51 @@ def build_logger(log_dir: Path, topic: str) -> Dict[str, Any]:
     info_path = log_dir / f"INFO_{topic}{suffix}.log"
     debug_path = log_dir / f"DEBUG_{topic}{suffix}.log"
 
+    # Файлы открываются один раз на всё время жизни логгера (дозапись, буфер LOG_BUFFER_SIZE),
+    # а не на каждое сообщение. INFO сбрасывается на диск сразу вместе с накопленным DEBUG;
+    # остаток DEBUG дописывается при close() или при завершении интерпретатора.
+    info_file = info_path.open("a", encoding="utf-8", buffering=LOG_BUFFER_SIZE)
+    debug_file = debug_path.open("a", encoding="utf-8", buffering=LOG_BUFFER_SIZE)
+    # Логгер вызывается и из рабочих потоков (подготовка листов, запись CSV)
+    lock = threading.Lock()
+
+    # Отметка времени с точностью до секунды: форматируется один раз на секунду,
+    # пачка сообщений внутри одной секунды берёт готовую строку (пара хранится одним кортежем)
+    timestamp_cache = [(-1, "")]
+
+    def timestamp() -> str:
+        second = int(time.time())
+        cached_second, text = timestamp_cache[0]
+        if cached_second != second:
+            text = f"{dt.datetime.fromtimestamp(second):%Y-%m-%d %H:%M:%S}"
+            timestamp_cache[0] = (second, text)
+        return text
+
     # INFO всегда дублируется в консоль, DEBUG пишется только в файл (согласно ТЗ).
     def info(message: str) -> None:
-        line = f"{dt.datetime.now():%Y-%m-%d %H:%M:%S} - [INFO] - {message}"
+        line = f"{timestamp()} - [INFO] - {message}"
         print(line)
-        with info_path.open("a", encoding="utf-8") as info_file:
+        with lock:
             info_file.write(f"{line}\n")
+            info_file.flush()
+            debug_file.flush()
 
     def debug(message: str, class_name: str, func_name: str) -> None:
         line = (
-            f"{dt.datetime.now():%Y-%m-%d %H:%M:%S} - [DEBUG] - "
+            f"{timestamp()} - [DEBUG] - "
             f"{message} [class: {class_name} | def: {func_name}]"
         )
-        with debug_path.open("a", encoding="utf-8") as debug_file:
+        with lock:
             debug_file.write(f"{line}\n")
 
-    return {"info": info, "debug": debug}
+    def close() -> None:
+        with lock:
+            info_file.close()
+            debug_file.close()
+        atexit.unregister(close)
+
+    atexit.register(close)
+    return {"info": info, "debug": debug, "close": close}
 
 
 def log_info(logger: Mapping[str, Any], message: str) -> None:
@@ -2542,9 +3816,42 @@ def log_debug(
     logger["debug"](message, class_name, func_name)
 
 
+def close_logger(logger: Mapping[str, Any]) -> None:
+    """Дописывает буферы и закрывает файлы логгера (если он их держит)."""
+
+    close = logger.get("close")
+    if close is not None:
+        close()
+
+
 # -------------------------- Работа с исходными файлами ----------------------
 
 
+def _read_source_file_in_process(
+    identifiers: Mapping[str, Mapping[str, Any]],
+    cache_dir: Optional[Path],
+    file_path: Path,
+    sheet_name: str,
+    columns: List[Dict[str, str]],
+    drop_rules: Mapping[str, Any],
+) -> Tuple[pd.DataFrame, List[Tuple[str, Tuple[Any, ...]]]]:
+    """Читает файл в дочернем процессе для DataLoader.read_many.
+    
+    Логгер из build_logger (замыкания) не передаётся между процессами, поэтому сообщения
+    копятся в списке и возвращаются вместе с данными.
+    
+    Returns:
+        (DataFrame, список записей лога (уровень, аргументы))
+    """
+    records: List[Tuple[str, Tuple[Any, ...]]] = []
+    logger = {
+        "info": lambda *args: records.append(("info", args)),
+        "debug": lambda *args: records.append(("debug", args)),
+    }
+    df = DataLoader(identifiers, logger, cache_dir).read_source_file(file_path, sheet_name, columns, drop_rules)
+    return df, records
+
+
 def read_source_file(
     file_path: Path,
     sheet_name: str,
@@ -2597,6 +3904,83 @@ def drop_forbidden_rows(
     return data_loader.drop_forbidden_rows(df, drop_rules)
 
 
+def load_monthly_files(
+    file_section: Dict[str, Any],
+    defaults: Dict[str, Any],
+    input_dir: Path,
+    data_loader: DataLoader,
+    logger: Mapping[str, Any],
+    years: Iterable[int],
+    max_workers: int = 5,
+) -> Dict[int, List[pd.DataFrame]]:
+    """Загружает помесячные файлы (ключи вида YYYY_M-MM) для режима "new".
+
+    Наличие файлов проверяется в отдельном потоке (file_path.exists() на сетевых дисках может стоить
+    миллисекунды) с опережением, а найденные файлы сразу отправляются на чтение в пул потоков:
+    проверки не стоят в очереди за разбором файлов. asyncio не используется, поэтому функция работает
+    и там, где цикл событий уже запущен (Spyder, Jupyter). Сообщения о пропусках и загрузке файлов
+    пишутся в вызывающем потоке в порядке месяцев, а сообщения самого read_source_file — из потоков
+    чтения, поэтому в логе они могут перемежаться (логгер защищен блокировкой).
+
+    Args:
+        file_section: Секция files из настроек
+        defaults: Секция defaults из настроек
+        input_dir: Каталог с исходными файлами
+        data_loader: Загрузчик данных
+        logger: Логгер для записи сообщений
+        years: Годы для загрузки (например, (2025, 2024))
+        max_workers: Количество потоков чтения файлов
+
+    Returns:
+        Словарь {год: список DataFrame в порядке месяцев}. Отсутствующие файлы пропускаются.
+    """
+    years = list(years)
+
+    def read_month_file(file_key: str, file_path: Path) -> pd.DataFrame:
+        file_settings = resolve_file_settings(file_section, file_key, defaults)
+        return data_loader.read_source_file(
+            file_path, file_settings.sheet, file_settings.columns, file_settings.drop_rules
+        )
+
+    candidates: List[Tuple[int, int, str, str, Path]] = []
+    for year in years:
+        for month_num in range(1, 13):
+            file_key = f"{year}_M-{month_num:02d}"
+            try:
+                file_meta = get_file_meta(file_section, file_key)
+            except KeyError:
+                log_info(logger, f"Конфигурация для {file_key} не найдена, пропускаем")
+                continue
+            file_name = file_meta.get("file_name", "").strip()
+            if not file_name:
+                log_info(logger, f"Имя файла для {file_key} не указано, пропускаем")
+                continue
+            candidates.append((year, month_num, file_key, file_name, input_dir / file_name))
+
+    # Слоты заранее размечены по месяцам: порядок не зависит от того, какой файл прочитан раньше.
+    files_by_year: Dict[int, List[Optional[pd.DataFrame]]] = {year: [None] * 12 for year in years}
+
+    with ThreadPoolExecutor(max_workers=1) as stat_executor, ThreadPoolExecutor(
+        max_workers=max_workers
+    ) as io_executor:
+        pending = []
+        exists_flags = stat_executor.map(lambda candidate: candidate[4].exists(), candidates)
+        for candidate, exists in zip(candidates, exists_flags):
+            year, month_num, file_key, file_name, file_path = candidate
+            if not exists:
+                log_info(logger, f"Файл {file_key} не найден: {file_name}, пропускаем")
+                continue
+            pending.append((candidate, io_executor.submit(read_month_file, file_key, file_path)))
+        for (year, month_num, file_key, file_name, _), future in pending:
+            files_by_year[year][month_num - 1] = future.result()
+            log_info(logger, f"Загружен файл {file_key}: {file_name}")
+
+    return {
+        year: [df for df in month_slots if df is not None]
+        for year, month_slots in files_by_year.items()
+    }
+
+
 # -------------------------- Агрегация данных --------------------------------
 
 
@@ -2693,52 +4077,33 @@ def assemble_variant_dataset(
     defaults: Mapping[str, Any],
     identifiers: Mapping[str, Any],
     logger: Mapping[str, Any],
+    aggregator: Optional[Aggregator] = None,
 ) -> pd.DataFrame:
-    """Формирует таблицу для конкретного варианта ключа."""
-
-    log_debug(
-        logger,
-        f"{variant_name}: старт построения набора данных",
-        class_name="Aggregator",
-        func_name="assemble_variant_dataset",
-    )
-
-    agg_current = aggregate_facts(current_df, key_columns, "T0", logger, variant_name)
-    agg_previous = aggregate_facts(previous_df, key_columns, "T1", logger, variant_name)
-    merged = (
-        pd.merge(agg_current, agg_previous, on=key_columns, how="outer")
-        .fillna({"Факт_T0": 0.0, "Факт_T1": 0.0})
-    )
-    merged["Прирост"] = merged["Факт_T0"] - merged["Факт_T1"]
-
-    best_current = select_best_manager(
-        current_df, key_columns, logger, variant_name
-    ).rename(columns={"ВКО": "ВКО_T0", "Таб. номер ВКО": "Таб. номер ВКО_T0"})
-    best_previous = select_best_manager(
-        previous_df, key_columns, logger, variant_name
-    ).rename(columns={"ВКО": "ВКО_T1", "Таб. номер ВКО": "Таб. номер ВКО_T1"})
-
-    merged = merged.merge(best_current, on=key_columns, how="left")
-    merged = merged.merge(best_previous, on=key_columns, how="left")
-
-    latest = build_latest_manager(
-        current_best=best_current.rename(columns={"ВКО_T0": "ВКО", "Таб. номер ВКО_T0": "Таб. номер ВКО"}),
-        previous_best=best_previous.rename(columns={"ВКО_T1": "ВКО", "Таб. номер ВКО_T1": "Таб. номер ВКО"}),
-        key_columns=key_columns,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-        variant_name=variant_name,
-    )
-    merged = merged.merge(latest, on=key_columns, how="left")
-
-    log_debug(
-        logger,
-        f"{variant_name}: итоговый набор содержит {len(merged)} строк",
-        class_name="Aggregator",
-        func_name="assemble_variant_dataset",
-    )
-    return merged
+    """Формирует таблицу для конкретного варианта ключа (T-0 и T-1).
+    
+    Функция-обертка для Aggregator.assemble_variant_dataset_with_t2 без файла T-2: вместо
+    цепочки merge агрегаты объединяются одним concat по индексу ключей, а лучшие и актуальные
+    менеджеры присоединяются по целочисленным кодам ключей. Один Aggregator на вызов позволяет
+    переиспользовать кэш агрегатов между шагами.
+    
+    Args:
+        variant_name: Имя варианта для логирования
+        key_columns: Список колонок для ключа агрегации
+        current_df: DataFrame с данными T-0
+        previous_df: DataFrame с данными T-1
+        defaults: Настройки по умолчанию
+        identifiers: Настройки форматирования идентификаторов
+        logger: Логгер для записи сообщений
+        aggregator: Общий Aggregator расчета (None — создаётся новый); общий экземпляр
+            переиспользует кэш агрегатов и кодов ключей между вызовами по тем же файлам
+    
+    Returns:
+        DataFrame с колонками key_columns, Факт_T0, Факт_T1, Прирост, ВКО_T0, ВКО_T1,
+        ВКО_Актуальный, Таб. номер ВКО_Актуальный
+    """
+    if aggregator is None:
+        aggregator = Aggregator(defaults, identifiers, logger)
+    return aggregator.assemble_variant_dataset_with_t2(variant_name, key_columns, current_df, previous_df, None)
 
 
 def build_manager_summary(
@@ -2747,6 +4112,7 @@ def build_manager_summary(
     logger: Mapping[str, Any],
     summary_name: str,
     manager_columns: Mapping[str, str],
+    aggregator: Optional[Aggregator] = None,
 ) -> pd.DataFrame:
     """Создаёт свод по уникальным ТН+ВКО (+ТБ опционально).
     
@@ -2759,14 +4125,17 @@ def build_manager_summary(
         logger: Логгер для записи сообщений
         summary_name: Имя свода для логирования
         manager_columns: Словарь с именами колонок {"id": "...", "name": "..."}
+        aggregator: Общий Aggregator расчета (None — создаётся временный)
     
     Returns:
         DataFrame с колонками: Таб. номер ВКО (выбранный), ВКО (выбранный), ТБ (если include_tb),
         Факт_T0, Факт_T1, Прирост
     """
-    defaults = {"manager_name": "", "manager_id": ""}
-    identifiers = {"manager_id": {"total_length": 8, "fill_char": "0"}, "client_id": {"total_length": 12, "fill_char": "0"}}
-    aggregator = Aggregator(defaults, identifiers, logger)
+    if aggregator is None:
+        # Свод не зависит от defaults и identifiers, поэтому временному агрегатору хватает заглушек
+        defaults = {"manager_name": "", "manager_id": ""}
+        identifiers = {"manager_id": {"total_length": 8, "fill_char": "0"}, "client_id": {"total_length": 12, "fill_char": "0"}}
+        aggregator = Aggregator(defaults, identifiers, logger)
     return aggregator.build_manager_summary(variant_df, include_tb, summary_name, manager_columns)
 
 
@@ -2815,6 +4184,29 @@ def format_decimal_string(value: float, decimals: int = 5) -> str:
     return f"{numeric_value:.{decimals}f}"
 
 
+def format_decimal_series(series: pd.Series, decimals: int = 5) -> pd.Series:
+    """Векторный вариант format_decimal_string для целой колонки.
+
+    Args:
+        series: Колонка с числовыми значениями
+        decimals: Количество знаков после запятой
+
+    Returns:
+        Series строк того же индекса, совпадающая с поэлементным вызовом format_decimal_string
+    """
+
+    if not pd.api.types.is_numeric_dtype(series.dtype):
+        return series.apply(format_decimal_string, decimals=decimals)
+
+    # Пропуски заменяем нулём на уровне массива, а форматирование выполняем одним
+    # проходом по списку float без pd.isna и float() на каждую строку.
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    values = np.where(np.isnan(values), 0.0, values)
+    pattern = f"%.{decimals}f"
+    formatted = np.array([pattern % value for value in values.tolist()], dtype=object)
+    return pd.Series(formatted, index=series.index, dtype=object)
+
+
 def build_spod_dataset(
     source_table: pd.DataFrame,
     *,
@@ -2829,6 +4221,7 @@ def build_spod_dataset(
     logger: Mapping[str, Any],
     dataset_name: str,
     percentile_value_column: Optional[str] = None,
+    filter_mask: Optional[np.ndarray] = None,
 ) -> pd.DataFrame:
     """Готовит данные для загрузки в СПОД.
     
@@ -2846,6 +4239,8 @@ def build_spod_dataset(
         dataset_name: Имя датасета для логирования
         percentile_value_column: Колонка для FACT_VALUE (если отличается от value_column).
                                  Если None, используется value_column.
+        filter_mask: Готовая булева маска fact_value_filter по value_column (NumPy).
+                     Если None, маска строится внутри функции.
     """
 
     if value_column not in source_table.columns:
@@ -2861,8 +4256,9 @@ def build_spod_dataset(
             f"Колонка '{fact_value_column}' для FACT_VALUE отсутствует в источнике '{dataset_name}'."
         )
 
-    mask = build_filter_mask(source_table[value_column], fact_value_filter)
-    filtered = source_table[mask].copy()
+    if filter_mask is None:
+        filter_mask = compile_filter(fact_value_filter)(source_table[value_column].to_numpy())
+    filtered = source_table.take(np.flatnonzero(filter_mask))
     filtered = filtered.sort_values(by=value_column, ascending=False)
 
     log_debug(
@@ -2879,19 +4275,17 @@ def build_spod_dataset(
     )["MANAGER_PERSON_NUMBER"].to_frame()
 
     manager_identifier = identifiers["manager_id"]
-    dataset["MANAGER_PERSON_NUMBER"] = dataset["MANAGER_PERSON_NUMBER"].apply(
-        lambda value: format_identifier(
-            value=value,
-            total_length=max(manager_identifier["total_length"], 20),
-            fill_char=manager_identifier["fill_char"],
-        )
+    dataset["MANAGER_PERSON_NUMBER"] = dataset["MANAGER_PERSON_NUMBER"].pipe(
+        format_identifier_series,
+        total_length=max(manager_identifier["total_length"], 20),
+        fill_char=manager_identifier["fill_char"],
     )
     dataset["CONTEST_CODE"] = contest_code
     dataset["TOURNAMENT_CODE"] = tournament_code
     dataset["CONTEST_DATE"] = parse_contest_date(contest_date)
     dataset["PLAN_VALUE"] = format_decimal_string(plan_value)
     # Используем fact_value_column для FACT_VALUE
-    dataset["FACT_VALUE"] = filtered[fact_value_column].apply(format_decimal_string)
+    dataset["FACT_VALUE"] = format_decimal_series(filtered[fact_value_column])
     dataset["priority_type"] = priority
 
     log_debug(
@@ -2951,70 +4345,83 @@ def build_spod_dataset_for_excel(
     Returns:
         DataFrame с дополнительными колонками для Excel
     """
-    result = spod_dataset.copy()
+    # Неглубокая копия: новые колонки добавляются к result, не затрагивая spod_dataset (он уходит в CSV)
+    result = spod_dataset.copy(deep=False)
     
     # Создаем маппинги из filtered_table по табельному номеру
     # Форматируем табельные номера в filtered_table для сопоставления с MANAGER_PERSON_NUMBER
     manager_identifier = identifiers.get("manager_id", {"total_length": 8, "fill_char": "0"})
-    
-    # Форматируем табельные номера в filtered_table так же, как в build_spod_dataset
-    filtered_table_mapped = filtered_table.copy()
-    filtered_table_mapped["MANAGER_PERSON_NUMBER_FORMATTED"] = filtered_table_mapped[SELECTED_MANAGER_ID_COL].apply(
-        lambda value: format_identifier(
-            value=value,
-            total_length=max(manager_identifier.get("total_length", 8), 20),
-            fill_char=manager_identifier.get("fill_char", "0"),
-        )
-    )
+    id_length = max(manager_identifier.get("total_length", 8), 20)
+    id_fill_char = manager_identifier.get("fill_char", "0")
+
+    def count_by_formatted_id(inn_count: pd.Series) -> pd.Series:
+        """Переводит количество ИНН на отформатированные табельные номера (как MANAGER_PERSON_NUMBER).
+
+        Номера форматируются одним векторным проходом и становятся индексом Series для Series.map;
+        при совпадении отформатированных номеров остаётся последнее значение.
+        """
+        formatted = format_identifier_series(inn_count.index.to_series(), id_length, id_fill_char)
+        counts = pd.Series(inn_count.to_numpy(), index=formatted.to_numpy())
+        return counts[~counts.index.duplicated(keep="last")]
+    
+    # Форматируем табельные номера в filtered_table так же, как в build_spod_dataset.
+    # Номера держим отдельным массивом: копия всей таблицы ради одной колонки не нужна.
+    filtered_ids = format_identifier_series(
+        filtered_table[SELECTED_MANAGER_ID_COL], total_length=id_length, fill_char=id_fill_char
+    ).to_numpy()
+
+    filtered_index = pd.Index(filtered_ids)
+    original_ids = filtered_table[SELECTED_MANAGER_ID_COL].to_numpy()
+
+    def filtered_lookup(column: str) -> pd.Series:
+        """Справочник значений колонки filtered_table по отформатированному табельному номеру."""
+        values = filtered_table[column].to_numpy()
+        if filtered_index.is_unique:
+            # Номера без повторов (обычный случай для свода по КМ): справочник строится прямо
+            # на массиве колонки, без отдельного прохода drop_duplicates
+            return pd.Series(values, index=filtered_index)
+        pairs = pd.DataFrame({"MANAGER_PERSON_NUMBER_FORMATTED": filtered_ids, column: values}).drop_duplicates()
+        return pairs.set_index("MANAGER_PERSON_NUMBER_FORMATTED")[column]
     
     # Создаем маппинги по отформатированному табельному номеру
-    manager_name_map = filtered_table_mapped[[
-        "MANAGER_PERSON_NUMBER_FORMATTED", SELECTED_MANAGER_NAME_COL
-    ]].drop_duplicates().set_index("MANAGER_PERSON_NUMBER_FORMATTED")[SELECTED_MANAGER_NAME_COL]
-    
-    fact_values_map = filtered_table_mapped[[
-        "MANAGER_PERSON_NUMBER_FORMATTED", value_column
-    ]].drop_duplicates().set_index("MANAGER_PERSON_NUMBER_FORMATTED")[value_column]
+    manager_name_map = filtered_lookup(SELECTED_MANAGER_NAME_COL)
+    fact_values_map = filtered_lookup(value_column)
     
     # Добавляем ФИО КМ
     result["ФИО КМ"] = result["MANAGER_PERSON_NUMBER"].map(manager_name_map).fillna("")
     
     # Добавляем ТБ и ГОСБ (используем исходные табельные номера из filtered_table)
-    # Создаем маппинг отформатированных номеров к исходным
-    formatted_to_original = filtered_table_mapped.set_index("MANAGER_PERSON_NUMBER_FORMATTED")[
-        SELECTED_MANAGER_ID_COL
-    ].to_dict()
+    # Создаем маппинг отформатированных номеров к исходным (при повторах остаётся последний)
+    formatted_to_original = pd.Series(original_ids, index=filtered_index)
+    if not filtered_index.is_unique:
+        formatted_to_original = formatted_to_original[~filtered_index.duplicated(keep="last")]
     
     # Получаем исходные табельные номера для маппинга ТБ и ГОСБ
-    result["_original_manager_id"] = result["MANAGER_PERSON_NUMBER"].map(formatted_to_original).fillna(
+    original_manager_id = result["MANAGER_PERSON_NUMBER"].map(formatted_to_original).fillna(
         result["MANAGER_PERSON_NUMBER"]
     )
-    result["ТБ"] = result["_original_manager_id"].map(manager_tb_mapping).fillna("")
-    result["ГОСБ"] = result["_original_manager_id"].map(manager_gosb_mapping).fillna("")
-    result = result.drop(columns=["_original_manager_id"])
+    # ТБ и ГОСБ сопоставляются по одним и тем же кодам табельных номеров
+    manager_codes = pd.factorize(original_manager_id)
+    result["ТБ"] = map_with_default(
+        original_manager_id, manager_tb_mapping, factorized=manager_codes, fill_na=True
+    )
+    result["ГОСБ"] = map_with_default(
+        original_manager_id, manager_gosb_mapping, factorized=manager_codes, fill_na=True
+    )
     
     # Добавляем Факт (число в числовом формате, будет отформатировано в Excel как #,##0.00)
     result["Факт"] = result["MANAGER_PERSON_NUMBER"].map(fact_values_map).fillna(0.0)
     
     # Добавляем количество ИНН
+    inn_count: Optional[pd.Series] = None
     if variant_df_for_client_summary is not None:
         # Для вариантов 2 и 3 (по ИНН) - подсчитываем количество уникальных ИНН для каждого менеджера
         if "Таб. номер ВКО_Актуальный" in variant_df_for_client_summary.columns:
-            inn_count = variant_df_for_client_summary.groupby("Таб. номер ВКО_Актуальный")["client_id"].nunique()
-            # Форматируем табельные номера для сопоставления
-            manager_identifier = identifiers.get("manager_id", {"total_length": 8, "fill_char": "0"})
-            inn_count_formatted = {}
-            for orig_id, count in inn_count.items():
-                formatted_id = format_identifier(orig_id, max(manager_identifier.get("total_length", 8), 20), 
-                                                 manager_identifier.get("fill_char", "0"))
-                inn_count_formatted[formatted_id] = count
-            result["Кол-во ИНН"] = result["MANAGER_PERSON_NUMBER"].map(inn_count_formatted).fillna(0).astype(int)
-        else:
-            result["Кол-во ИНН"] = 0
+            inn_count = nunique_by_codes(
+                variant_df_for_client_summary["Таб. номер ВКО_Актуальный"], variant_df_for_client_summary["client_id"]
+            )
     elif current_df is not None:
         # Для варианта 1 (по КМ) - считаем количество уникальных ИНН из исходных данных (T-0 и T-1)
-        manager_identifier = identifiers.get("manager_id", {"total_length": 8, "fill_char": "0"})
-        
         # Объединяем T-0 и T-1 для подсчета всех ИНН
         if previous_df is not None:
             combined_df = pd.concat([current_df[["manager_id", "client_id"]], 
@@ -3022,48 +4429,30 @@ def build_spod_dataset_for_excel(
         else:
             combined_df = current_df[["manager_id", "client_id"]]
         
-        inn_count = combined_df.groupby("manager_id")["client_id"].nunique()
-        inn_count_formatted = {}
-        for orig_id, count in inn_count.items():
-            formatted_id = format_identifier(orig_id, max(manager_identifier.get("total_length", 8), 20), 
-                                             manager_identifier.get("fill_char", "0"))
-            inn_count_formatted[formatted_id] = count
-        result["Кол-во ИНН"] = result["MANAGER_PERSON_NUMBER"].map(inn_count_formatted).fillna(0).astype(int)
+        inn_count = nunique_by_codes(combined_df["manager_id"], combined_df["client_id"])
+
+    if inn_count is not None:
+        # Сопоставление через Series.map по отформатированным номерам; количество помещается в int32
+        result["Кол-во ИНН"] = (
+            result["MANAGER_PERSON_NUMBER"].map(count_by_formatted_id(inn_count)).fillna(0).astype("int32")
+        )
     else:
-        result["Кол-во ИНН"] = 0
+        result["Кол-во ИНН"] = np.int32(0)
     
     # Для процентильного SPOD добавляем колонки с количеством (только для scenario_percentile)
     if source_type == "scenario_percentile":
         # Используем source_table (percentile_tn) для получения процентилей, так как filtered_table может не содержать все строки
-        # Но маппим по отфильтрованным табельным номерам из filtered_table_mapped
+        # Но маппим по отфильтрованным табельным номерам из filtered_table
         if "Обогнал_всего_кол" in source_table.columns:
-            # Форматируем табельные номера в source_table для сопоставления
-            source_table_mapped = source_table.copy()
-            source_table_mapped["MANAGER_PERSON_NUMBER_FORMATTED"] = source_table_mapped[SELECTED_MANAGER_ID_COL].apply(
-                lambda value: format_identifier(
-                    value=value,
-                    total_length=max(manager_identifier.get("total_length", 8), 20),
-                    fill_char=manager_identifier.get("fill_char", "0"),
-                )
-            )
+            # Форматируем табельные номера в source_table для сопоставления (без копии таблицы)
+            source_ids = format_identifier_series(
+                source_table[SELECTED_MANAGER_ID_COL], total_length=id_length, fill_char=id_fill_char
+            ).to_numpy()
             
-            # Создаем маппинги по отформатированному табельному номеру из source_table
-            percentile_count_map = source_table_mapped.set_index("MANAGER_PERSON_NUMBER_FORMATTED")[
-                ["Обогнал_всего_кол", "Обогнали_меня_всего_кол", "Равных_всего_кол", "Всего_КМ_всего"]
-            ]
-            
-            result["Обогнал_всего_кол"] = result["MANAGER_PERSON_NUMBER"].map(
-                percentile_count_map["Обогнал_всего_кол"]
-            ).fillna(0).astype(int)
-            result["Обогнали_меня_всего_кол"] = result["MANAGER_PERSON_NUMBER"].map(
-                percentile_count_map["Обогнали_меня_всего_кол"]
-            ).fillna(0).astype(int)
-            result["Равных_всего_кол"] = result["MANAGER_PERSON_NUMBER"].map(
-                percentile_count_map["Равных_всего_кол"]
-            ).fillna(0).astype(int)
-            result["Всего_КМ_всего"] = result["MANAGER_PERSON_NUMBER"].map(
-                percentile_count_map["Всего_КМ_всего"]
-            ).fillna(0).astype(int)
+            # Маппинги по отформатированному табельному номеру из source_table
+            for count_column in ("Обогнал_всего_кол", "Обогнали_меня_всего_кол", "Равных_всего_кол", "Всего_КМ_всего"):
+                count_map = pd.Series(source_table[count_column].to_numpy(), index=source_ids)
+                result[count_column] = result["MANAGER_PERSON_NUMBER"].map(count_map).fillna(0).astype(int)
     
     # Переупорядочиваем колонки: сначала стандартные SPOD, потом дополнительные
     base_cols = [
@@ -3092,19 +4481,63 @@ def build_spod_dataset_for_excel(
     return result
 
 
+def append_csv_frame(
+    frame: pd.DataFrame,
+    csv_path: Path,
+    *,
+    header: bool,
+    sep: str = ";",
+    encoding: str = "utf-8-sig",
+) -> int:
+    """Дописывает DataFrame в CSV через csv.writer, не собирая выгрузку целиком в памяти.
+
+    Формат совпадает с DataFrame.to_csv(index=False, quoting=csv.QUOTE_MINIMAL): пустые значения
+    выводятся пустой строкой. Первый кадр (header=True) создаёт файл и пишет заголовок, следующие
+    дописываются в конец и должны иметь те же колонки. BOM utf-8-sig пишется только в начало файла.
+
+    Args:
+        frame: DataFrame для выгрузки
+        csv_path: Путь к CSV-файлу
+        header: True — создать файл заново и записать заголовок
+        sep: Разделитель колонок
+        encoding: Кодировка файла
+
+    Returns:
+        Количество записанных строк (без заголовка)
+    """
+
+    # newline="" и os.linesep — те же настройки, что использует to_csv
+    with open(csv_path, "w" if header else "a", encoding=encoding, newline="") as handle:
+        writer = csv.writer(handle, delimiter=sep, quoting=csv.QUOTE_MINIMAL, lineterminator=os.linesep)
+        if header:
+            writer.writerow(frame.columns)
+        # Колонки переводятся в списки Python по одной, и только колонки с пропусками проходят через
+        # замену на "". Так не создаётся объектная копия всего DataFrame и не работает itertuples.
+        # Строки обрабатываются блоками по CSV_BLOCK_ROWS: в памяти находятся значения только одного блока.
+        for start in range(0, len(frame), CSV_BLOCK_ROWS):
+            block = frame.iloc[start:start + CSV_BLOCK_ROWS]
+            columns = []
+            for column in block.columns:
+                series = block[column]
+                if series.hasnans:
+                    series = series.astype(object).where(series.notna(), "")
+                columns.append(series.tolist())
+            writer.writerows(zip(*columns))
+    return len(frame)
+
+
 def rename_output_columns(
     df: pd.DataFrame, alias_to_source: Mapping[str, str]
 ) -> pd.DataFrame:
     """Возвращает DataFrame с русскими заголовками для ключей."""
 
-    renamed = df.copy()
     # Переименовываем лишь ключевые идентификаторы; остальные остаются в машинном виде.
+    # rename сам возвращает новый DataFrame, поэтому предварительная копия не нужна.
     mapping = {
         alias: alias_to_source.get(alias, alias)
         for alias in ("client_id", "tb", "manager_id")
     }
-    renamed = renamed.rename(columns=mapping)
-    return renamed
+    return df.rename(columns=mapping)
 
 
 def format_raw_sheet(
@@ -3113,23 +4546,25 @@ def format_raw_sheet(
 ) -> pd.DataFrame:
     """Возвращает DataFrame для исходного листа с читаемыми колонками и типами."""
 
-    printable = df.copy()
-
     # Переименовываем только те столбцы, которые известны пользователю.
+    # Копия данных не нужна: rename без копирования делит столбцы с исходным
+    # DataFrame, а заменённый ниже столбец факта создаётся заново.
     rename_mapping = {
         alias: alias_to_source.get(alias, alias)
         for alias in df.columns
         if alias in alias_to_source
     }
-    printable = printable.rename(columns=rename_mapping)
+    printable = df.rename(columns=rename_mapping, copy=False)
 
     # Числовой факт выводим отдельным столбцом с гарантированным float.
     if "fact_value_clean" in printable.columns:
         printable = printable.rename(
-            columns={"fact_value_clean": "Факт (число)"}
+            columns={"fact_value_clean": "Факт (число)"}, copy=False
         )
-        printable["Факт (число)"] = printable["Факт (число)"].apply(
-            lambda value: 0.0 if value is None or pd.isna(value) else float(value)
+        printable["Факт (число)"] = (
+            pd.to_numeric(printable["Факт (число)"], errors="coerce")
+            .astype("float64")
+            .fillna(0.0)
         )
 
     return printable
@@ -3258,6 +4693,7 @@ def calculate_variant_1(
     defaults: Mapping[str, Any],
     identifiers: Mapping[str, Any],
     logger: Mapping[str, Any],
+    aggregator: Optional[Aggregator] = None,
 ) -> pd.DataFrame:
     """Вариант 1: По КМ (manager_id), без учета ТБ.
     
@@ -3270,11 +4706,12 @@ def calculate_variant_1(
         defaults: Настройки по умолчанию
         identifiers: Настройки форматирования идентификаторов
         logger: Логгер для записи сообщений
+        aggregator: Общий Aggregator расчета (None — создаётся новый)
     
     Returns:
         DataFrame с результатами варианта 1
     """
-    calculator = Variant1Calculator(defaults, identifiers, logger)
+    calculator = Variant1Calculator(defaults, identifiers, logger, aggregator=aggregator)
     return calculator.calculate(current_df, previous_df, previous2_df)
 
 
@@ -3285,6 +4722,7 @@ def calculate_variant_2(
     defaults: Mapping[str, Any],
     identifiers: Mapping[str, Any],
     logger: Mapping[str, Any],
+    aggregator: Optional[Aggregator] = None,
 ) -> pd.DataFrame:
     """Вариант 2: По ИНН (client_id), КМ определяется на конец без учета ТБ.
     
@@ -3297,11 +4735,12 @@ def calculate_variant_2(
         defaults: Настройки по умолчанию
         identifiers: Настройки форматирования идентификаторов
         logger: Логгер для записи сообщений
+        aggregator: Общий Aggregator расчета (None — создаётся новый)
     
     Returns:
         DataFrame с результатами варианта 2
     """
-    calculator = Variant2Calculator(defaults, identifiers, logger)
+    calculator = Variant2Calculator(defaults, identifiers, logger, aggregator=aggregator)
     return calculator.calculate(current_df, previous_df, previous2_df)
 
 
@@ -3613,6 +5052,7 @@ def calculate_variant_3(
     defaults: Mapping[str, Any],
     identifiers: Mapping[str, Any],
     logger: Mapping[str, Any],
+    aggregator: Optional[Aggregator] = None,
 ) -> pd.DataFrame:
     """Вариант 3: По ИНН (client_id), КМ определяется на конец с учетом ТБ.
     
@@ -3625,14 +5065,26 @@ def calculate_variant_3(
         defaults: Настройки по умолчанию
         identifiers: Настройки форматирования идентификаторов
         logger: Логгер для записи сообщений
+        aggregator: Общий Aggregator расчета (None — создаётся новый)
     
     Returns:
         DataFrame с результатами варианта 3
     """
-    calculator = Variant3Calculator(defaults, identifiers, logger)
+    calculator = Variant3Calculator(defaults, identifiers, logger, aggregator=aggregator)
     return calculator.calculate(current_df, previous_df, previous2_df)
 
 
+# Основной расчет режимов two/three/new по (key_mode, include_tb):
+# (имя набора по ИНН, ключ набора по ИНН, функция расчета свода, колонка ТБ в своде).
+# Для key_mode="manager" набор по ИНН не строится, include_tb не влияет на расчет.
+MAIN_CALCULATION_DISPATCH = MappingProxyType({
+    ("manager", False): (None, None, calculate_variant_1, None),
+    ("manager", True): (None, None, calculate_variant_1, None),
+    ("client", False): ("ИНН_безТБ", ("client_id",), calculate_variant_2, None),
+    ("client", True): ("ИНН_сТБ", ("client_id", "tb"), calculate_variant_3, "ТБ"),
+})
+
+
 def build_variant_matrix(
     current_df: pd.DataFrame,
     previous_df: pd.DataFrame,
@@ -3653,176 +5105,52 @@ def build_variant_matrix(
     8: ИНН, с ТБ, последний КМ
     """
     
-    results: Dict[int, pd.DataFrame] = {}
-    
-    # Варианты 5-8: ИНН (client_id) - используем существующие функции
-    log_info(logger, "Строю варианты 5-8: ИНН")
-    
-    # Вариант 5: ИНН, без ТБ, КМ по каждому файлу
-    log_info(logger, "Строю вариант 5: ИНН, без ТБ, КМ по каждому файлу")
-    variant_5_df = assemble_variant_dataset(
-        variant_name="V5_ИНН_безТБ_КМ_пофайлу",
-        key_columns=["client_id"],
-        current_df=current_df,
-        previous_df=previous_df,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-    )
-    # Агрегируем по КМ из T0 (доминантный в каждом файле)
-    summary_5 = build_manager_summary(
-        variant_df=variant_5_df,
-        include_tb=False,
-        logger=logger,
-        summary_name="V5_SUMMARY",
-        manager_columns={"id": "Таб. номер ВКО_T0", "name": "ВКО_T0"},
-    )
-    results[5] = summary_5
-    
-    # Вариант 6: ИНН, с ТБ, КМ по каждому файлу
-    log_info(logger, "Строю вариант 6: ИНН, с ТБ, КМ по каждому файлу")
-    variant_6_df = assemble_variant_dataset(
-        variant_name="V6_ИНН_сТБ_КМ_пофайлу",
-        key_columns=["client_id", "tb"],
-        current_df=current_df,
-        previous_df=previous_df,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-    )
-    summary_6 = build_manager_summary(
-        variant_df=variant_6_df,
-        include_tb=True,
-        logger=logger,
-        summary_name="V6_SUMMARY",
-        manager_columns={"id": "Таб. номер ВКО_T0", "name": "ВКО_T0"},
-    )
-    results[6] = summary_6
-    
-    # Вариант 7: ИНН, без ТБ, последний КМ
-    log_info(logger, "Строю вариант 7: ИНН, без ТБ, последний КМ")
-    variant_7_df = assemble_variant_dataset(
-        variant_name="V7_ИНН_безТБ_КМ_последний",
-        key_columns=["client_id"],
-        current_df=current_df,
-        previous_df=previous_df,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-    )
-    summary_7 = build_manager_summary(
-        variant_df=variant_7_df,
-        include_tb=False,
-        logger=logger,
-        summary_name="V7_SUMMARY",
-        manager_columns={"id": "Таб. номер ВКО_Актуальный", "name": "ВКО_Актуальный"},
-    )
-    results[7] = summary_7
-    
-    # Вариант 8: ИНН, с ТБ, последний КМ
-    log_info(logger, "Строю вариант 8: ИНН, с ТБ, последний КМ")
-    variant_8_df = assemble_variant_dataset(
-        variant_name="V8_ИНН_сТБ_КМ_последний",
-        key_columns=["client_id", "tb"],
-        current_df=current_df,
-        previous_df=previous_df,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-    )
-    summary_8 = build_manager_summary(
-        variant_df=variant_8_df,
-        include_tb=True,
-        logger=logger,
-        summary_name="V8_SUMMARY",
-        manager_columns={"id": "Таб. номер ВКО_Актуальный", "name": "ВКО_Актуальный"},
-    )
-    results[8] = summary_8
-    
-    # Варианты 1-4: ВКО (gosb) - аналогичная логика, но с gosb как ключом
-    log_info(logger, "Строю варианты 1-4: ВКО")
-    
-    # Вариант 1: ВКО, без ТБ, КМ по каждому файлу
-    log_info(logger, "Строю вариант 1: ВКО, без ТБ, КМ по каждому файлу")
-    variant_1_df = assemble_variant_dataset(
-        variant_name="V1_ВКО_безТБ_КМ_пофайлу",
-        key_columns=["gosb"],
-        current_df=current_df,
-        previous_df=previous_df,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-    )
-    summary_1 = build_manager_summary(
-        variant_df=variant_1_df,
-        include_tb=False,
-        logger=logger,
-        summary_name="V1_SUMMARY",
-        manager_columns={"id": "Таб. номер ВКО_T0", "name": "ВКО_T0"},
-    )
-    results[1] = summary_1
-    
-    # Вариант 2: ВКО, с ТБ, КМ по каждому файлу
-    log_info(logger, "Строю вариант 2: ВКО, с ТБ, КМ по каждому файлу")
-    variant_2_df = assemble_variant_dataset(
-        variant_name="V2_ВКО_сТБ_КМ_пофайлу",
-        key_columns=["gosb", "tb"],
-        current_df=current_df,
-        previous_df=previous_df,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-    )
-    summary_2 = build_manager_summary(
-        variant_df=variant_2_df,
-        include_tb=True,
-        logger=logger,
-        summary_name="V2_SUMMARY",
-        manager_columns={"id": "Таб. номер ВКО_T0", "name": "ВКО_T0"},
-    )
-    results[2] = summary_2
-    
-    # Вариант 3: ВКО, без ТБ, последний КМ
-    log_info(logger, "Строю вариант 3: ВКО, без ТБ, последний КМ")
-    variant_3_df = assemble_variant_dataset(
-        variant_name="V3_ВКО_безТБ_КМ_последний",
-        key_columns=["gosb"],
-        current_df=current_df,
-        previous_df=previous_df,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-    )
-    summary_3 = build_manager_summary(
-        variant_df=variant_3_df,
-        include_tb=False,
-        logger=logger,
-        summary_name="V3_SUMMARY",
-        manager_columns={"id": "Таб. номер ВКО_Актуальный", "name": "ВКО_Актуальный"},
-    )
-    results[3] = summary_3
-    
-    # Вариант 4: ВКО, с ТБ, последний КМ
-    log_info(logger, "Строю вариант 4: ВКО, с ТБ, последний КМ")
-    variant_4_df = assemble_variant_dataset(
-        variant_name="V4_ВКО_сТБ_КМ_последний",
-        key_columns=["gosb", "tb"],
-        current_df=current_df,
-        previous_df=previous_df,
-        defaults=defaults,
-        identifiers=identifiers,
-        logger=logger,
-    )
-    summary_4 = build_manager_summary(
-        variant_df=variant_4_df,
-        include_tb=True,
-        logger=logger,
-        summary_name="V4_SUMMARY",
-        manager_columns={"id": "Таб. номер ВКО_Актуальный", "name": "ВКО_Актуальный"},
-    )
-    results[4] = summary_4
-    
-    return results
+    per_file_manager = {"id": "Таб. номер ВКО_T0", "name": "ВКО_T0"}
+    latest_manager = {"id": "Таб. номер ВКО_Актуальный", "name": "ВКО_Актуальный"}
+    # (номер, описание, имя варианта, ключ, с ТБ, колонки менеджера) в порядке расчета: сначала ИНН, затем ВКО
+    variant_specs = [
+        (5, "ИНН, без ТБ, КМ по каждому файлу", "V5_ИНН_безТБ_КМ_пофайлу", ["client_id"], False, per_file_manager),
+        (6, "ИНН, с ТБ, КМ по каждому файлу", "V6_ИНН_сТБ_КМ_пофайлу", ["client_id", "tb"], True, per_file_manager),
+        (7, "ИНН, без ТБ, последний КМ", "V7_ИНН_безТБ_КМ_последний", ["client_id"], False, latest_manager),
+        (8, "ИНН, с ТБ, последний КМ", "V8_ИНН_сТБ_КМ_последний", ["client_id", "tb"], True, latest_manager),
+        (1, "ВКО, без ТБ, КМ по каждому файлу", "V1_ВКО_безТБ_КМ_пофайлу", ["gosb"], False, per_file_manager),
+        (2, "ВКО, с ТБ, КМ по каждому файлу", "V2_ВКО_сТБ_КМ_пофайлу", ["gosb", "tb"], True, per_file_manager),
+        (3, "ВКО, без ТБ, последний КМ", "V3_ВКО_безТБ_КМ_последний", ["gosb"], False, latest_manager),
+        (4, "ВКО, с ТБ, последний КМ", "V4_ВКО_сТБ_КМ_последний", ["gosb", "tb"], True, latest_manager),
+    ]
+
+    # Один агрегатор на матрицу: агрегаты T-0/T-1 и коды client_id/gosb/tb из его кэша
+    # общие для ключей с ТБ и без ТБ
+    aggregator = Aggregator(defaults, identifiers, logger)
+
+    def assemble(variant_name: str, key_columns: List[str]) -> pd.DataFrame:
+        """Собирает набор данных варианта по ключу key_columns."""
+        return assemble_variant_dataset(
+            variant_name=variant_name,
+            key_columns=key_columns,
+            current_df=current_df,
+            previous_df=previous_df,
+            defaults=defaults,
+            identifiers=identifiers,
+            logger=logger,
+            aggregator=aggregator,
+        )
+
+    def summarize(spec: Tuple[Any, ...]) -> pd.DataFrame:
+        """Собирает набор данных варианта и строит по нему свод по КМ."""
+        number, description, variant_name, key_columns, include_tb, manager_columns = spec
+        log_info(logger, f"Строю вариант {number}: {description}")
+        return build_manager_summary(
+            variant_df=assemble(variant_name, key_columns),
+            include_tb=include_tb,
+            logger=logger,
+            summary_name=f"V{number}_SUMMARY",
+            manager_columns=manager_columns,
+            aggregator=aggregator,
+        )
+
+    log_info(logger, "Строю варианты 5-8: ИНН и варианты 1-4: ВКО")
+    return {spec[0]: summarize(spec) for spec in variant_specs}
 
 
 # ----------------------------- Основной сценарий ----------------------------
@@ -3856,22 +5184,24 @@ def process_project(project_root: Path) -> None:
     min_width = column_width_config.get("min_width", 20)
     max_width = column_width_config.get("max_width", 200)
     wrap_text = excel_formatting.get("wrap_text", True)
+    zip_compress_level = excel_formatting.get("zip_compress_level")
 
-    def build_whitelist(key: str) -> Optional[Set[str]]:
-        """Возвращает множество разрешённых листов для указанного блока."""
+    def build_whitelist(key: str) -> Optional[FrozenSet[str]]:
+        """Возвращает неизменяемое множество разрешённых листов для указанного блока."""
 
         values = report_layout.get(key)
         if values is None:
             return None
-        return set(values)
+        return frozenset(values)
 
     detail_sheet_whitelist = build_whitelist("detail_sheets")
     summary_sheet_whitelist = build_whitelist("summary_sheets")
     spod_variant_whitelist = build_whitelist("spod_variants")
     raw_sheet_whitelist = build_whitelist("raw_sheets")
+    raw_format = report_layout.get("raw_format", "xlsx")
 
     # Готовим быстрый индекс по ключам файлов (current / previous / previous2).
-    file_index = {item["key"]: item for item in file_section["items"]}
+    file_index = get_file_index(file_section)
     current_meta = file_index["current"]
     previous_meta = file_index["previous"]
     previous2_meta = file_index.get("previous2")
@@ -3880,12 +5210,6 @@ def process_project(project_root: Path) -> None:
     main_calc_config = settings.get("main_calculation", {})
     use_files_count = main_calc_config.get("use_files_count", "two")
     
-    if use_files_count not in ["one", "two", "three", "new"]:
-        error_msg = f"Некорректное значение use_files_count: {use_files_count}. Допустимые значения: 'one', 'two', 'three' или 'new'"
-        print(f"ОШИБКА: {error_msg}")
-        log_info(logger, error_msg)
-        return
-    
     # Определяем необходимость использования T-2 на основе параметра
     use_t2 = (use_files_count == "three")
 
@@ -3897,54 +5221,78 @@ def process_project(project_root: Path) -> None:
     logger = build_logger(log_dir, spod_config["log_topic"])
     log_info(logger, "Старт обработки проекта YEAR_SPOD_Active_Rost_Ost")
 
-    def should_write(entity_name: str, whitelist: Optional[Set[str]], block_name: str) -> bool:
+    # Настройки проверяются после создания логгера: сообщение об ошибке попадает и в консоль, и в лог
+    if use_files_count not in ["one", "two", "three", "new"]:
+        error_msg = f"Некорректное значение use_files_count: {use_files_count}. Допустимые значения: 'one', 'two', 'three' или 'new'"
+        print(f"ОШИБКА: {error_msg}")
+        log_info(logger, error_msg)
+        close_logger(logger)
+        return
+    if raw_format not in ("xlsx", "csv"):
+        error_msg = f"Некорректное значение raw_format: {raw_format}. Допустимые значения: 'xlsx' или 'csv'"
+        print(f"ОШИБКА: {error_msg}")
+        log_info(logger, error_msg)
+        close_logger(logger)
+        return
+
+    # Решения should_write по паре (блок, элемент): варианты SPOD проверяются и при расчёте, и при записи,
+    # а сообщение о пропуске нужно в логе один раз
+    write_decisions: Dict[Tuple[str, str], bool] = {}
+
+    def should_write(entity_name: str, whitelist: Optional[FrozenSet[str]], block_name: str) -> bool:
         """Проверяет необходимость выгрузки листа согласно report_layout."""
 
         if whitelist is None:
             return True
-        if entity_name in whitelist:
-            return True
-        log_debug(
-            logger,
-            f"Элемент '{entity_name}' пропущен (report_layout ограничил блок '{block_name}')",
-            class_name="Exporter",
-            func_name="process_project",
-        )
-        return False
+        decision_key = (block_name, entity_name)
+        decision = write_decisions.get(decision_key)
+        if decision is None:
+            decision = entity_name in whitelist
+            write_decisions[decision_key] = decision
+            if not decision:
+                log_debug(
+                    logger,
+                    f"Элемент '{entity_name}' пропущен (report_layout ограничил блок '{block_name}')",
+                    class_name="Exporter",
+                    func_name="process_project",
+                )
+        return decision
 
+    # Незавершённая CSV-выгрузка SPOD: удаляется, если обработка прервалась до её переименования
+    csv_part_path: Optional[Path] = None
+    # Один агрегатор на расчет проекта: калькуляторы вариантов делят его кэш агрегатов и кодов ключей
+    aggregator = Aggregator(defaults, identifiers, logger)
     try:
         # Получаем колонки и фильтры для каждого файла (только для режимов "one", "two", "three")
         if use_files_count != "new":
-            current_columns = get_file_columns(file_section, "current", defaults)
-            current_filters = get_file_filters(file_section, "current", defaults)
-            current_drop_rules = build_drop_rules(current_filters.get("drop_rules", []))
-            current_column_profiles = build_column_profiles(current_columns)
-            current_rename_map = current_column_profiles["rename_map"]
-            current_alias_to_source = current_column_profiles["alias_to_source"]
+            current_settings = resolve_file_settings(file_section, "current", defaults)
+            current_columns = current_settings.columns
+            current_filters = current_settings.filters
+            current_drop_rules = current_settings.drop_rules
+            current_rename_map = current_settings.rename_map
+            current_alias_to_source = current_settings.alias_to_source
             
-            previous_columns = get_file_columns(file_section, "previous", defaults)
-            previous_filters = get_file_filters(file_section, "previous", defaults)
-            previous_drop_rules = build_drop_rules(previous_filters.get("drop_rules", []))
-            previous_column_profiles = build_column_profiles(previous_columns)
-            previous_rename_map = previous_column_profiles["rename_map"]
-            previous_alias_to_source = previous_column_profiles["alias_to_source"]
+            previous_settings = resolve_file_settings(file_section, "previous", defaults)
+            previous_columns = previous_settings.columns
+            previous_filters = previous_settings.filters
+            previous_drop_rules = previous_settings.drop_rules
+            previous_rename_map = previous_settings.rename_map
+            previous_alias_to_source = previous_settings.alias_to_source
             
-            current_file = input_dir / current_meta["file_name"]
-            previous_file = input_dir / previous_meta["file_name"]
-            sheet_current = resolve_sheet_name(file_section, "current")
-            sheet_previous = resolve_sheet_name(file_section, "previous")
+            current_file = input_dir / current_settings.file_name
+            previous_file = input_dir / previous_settings.file_name
+            sheet_current = current_settings.sheet
+            sheet_previous = previous_settings.sheet
         else:
             # Для режима "new" эти переменные не используются
             current_columns = []
             current_filters = {}
             current_drop_rules = []
-            current_column_profiles = {}
             current_rename_map = {}
             current_alias_to_source = {}
             previous_columns = []
             previous_filters = {}
             previous_drop_rules = []
-            previous_column_profiles = {}
             previous_rename_map = {}
             previous_alias_to_source = {}
             current_file = None
@@ -3993,8 +5341,9 @@ def process_project(project_root: Path) -> None:
             log_info(logger, error_msg)
             return
 
-        # Инициализируем загрузчик данных
-        data_loader = DataLoader(identifiers, logger)
+        # Инициализируем загрузчик данных (с кэшем прочитанных листов в IN/.cache, если он включён)
+        source_cache_dir = input_dir / SOURCE_CACHE_DIR_NAME if defaults.get("source_cache", False) else None
+        data_loader = DataLoader(identifiers, logger, cache_dir=source_cache_dir)
         
         # Получаем параметры основного расчета и процентиля (use_files_count уже получен выше)
         percentile_calc_config = settings.get("percentile_calculation", {})
@@ -4021,11 +5370,11 @@ def process_project(project_root: Path) -> None:
                 log_info(logger, error_msg)
                 return
             
-            single_file_columns = get_file_columns(file_section, "single", defaults, use_defaults=False)
-            single_file_filters = get_file_filters(file_section, "single", defaults, use_defaults=False)
-            single_file_sheet = resolve_sheet_name(file_section, "single")
-            single_file_drop_rules = build_drop_rules(single_file_filters.get("drop_rules", []))
-            single_file_in_rules = single_file_filters.get("in_rules", [])
+            single_file_settings = resolve_file_settings(file_section, "single", defaults, use_defaults=False)
+            single_file_columns = single_file_settings.columns
+            single_file_sheet = single_file_settings.sheet
+            single_file_drop_rules = single_file_settings.drop_rules
+            single_file_in_rules = single_file_settings.in_rules
             
             single_file_path = input_dir / single_file_name
             
@@ -4064,9 +5413,6 @@ def process_project(project_root: Path) -> None:
             
         elif use_files_count == "new":
             # Загружаем 24 файла (12 для 2025 и 12 для 2024)
-            files_2025 = []
-            files_2024 = []
-            
             # Получаем параметры для нового варианта
             new_files_config = main_calc_config.get("new_files", {})
             key_mode = new_files_config.get("key_mode", "client")
@@ -4074,65 +5420,17 @@ def process_project(project_root: Path) -> None:
             
             log_info(logger, f"Загрузка файлов для нового варианта расчета: key_mode={key_mode}, include_tb={include_tb}")
             
-            # Загружаем файлы 2025 года (от января к декабрю: M-01, M-02, ..., M-12)
-            for i in range(12):
-                month_num = i + 1
-                file_key = f"2025_M-{month_num:02d}"
-                try:
-                    file_meta = get_file_meta(file_section, file_key)
-                    file_name = file_meta.get("file_name", "").strip()
-                    if file_name:
-                        file_path = input_dir / file_name
-                        if file_path.exists():
-                            file_columns = get_file_columns(file_section, file_key, defaults)
-                            file_filters = get_file_filters(file_section, file_key, defaults)
-                            file_drop_rules = build_drop_rules(file_filters.get("drop_rules", []))
-                            file_sheet = resolve_sheet_name(file_section, file_key)
-                            
-                            df = data_loader.read_source_file(
-                                file_path,
-                                file_sheet,
-                                file_columns,
-                                file_drop_rules,
-                            )
-                            files_2025.append(df)
-                            log_info(logger, f"Загружен файл 2025_M-{month_num:02d}: {file_name}")
-                        else:
-                            log_info(logger, f"Файл 2025_M-{month_num:02d} не найден: {file_name}, пропускаем")
-                    else:
-                        log_info(logger, f"Имя файла для 2025_M-{month_num:02d} не указано, пропускаем")
-                except KeyError:
-                    log_info(logger, f"Конфигурация для 2025_M-{month_num:02d} не найдена, пропускаем")
-            
-            # Загружаем файлы 2024 года (от января к декабрю: M-01, M-02, ..., M-12)
-            for i in range(12):
-                month_num = i + 1
-                file_key = f"2024_M-{month_num:02d}"
-                try:
-                    file_meta = get_file_meta(file_section, file_key)
-                    file_name = file_meta.get("file_name", "").strip()
-                    if file_name:
-                        file_path = input_dir / file_name
-                        if file_path.exists():
-                            file_columns = get_file_columns(file_section, file_key, defaults)
-                            file_filters = get_file_filters(file_section, file_key, defaults)
-                            file_drop_rules = build_drop_rules(file_filters.get("drop_rules", []))
-                            file_sheet = resolve_sheet_name(file_section, file_key)
-                            
-                            df = data_loader.read_source_file(
-                                file_path,
-                                file_sheet,
-                                file_columns,
-                                file_drop_rules,
-                            )
-                            files_2024.append(df)
-                            log_info(logger, f"Загружен файл 2024_M-{month_num:02d}: {file_name}")
-                        else:
-                            log_info(logger, f"Файл 2024_M-{month_num:02d} не найден: {file_name}, пропускаем")
-                    else:
-                        log_info(logger, f"Имя файла для 2024_M-{month_num:02d} не указано, пропускаем")
-                except KeyError:
-                    log_info(logger, f"Конфигурация для 2024_M-{month_num:02d} не найдена, пропускаем")
+            # Загружаем файлы 2025 и 2024 годов (внутри года — от января к декабрю: M-01, M-02, ..., M-12)
+            monthly_files = load_monthly_files(
+                file_section,
+                defaults,
+                input_dir,
+                data_loader,
+                logger,
+                years=(2025, 2024),
+            )
+            files_2025 = monthly_files[2025]
+            files_2024 = monthly_files[2024]
             
             log_info(logger, f"Загружено файлов 2025: {len(files_2025)}, файлов 2024: {len(files_2024)}")
             
@@ -4159,33 +5457,29 @@ def process_project(project_root: Path) -> None:
             previous_df = pd.DataFrame()  # Пустой для маппинга
             
         else:
-            # Загружаем файлы T-0 и T-1
-            current_df = data_loader.read_source_file(
-                current_file,
-                sheet_current,
-                current_columns,
-                current_drop_rules,
-            )
-            previous_df = data_loader.read_source_file(
-                previous_file,
-                sheet_previous,
-                previous_columns,
-                previous_drop_rules,
-            )
-            
-            # Загружаем T-2, если требуется
+            # Загружаем файлы T-0 и T-1 (и T-2, если требуется) одним вызовом: чтения независимы,
+            # и крупные файлы разбираются параллельно в отдельных процессах
             previous2_df = None
+            specs = [
+                (current_file, sheet_current, current_columns, current_drop_rules),
+                (previous_file, sheet_previous, previous_columns, previous_drop_rules),
+            ]
             if use_t2:
-                previous2_file = input_dir / previous2_meta["file_name"]
-                previous2_columns = get_file_columns(file_section, "previous2", defaults)
-                previous2_filters = get_file_filters(file_section, "previous2", defaults)
-                previous2_drop_rules = build_drop_rules(previous2_filters.get("drop_rules", []))
-                previous2_df = data_loader.read_source_file(
-                    previous2_file,
-                    resolve_sheet_name(file_section, "previous2"),
-                    previous2_columns,
-                    previous2_drop_rules,
+                previous2_settings = resolve_file_settings(file_section, "previous2", defaults)
+                previous2_file = input_dir / previous2_settings.file_name
+                previous2_alias_to_source = previous2_settings.alias_to_source
+                specs.append(
+                    (
+                        previous2_file,
+                        previous2_settings.sheet,
+                        previous2_settings.columns,
+                        previous2_settings.drop_rules,
+                    )
                 )
+            loaded = data_loader.read_many(specs)
+            current_df, previous_df = loaded[0], loaded[1]
+            if use_t2:
+                previous2_df = loaded[2]
                 log_info(logger, f"Загружен файл T-2: {previous2_meta['file_name']}")
             
             # Получаем параметры основного расчета в зависимости от количества файлов
@@ -4209,74 +5503,70 @@ def process_project(project_root: Path) -> None:
             # Рассчитываем основной свод в зависимости от параметров
             variant_df_for_client_summary = None
             
-            if key_mode == "manager":
-                # Расчет по КМ (manager_id), без учета ТБ
-                selected_summary = calculate_variant_1(
-                    current_df, previous_df, previous2_df if use_t2 else None,
-                    defaults, identifiers, logger
+            # manager — по КМ (manager_id), без учета ТБ; client — по ИНН (client_id), с ТБ или без
+            try:
+                client_dataset_name, client_key_columns, calculate_summary, tb_column = MAIN_CALCULATION_DISPATCH[
+                    (key_mode, bool(include_tb))
+                ]
+            except KeyError:
+                raise ValueError(
+                    f"Неизвестный key_mode: {key_mode}. Допустимые значения: 'manager' или 'client'"
+                ) from None
+            if client_key_columns is not None:
+                # Набор по ИНН и свод варианта строятся общим агрегатором:
+                # расчет свода берёт уже собранный набор по тем же файлам и ключу из его кэша
+                variant_df_for_client_summary = aggregator.assemble_variant_dataset_with_t2(
+                    variant_name=client_dataset_name,
+                    key_columns=list(client_key_columns),
+                    current_df=current_df,
+                    previous_df=previous_df,
+                    previous2_df=previous2_df if use_t2 else None,
                 )
-                tb_column = None
-            elif key_mode == "client":
-                if include_tb:
-                    # Расчет по ИНН (client_id), с учетом ТБ
-                    aggregator = Aggregator(defaults, identifiers, logger)
-                    variant_df_for_client_summary = aggregator.assemble_variant_dataset_with_t2(
-                        variant_name="ИНН_сТБ",
-                        key_columns=["client_id", "tb"],
-                        current_df=current_df,
-                        previous_df=previous_df,
-                        previous2_df=previous2_df if use_t2 else None,
-                    )
-                    selected_summary = calculate_variant_3(
-                        current_df, previous_df, previous2_df if use_t2 else None,
-                        defaults, identifiers, logger
-                    )
-                    tb_column = "ТБ"
-                else:
-                    # Расчет по ИНН (client_id), без учета ТБ
-                    aggregator = Aggregator(defaults, identifiers, logger)
-                    variant_df_for_client_summary = aggregator.assemble_variant_dataset_with_t2(
-                        variant_name="ИНН_безТБ",
-                        key_columns=["client_id"],
-                        current_df=current_df,
-                        previous_df=previous_df,
-                        previous2_df=previous2_df if use_t2 else None,
-                    )
-                    selected_summary = calculate_variant_2(
-                        current_df, previous_df, previous2_df if use_t2 else None,
-                        defaults, identifiers, logger
-                    )
-                    tb_column = None
-            else:
-                raise ValueError(f"Неизвестный key_mode: {key_mode}. Допустимые значения: 'manager' или 'client'")
+            selected_summary = calculate_summary(
+                current_df, previous_df, previous2_df if use_t2 else None,
+                defaults, identifiers, logger, aggregator=aggregator,
+            )
             
             value_column = "Прирост"
         
+        # При необходимости сужаем числовые колонки свода перед процентилями и SPOD
+        if defaults.get("use_float32", False):
+            selected_summary = downcast_numeric_columns(selected_summary)
+            log_debug(
+                logger,
+                "Числовые колонки свода приведены к float32/int32",
+                class_name="ProjectProcessor",
+                func_name="process_project",
+            )
+        
         # Объединяем SUMMARY_TN и PERCENTILE_TN в один лист
-        # Сначала данные по расчету приростов, затем процентили
-        summary_tn_combined = selected_summary.copy()
+        # Сначала данные по расчету приростов, затем процентили.
+        # Данные не копируются: новые колонки добавляются в поверхностную копию, а selected_summary дальше не используется
+        summary_tn_combined = selected_summary.copy(deep=False)
         
         # Добавляем ТБ и ГОСБ для каждого табельного номера (нужно для расчета процентилей)
         if use_files_count == "one":
             # Для одного файла используем только current_df
-            manager_tb_mapping = build_manager_tb_mapping(current_df, pd.DataFrame())
-            manager_gosb_mapping = build_manager_gosb_mapping(current_df, pd.DataFrame())
+            manager_tb_mapping, manager_gosb_mapping = build_manager_attr_mappings(current_df, pd.DataFrame())
         elif use_files_count == "new":
             # Для нового варианта используем первый доступный файл 2025
             if not current_df.empty:
-                manager_tb_mapping = build_manager_tb_mapping(current_df, pd.DataFrame())
-                manager_gosb_mapping = build_manager_gosb_mapping(current_df, pd.DataFrame())
+                manager_tb_mapping, manager_gosb_mapping = build_manager_attr_mappings(current_df, pd.DataFrame())
             else:
                 # Если нет данных, возвращаем пустые Series
                 manager_tb_mapping = pd.Series(dtype=object, name="tb")
                 manager_gosb_mapping = pd.Series(dtype=object, name="gosb")
         else:
-            manager_tb_mapping = build_manager_tb_mapping(current_df, previous_df)
-            manager_gosb_mapping = build_manager_gosb_mapping(current_df, previous_df)
+            manager_tb_mapping, manager_gosb_mapping = build_manager_attr_mappings(current_df, previous_df)
         
         # Добавляем ТБ и ГОСБ к summary_tn_combined
-        summary_tn_combined["ТБ"] = summary_tn_combined[SELECTED_MANAGER_ID_COL].map(manager_tb_mapping).fillna("")
-        summary_tn_combined["ГОСБ"] = summary_tn_combined[SELECTED_MANAGER_ID_COL].map(manager_gosb_mapping).fillna("")
+        # Табельные номера кодируются один раз и служат обоим справочникам
+        selected_manager_ids = summary_tn_combined[SELECTED_MANAGER_ID_COL]
+        manager_codes = pd.factorize(selected_manager_ids)
+        summary_tn_combined["ТБ"] = map_with_default(selected_manager_ids, manager_tb_mapping, factorized=manager_codes)
+        summary_tn_combined["ГОСБ"] = map_with_default(
+            selected_manager_ids, manager_gosb_mapping, factorized=manager_codes
+        )
         
         # Инициализируем калькулятор процентилей
         percentile_calc = PercentileCalculator()
@@ -4308,10 +5598,12 @@ def process_project(project_root: Path) -> None:
             group_by=percentile_group_by,
         )
         
-        # Добавляем процентильные колонки
-        percentile_columns = [col for col in selected_percentile.columns if col not in summary_tn_combined.columns]
-        for col in percentile_columns:
-            summary_tn_combined[col] = selected_percentile[col]
+        # Добавляем процентильные колонки одним concat (индексы совпадают, массивы колонок не копируются)
+        # Index.difference(sort=False) сравнивает по хешам и сохраняет порядок колонок selected_percentile
+        percentile_columns = selected_percentile.columns.difference(summary_tn_combined.columns, sort=False)
+        summary_tn_combined = pd.concat(
+            [summary_tn_combined, selected_percentile[percentile_columns]], axis=1, copy=False
+        )
         
         # Переупорядочиваем колонки: сначала расчеты, потом процентили
         if use_files_count == "one":
@@ -4330,13 +5622,12 @@ def process_project(project_root: Path) -> None:
             base_columns.append("Прирост")
             if "Количество записей" in summary_tn_combined.columns:
                 base_columns.append("Количество записей")
-        percentile_cols = [col for col in percentile_columns if col not in base_columns]
-        summary_tn_combined = summary_tn_combined[base_columns + percentile_cols]
+        percentile_cols = percentile_columns.difference(base_columns, sort=False)
+        summary_tn_combined = summary_tn_combined[base_columns + list(percentile_cols)]
         
-        # summary_tn уже содержит процентили (summary_tn_combined)
-        # Используем его для всех листов
-        summary_tn = summary_tn_combined.copy()
-        percentile_tn = summary_tn_combined.copy()  # Оба содержат процентили
+        # summary_tn_combined уже содержит процентили и используется для всех листов.
+        # Копия не нужна: SPOD и экспорт таблицу только читают (выборки и сортировки создают новые DataFrame)
+        percentile_tn = summary_tn_combined
         
         # Создаём свод по ИНН для вариантов 2 и 3 (где key_mode="client" и use_files_count не "one" и не "new")
         client_summary_inn = None
@@ -4357,10 +5648,25 @@ def process_project(project_root: Path) -> None:
         # Подготавливаем данные для SPOD
         spod_variants_config = spod_config.get("variants", [])
         spod_datasets: List[pd.DataFrame] = []
-        csv_frames: List[pd.DataFrame] = []
+        # CSV SPOD пишется по мере построения вариантов: базовые датасеты не копятся в памяти до конца расчёта
+        report_suffix = timestamp_suffix()
+        csv_name = f"{spod_config['file_prefix']}_SPOD{report_suffix}.csv"
+        csv_path = output_dir / csv_name
+        csv_row_count = 0
+        csv_started = False
+        csv_part_path = output_dir / f"{csv_name}.part"
         
         # Создаём маппинги ТБ и ГОСБ для менеджеров (уже созданы выше)
         
+        # Маски fact_value_filter считаются один раз на пару (колонка, фильтр) и переиспользуются вариантами
+        mask_cache: Dict[Tuple[str, str], np.ndarray] = {}
+        # Выборки попавших в фильтр строк для расширенного датасета — по тому же ключу, что и маски.
+        # build_spod_dataset_for_excel только читает filtered_table, поэтому общая выборка без копии безопасна
+        filtered_table_cache: Dict[Tuple[str, str], pd.DataFrame] = {}
+        # Имена листов SPOD, для которых расширенный датасет уже построен: в Excel попадает
+        # только первый лист с таким именем, поэтому повтор строит лишь базовый датасет для CSV
+        spod_sheet_names: Set[str] = set()
+        
         # Обрабатываем каждый вариант SPOD
         for spod_variant in spod_variants_config:
             variant_name = spod_variant.get("name", "")
@@ -4373,31 +5679,22 @@ def process_project(project_root: Path) -> None:
             
             # Создаём SPOD датасет
             if should_write(variant_name, spod_variant_whitelist, "spod_variants"):
-                # Определяем колонку для FACT_VALUE (для процентильного SPOD может отличаться от value_column)
+                # Определяем колонку для FACT_VALUE (для процентильного SPOD может отличаться от value_column).
+                # Для scenario_percentile всегда используем percentile_type из настроек процентиля,
+                # для scenario_summary колонка не переопределяется
                 percentile_value_column = None
-                
-                # Для scenario_percentile всегда используем percentile_type из настроек процентиля
                 if source_type == "scenario_percentile":
-                    percentile_value_type = percentile_type
                     log_debug(
                         logger,
-                        f"SPOD '{variant_name}': используется percentile_type из варианта процентиля: '{percentile_value_type}'",
+                        f"SPOD '{variant_name}': используется percentile_type из варианта процентиля: '{percentile_type}'",
                         class_name="ProjectProcessor",
                         func_name="process_project",
                     )
-                else:
-                    # Для scenario_summary percentile_value_type не используется
-                    percentile_value_type = None
-                
-                if percentile_value_type:
-                    if percentile_value_type == "above":
-                        percentile_value_column = "Обогнал_всего_%"
-                    elif percentile_value_type == "below":
-                        percentile_value_column = "Обогнали_меня_всего_%"
-                    else:
+                    percentile_value_column = PERCENTILE_VALUE_COLUMNS.get(percentile_type)
+                    if percentile_value_column is None and percentile_type:
                         log_debug(
                             logger,
-                            f"SPOD '{variant_name}': неизвестный percentile_value_type '{percentile_value_type}', используется value_column",
+                            f"SPOD '{variant_name}': неизвестный percentile_value_type '{percentile_type}', используется value_column",
                             class_name="ProjectProcessor",
                             func_name="process_project",
                         )
@@ -4405,10 +5702,17 @@ def process_project(project_root: Path) -> None:
                 # Базовый SPOD датасет для CSV
                 # Для режима "new" используем value_column из основного расчета, иначе из конфигурации SPOD варианта
                 spod_value_column = value_column if use_files_count == "new" else spod_variant.get("value_column", "Прирост")
+                fact_value_filter = spod_variant.get("fact_value_filter", ">0")
+                mask_key = (spod_value_column, fact_value_filter)
+                mask = mask_cache.get(mask_key)
+                if mask is None:
+                    mask = compile_filter(fact_value_filter)(source_table[spod_value_column].to_numpy())
+                    mask_cache[mask_key] = mask
+                
                 spod_dataset = build_spod_dataset(
                     source_table=source_table,
                     value_column=spod_value_column,
-                    fact_value_filter=spod_variant.get("fact_value_filter", ">0"),
+                    fact_value_filter=fact_value_filter,
                     plan_value=spod_variant.get("plan_value", 0.0),
                     priority=spod_variant.get("priority", 1),
                     contest_code=spod_variant.get("contest_code", ""),
@@ -4418,12 +5722,34 @@ def process_project(project_root: Path) -> None:
                     logger=logger,
                     dataset_name=variant_name,
                     percentile_value_column=percentile_value_column,
+                    filter_mask=mask,
                 )
                 
-                # Получаем отфильтрованную таблицу для добавления доп данных
-                mask = build_filter_mask(source_table[spod_value_column], 
-                                        spod_variant.get("fact_value_filter", ">0"))
-                filtered_table = source_table[mask].copy()
+                # Добавляем в CSV базовую версию (без доп данных), если указано
+                if spod_variant.get("include_in_csv", False):
+                    if not csv_started:
+                        log_info(logger, f"Сохраняю CSV-файл {csv_name}")
+                    # UTF-8 с BOM для корректного отображения в Excel
+                    csv_row_count += append_csv_frame(
+                        spod_dataset, csv_part_path, header=not csv_started, sep=";", encoding="utf-8-sig"
+                    )
+                    csv_started = True
+
+                if not ExcelExporter.should_write(variant_name, spod_sheet_names):
+                    log_debug(
+                        logger,
+                        f"SPOD '{variant_name}': лист с таким именем уже подготовлен — расширенный датасет не строится",
+                        class_name="ProjectProcessor",
+                        func_name="process_project",
+                    )
+                    continue
+                spod_sheet_names.add(variant_name)
+
+                # Получаем отфильтрованную таблицу для добавления доп данных (выборка только попавших строк)
+                filtered_table = filtered_table_cache.get(mask_key)
+                if filtered_table is None:
+                    filtered_table = source_table.take(np.flatnonzero(mask))
+                    filtered_table_cache[mask_key] = filtered_table
                 
                 # Расширенный SPOD датасет для Excel (с дополнительными колонками)
                 # Используем percentile_value_column для колонки "Факт", если она определена
@@ -4444,135 +5770,188 @@ def process_project(project_root: Path) -> None:
                 )
                 
                 spod_datasets.append((variant_name, spod_dataset_excel))
-                
-                # Добавляем в CSV базовую версию (без доп данных), если указано
-                if spod_variant.get("include_in_csv", False):
-                    csv_frames.append(spod_dataset)
         
-        # Подготавливаем таблицы для вывода
-        raw_tables = {
-            "RAW_T0": format_raw_sheet(current_df, current_alias_to_source),
-            "RAW_T1": format_raw_sheet(previous_df, previous_alias_to_source),
+        # Подготавливаем таблицы для вывода.
+        # RAW-листы форматируются лениво: если report_layout их исключает, полный проход по исходникам не нужен.
+        raw_builders: Dict[str, Callable[[], pd.DataFrame]] = {
+            "RAW_T0": lambda: format_raw_sheet(current_df, current_alias_to_source),
+            "RAW_T1": lambda: format_raw_sheet(previous_df, previous_alias_to_source),
         }
         if use_t2 and previous2_df is not None:
-            previous2_column_profiles = build_column_profiles(get_file_columns(file_section, "previous2", defaults))
-            previous2_alias_to_source = previous2_column_profiles["alias_to_source"]
-            raw_tables["RAW_T2"] = format_raw_sheet(previous2_df, previous2_alias_to_source)
+            # Профиль колонок T-2 уже построен при загрузке файла
+            raw_builders["RAW_T2"] = lambda: format_raw_sheet(previous2_df, previous2_alias_to_source)
 
 
-        report_suffix = timestamp_suffix()
+        if csv_started:
+            # Файл получает итоговое имя только после всех вариантов: при ошибке в OUT не остаётся неполного CSV
+            os.replace(csv_part_path, csv_path)
+            log_info(logger, f"CSV-файл сохранён: {csv_name} ({csv_row_count} строк)")
+        csv_part_path = None
+
         excel_name = f"{spod_config['file_prefix']}{report_suffix}.xlsx"
         excel_path = output_dir / excel_name
         log_info(logger, f"Сохраняю Excel-файл {excel_name}")
 
         log_info(
             logger,
-            "Используется движок openpyxl (доступен в базовой поставке Anaconda) для сохранения отчёта.",
+            "Используется движок openpyxl в режиме write_only (потоковая запись, доступен в базовой поставке Anaconda) "
+            "для сохранения отчёта.",
+        )
+        # Книга write_only сериализуется потоково; с lxml (есть в Anaconda) openpyxl пишет XML заметно быстрее,
+        # без него — через ElementTree на Python
+        log_debug(
+            logger,
+            f"Сериализатор XML openpyxl: {'lxml' if OPENPYXL_LXML else 'ElementTree (lxml не установлен)'}",
+            class_name="Exporter",
+            func_name="process_project",
         )
 
         # Инициализируем экспортер Excel
         excel_exporter = ExcelExporter()
+
+        # Для одного файла SUMMARY_TN сортируется по value_column, для нового варианта - по "Сумма_2025",
+        # для двух/трех - по "Прирост"; остальные листы берут колонку из SHEET_SORT_COLUMNS
+        if use_files_count == "one":
+            summary_tn_sort_column = value_column
+        elif use_files_count == "new":
+            summary_tn_sort_column = "Сумма_2025"
+        else:
+            summary_tn_sort_column = "Прирост"
+        sort_candidates_by_sheet = {**SHEET_SORT_COLUMNS, "SUMMARY_TN": (summary_tn_sort_column,)}
         
-        with pd.ExcelWriter(excel_path, engine="openpyxl") as writer:
-            written_sheets: Set[str] = set()
+        def prepare_sheet(sheet_name: str, table: pd.DataFrame) -> Tuple[pd.DataFrame, Optional[np.ndarray]]:
+            """Готовит таблицу к записи: определяет порядок строк в зависимости от типа листа.
+            
+            Returns:
+                (таблица, позиции строк в порядке записи или None, если лист не сортируется)
+            """
+            # Сортируем таблицу в зависимости от типа листа (от большего к меньшему).
+            # Отсортированная копия не создаётся: считается только порядок строк, а stream_sheet
+            # выбирает по нему блоки при записи. Все листы не держат в памяти вторую копию своих данных.
+            table_to_write = table
+            sort_column = next(
+                (
+                    column
+                    for column in sort_candidates_by_sheet.get(sheet_name, ())
+                    if column in table_to_write.columns
+                ),
+                None,
+            )
+            
+            row_order = None
+            if sort_column:
+                # Порядок считается по позиционному индексу, поэтому индекс таблицы не материализуется.
+                # Стабильная сортировка оставляет строки с равными значениями в исходном порядке,
+                # и выгрузка воспроизводится от запуска к запуску.
+                row_order = (
+                    table_to_write[sort_column]
+                    .reset_index(drop=True)
+                    .sort_values(ascending=False, na_position="last", kind="stable")
+                    .index.to_numpy()
+                )
+                log_debug(
+                    logger,
+                    f"Лист {sheet_name}: отсортирован по {sort_column} (убывание)",
+                    class_name="ProjectProcessor",
+                    func_name="process_project",
+                )
+            return table_to_write, row_order
 
-            def write_sheet(sheet_name: str, table: pd.DataFrame) -> None:
-                """Внутренняя функция для записи листа с проверкой дубликатов и сортировкой."""
-                if sheet_name in written_sheets:
-                    log_debug(
-                        logger,
-                        f"Лист {sheet_name} уже создан — пропускаю повторную запись",
-                        class_name="ProjectProcessor",
-                        func_name="process_project",
-                    )
-                    return
-                
-                # Сортируем таблицу в зависимости от типа листа (от большего к меньшему)
-                table_to_write = table.copy()
-                sort_column = None
-                
-                if sheet_name == "SUMMARY_TN":
-                    # Для одного файла используем value_column, для нового варианта - "Сумма_2025", для двух/трех - "Прирост"
-                    if use_files_count == "one":
-                        sort_column = value_column
-                    elif use_files_count == "new":
-                        sort_column = "Сумма_2025"
-                    else:
-                        sort_column = "Прирост"
-                elif sheet_name == "SUMMARY_INN":
-                    sort_column = "Прирост"
-                elif sheet_name in ["SPOD_SCENARIO", "SPOD_SCENARIO_PERCENTILE"]:
-                    sort_column = "Факт"
-                elif sheet_name in ["RAW_T0", "RAW_T1", "RAW_T2"]:
-                    # Для RAW листов ищем колонку с фактом
-                    if "Факт (число)" in table_to_write.columns:
-                        sort_column = "Факт (число)"
-                    elif "fact_value_clean" in table_to_write.columns:
-                        sort_column = "fact_value_clean"
-                
-                if sort_column and sort_column in table_to_write.columns:
-                    table_to_write = table_to_write.sort_values(
-                        by=sort_column,
-                        ascending=False,
-                        na_position="last"
-                    )
-                    log_debug(
-                        logger,
-                        f"Лист {sheet_name}: отсортирован по {sort_column} (убывание)",
-                        class_name="ProjectProcessor",
-                        func_name="process_project",
-                    )
-                
-                excel_exporter.write_sheet(
-                    writer, 
-                    sheet_name, 
-                    table_to_write, 
-                    written_sheets,
-                    min_width=min_width,
-                    max_width=max_width,
-                    wrap_text=wrap_text,
+        # План листов (белые списки и повторы имён) составляется до открытия ExcelWriter,
+        # чтобы при открытом файле выполнялась только запись
+        planned_sheet_names: Set[str] = set()
+
+        def plan_sheet(sheet_name: str, whitelist: Optional[FrozenSet[str]], block: str) -> bool:
+            """Проверяет белый список и добавляет лист в план, если листа с таким именем там ещё нет."""
+            if not should_write(sheet_name, whitelist, block):
+                return False
+            if not excel_exporter.should_write(sheet_name, planned_sheet_names):
+                log_debug(
+                    logger,
+                    f"Лист {sheet_name} уже создан — пропускаю повторную запись",
+                    class_name="ProjectProcessor",
+                    func_name="process_project",
                 )
+                return False
+            planned_sheet_names.add(sheet_name)
+            return True
 
-            # Записываем SUMMARY_TN (объединенный с процентилями)
-            if should_write("SUMMARY_TN", summary_sheet_whitelist, "summary_sheets"):
-                write_sheet("SUMMARY_TN", percentile_tn)
-            
-            # Записываем свод по ИНН для вариантов 2 и 3
-            if client_summary_inn is not None:
-                if should_write("SUMMARY_INN", summary_sheet_whitelist, "summary_sheets"):
-                    write_sheet("SUMMARY_INN", client_summary_inn)
-            
-            # Записываем SPOD листы
-            for variant_name, spod_dataset in spod_datasets:
-                if should_write(variant_name, spod_variant_whitelist, "spod_variants"):
-                    write_sheet(variant_name, spod_dataset)
-
-            # Записываем raw таблицы
-            for sheet_name, raw_table in raw_tables.items():
-                if not should_write(sheet_name, raw_sheet_whitelist, "raw_sheets"):
-                    continue
-                write_sheet(sheet_name, raw_table)
-        
-        # Создаём CSV файл, если есть данные для выгрузки
-        if csv_frames:
-            csv_name = f"{spod_config['file_prefix']}_SPOD{report_suffix}.csv"
-            csv_path = output_dir / csv_name
-            log_info(logger, f"Сохраняю CSV-файл {csv_name}")
-            
-            combined_csv = pd.concat(csv_frames, ignore_index=True)
-            combined_csv.to_csv(
-                csv_path,
-                sep=";",
-                index=False,
-                quoting=csv.QUOTE_MINIMAL,
-                encoding="utf-8-sig",  # UTF-8 с BOM для корректного отображения в Excel
+        # Собираем листы в порядке вывода: SUMMARY_TN, SUMMARY_INN, SPOD, RAW
+        sheets_to_write: List[Tuple[str, pd.DataFrame]] = []
+        if plan_sheet("SUMMARY_TN", summary_sheet_whitelist, "summary_sheets"):
+            sheets_to_write.append(("SUMMARY_TN", percentile_tn))
+        if client_summary_inn is not None:
+            if plan_sheet("SUMMARY_INN", summary_sheet_whitelist, "summary_sheets"):
+                sheets_to_write.append(("SUMMARY_INN", client_summary_inn))
+        for variant_name, spod_dataset in spod_datasets:
+            if plan_sheet(variant_name, spod_variant_whitelist, "spod_variants"):
+                sheets_to_write.append((variant_name, spod_dataset))
+        # RAW-листы (полные копии исходников) не держим в памяти все сразу:
+        # каждый строится, сортируется и записывается непосредственно перед своей очередью.
+        raw_sheets_to_write: List[Tuple[str, Callable[[], pd.DataFrame]]] = [
+            (sheet_name, build_raw_table)
+            for sheet_name, build_raw_table in raw_builders.items()
+            if plan_sheet(sheet_name, raw_sheet_whitelist, "raw_sheets")
+        ]
+
+        # Порядок строк листов считается независимо друг от друга в C-коде pandas
+        # (с отпущенным GIL), поэтому готовим их параллельно, а запись в ExcelWriter остаётся последовательной.
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            prepared_sheets = list(
+                executor.map(lambda item: (item[0], prepare_sheet(item[0], item[1])), sheets_to_write)
             )
-            log_info(logger, f"CSV-файл сохранён: {csv_name} ({len(combined_csv)} строк)")
+
+        def write_excel() -> None:
+            """Записывает подготовленные листы в Excel-файл."""
+            with excel_exporter.zip_compression(zip_compress_level), pd.ExcelWriter(
+                excel_path, engine="openpyxl", engine_kwargs={"write_only": True}
+            ) as writer:
+                def write_sheet(sheet_name: str, prepared: Tuple[pd.DataFrame, Optional[np.ndarray]]) -> None:
+                    """Внутренняя функция для записи подготовленного листа (повторы имён отсеяны в плане)."""
+                    table, row_order = prepared
+                    excel_exporter.write_sheet(
+                        writer, 
+                        sheet_name, 
+                        table, 
+                        None,
+                        min_width=min_width,
+                        max_width=max_width,
+                        wrap_text=wrap_text,
+                        row_order=row_order,
+                    )
+
+                # Записываем листы в исходном порядке
+                for sheet_name, prepared in prepared_sheets:
+                    write_sheet(sheet_name, prepared)
+                if raw_format == "xlsx":
+                    for sheet_name, build_raw_table in raw_sheets_to_write:
+                        # RAW-таблица строится и сортируется только для листа, который действительно будет записан
+                        write_sheet(sheet_name, prepare_sheet(sheet_name, build_raw_table()))
+
+        write_excel()
+
+        if raw_format == "csv":
+            # RAW-таблицы выгружаются в исходном порядке строк в отдельные CSV (как и SPOD — через .part)
+            for sheet_name, build_raw_table in raw_sheets_to_write:
+                raw_csv_name = f"{spod_config['file_prefix']}_{sheet_name}{report_suffix}.csv"
+                log_info(logger, f"Сохраняю CSV-файл {raw_csv_name}")
+                csv_part_path = output_dir / f"{raw_csv_name}.part"
+                raw_row_count = append_csv_frame(build_raw_table(), csv_part_path, header=True)
+                os.replace(csv_part_path, output_dir / raw_csv_name)
+                csv_part_path = None
+                log_info(logger, f"CSV-файл сохранён: {raw_csv_name} ({raw_row_count} строк)")
 
         log_info(logger, "Обработка успешно завершена")
     except Exception as exc:
+        if csv_part_path is not None:
+            csv_part_path.unlink(missing_ok=True)
         log_info(logger, f"Обработка завершилась с ошибкой: {exc}")
-        stack = traceback.format_exc().replace("\n", " | ")
+        # Трассировка пишется одной строкой лога: строки исключения собираются сразу через " | "
+        stack = " | ".join(
+            line
+            for chunk in traceback.format_exception(type(exc), exc, exc.__traceback__)
+            for line in chunk.splitlines()
+        )
         log_debug(
             logger,
             f"Трассировка: {stack}",
@@ -4580,13 +5959,14 @@ def process_project(project_root: Path) -> None:
             func_name="process_project",
         )
         raise
+    finally:
+        close_logger(logger)
 
 
 def main() -> None:
     """Точка входа."""
 
-    project_root = Path(__file__).resolve().parent.parent
-    process_project(project_root)
+    process_project(PROJECT_ROOT)
 
 
 if __name__ == "__main__":